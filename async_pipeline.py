@@ -0,0 +1,201 @@
+"""
+Pipelined ingest on asyncio - extraction in a worker thread feeds async Neo4j writers through a bounded queue
+Run: python async_pipeline.py [max_records]
+"""
+import asyncio
+import concurrent.futures
+import inspect
+import sys
+import threading
+import time
+from collections import Counter
+from neo4j import AsyncGraphDatabase
+from construct_kg import (DATA_FILE, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, NLP_BATCH_SIZE, NLP_N_PROCESS,
+                          WRITE_BATCH_SIZE, WRITE_CONCURRENCY, QUEUE_SIZE, MAX_RECORDS, NAME_CONSTRAINT,
+                          NAME_INDEX, DROP_NAME_INDEX, DOMAIN_INDEX, group_by_relation, relation_query,
+                          iter_records, stream_extractions)
+from entity_extractor import load_nlp
+from instrumentation import METRICS
+from triple_table import TripleTable
+
+# Config
+ASYNC_WRITERS = WRITE_CONCURRENCY  # Writer tasks committing batches concurrently
+QUEUE_BATCHES = QUEUE_SIZE  # Triple batches buffered between extraction and the writers (backpressure)
+
+_DONE = object()
+
+async def _write_rows(tx, query, rows):
+    result = await tx.run(query, rows=rows)
+    await result.consume()
+    return len(rows)
+
+class AsyncNeo4jSink:
+    """
+    Async counterpart of write_to_neo4j: the same grouped UNWIND queries on the
+    async driver, so a writer task awaits Bolt I/O instead of holding a thread.
+    Like write_to_neo4j, it only writes concurrently once the Entity.name
+    uniqueness constraint exists; otherwise one write runs at a time.
+    """
+
+    def __init__(self, uri=NEO4J_URI, user=NEO4J_USER, password=NEO4J_PASSWORD, batch_size=WRITE_BATCH_SIZE):
+        self.driver = AsyncGraphDatabase.driver(uri, auth=(user, password))
+        self.batch_size = batch_size
+        self._indexes = None  # Task creating the indexes; every write waits for it
+        self._serial = None  # Lock held by every write when the constraint is missing
+
+    async def _create_indexes(self):
+        """Same schema steps as create_indexes"""
+        async with self.driver.session() as session:
+            try:
+                await (await session.run(NAME_CONSTRAINT)).consume()
+            except Exception:
+                try:
+                    await (await session.run(DROP_NAME_INDEX)).consume()
+                    await (await session.run(NAME_CONSTRAINT)).consume()
+                except Exception as e:
+                    METRICS.error('create_indexes', e)
+                    print(f"⚠️ No uniqueness constraint on Entity.name ({e}); writing with one transaction at a time")
+                    self._serial = asyncio.Lock()
+            try:
+                if self._serial is not None:
+                    await (await session.run(NAME_INDEX)).consume()
+                await (await session.run(DOMAIN_INDEX)).consume()
+                await (await session.run("CALL db.awaitIndexes()")).consume()
+            except Exception as e:
+                METRICS.error('create_indexes', e)
+
+    async def __call__(self, triples, metadata_list):
+        if not triples:
+            return 0
+        if self._indexes is None:
+            self._indexes = asyncio.ensure_future(self._create_indexes())
+        await self._indexes
+        if self._serial is None:
+            return await self._write(triples, metadata_list)
+        async with self._serial:
+            return await self._write(triples, metadata_list)
+
+    async def _write(self, triples, metadata_list):
+        written = 0
+        async with self.driver.session() as session:
+            # execute_write retries transient errors such as deadlocks between concurrent writers
+            for rel, rows in group_by_relation(triples, metadata_list).items():
+                query = relation_query(rel)
+                for i in range(0, len(rows), self.batch_size):
+                    written += await session.execute_write(_write_rows, query, rows[i:i + self.batch_size])
+        return written
+
+    async def close(self):
+        await self.driver.close()
+
+def _is_async(sink):
+    return inspect.iscoroutinefunction(sink) or inspect.iscoroutinefunction(getattr(sink, '__call__', None))
+
+async def run_pipelined(nlp, sink, records, batch_size=NLP_BATCH_SIZE, n_process=NLP_N_PROCESS,
+                        write_batch_size=WRITE_BATCH_SIZE, queue_size=QUEUE_BATCHES, writers=ASYNC_WRITERS,
+                        cache=None):
+    """
+    Overlap extraction with writes. stream_extractions runs in a worker thread
+    and puts TripleTable batches of about write_batch_size triples on a bounded
+    asyncio.Queue; `writers` tasks drain it into sink(triples, metadata_list)
+    concurrently. A full queue blocks extraction (backpressure), so at most
+    queue_size batches wait in memory. sink is a coroutine function (e.g.
+    AsyncNeo4jSink) or a plain function, which then runs in a thread and must
+    be thread-safe when writers > 1 (write_to_neo4j is).
+    Returns (records processed, triples written, relation counts), like run_streaming.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    relations = Counter()
+    totals = Counter()
+    is_async = _is_async(sink)
+
+    def put(batch):
+        """Enqueue from the extraction thread, waiting while the queue is full"""
+        future = asyncio.run_coroutine_threadsafe(queue.put(batch), loop)
+        while not stop.is_set():
+            try:
+                return future.result(timeout=0.1)
+            except concurrent.futures.TimeoutError:
+                continue
+        future.cancel()
+
+    def extract():
+        batch = TripleTable()
+        for metadata, _, triples in stream_extractions(records, nlp, batch_size, n_process, cache):
+            totals['records'] += 1
+            if totals['records'] % 100 == 0:
+                print(f"  Processed {totals['records']} records, {totals['triples']} triples written...")
+            batch.add_record(triples, metadata)
+            relations.update(rel for _, rel, _ in triples)
+            if len(batch) >= write_batch_size:
+                put(batch)
+                batch = TripleTable()
+            if stop.is_set():
+                return
+        if len(batch):
+            put(batch)
+
+    async def write():
+        while True:
+            batch = await queue.get()
+            if batch is _DONE:
+                return
+            if errors:
+                continue  # Keep draining after a failure so extraction never blocks
+            try:
+                with METRICS.stage('write'):
+                    if is_async:
+                        await sink(batch, batch.metadata)
+                    else:
+                        await asyncio.to_thread(sink, batch, batch.metadata)
+                totals['triples'] += len(batch)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+    tasks = [asyncio.create_task(write()) for _ in range(writers)]
+    try:
+        await asyncio.to_thread(extract)
+    finally:
+        stop.set()  # Ends extraction early if this coroutine was cancelled
+        for _ in tasks:
+            await queue.put(_DONE)
+        await asyncio.gather(*tasks)
+
+    if errors:
+        raise errors[0]
+    return totals['records'], totals['triples'], relations
+
+async def pipeline_to_neo4j(nlp, records, **kwargs):
+    """run_pipelined into Neo4j through an AsyncNeo4jSink, closing its driver at the end"""
+    sink = AsyncNeo4jSink()
+    try:
+        return await run_pipelined(nlp, sink, records, **kwargs)
+    finally:
+        await sink.close()
+
+def main():
+    max_records = int(sys.argv[1]) if len(sys.argv) > 1 else MAX_RECORDS
+    print("🚀 Pipelined Knowledge Graph Ingest")
+    print("=" * 40)
+    with METRICS.stage('load_nlp'):
+        nlp = load_nlp()
+
+    print(f"Streaming up to {max_records} records from {DATA_FILE} into Neo4j ({ASYNC_WRITERS} async writers)...")
+    start = time.perf_counter()
+    try:
+        records, total, relations = asyncio.run(pipeline_to_neo4j(nlp, iter_records(max_records, DATA_FILE)))
+    finally:
+        print(METRICS.report())
+        METRICS.export()
+    elapsed = time.perf_counter() - start
+
+    print(f"Wrote {total} quality relationships from {records} records in {elapsed:.1f}s")
+    print(f"Top relations: {relations.most_common(5)}" if total else "No relationships found")
+    print("✅ Knowledge graph created successfully!" if total else "❌ No relationships found to write")
+
+if __name__ == "__main__":
+    main()
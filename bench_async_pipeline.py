@@ -0,0 +1,128 @@
+"""
+Benchmark: extract-then-write vs. the asyncio pipeline, against a local fake sink (no Neo4j)
+Run: python bench_async_pipeline.py [chunks.jsonl]
+Exits 1 if the sink receives different triples, or if a failing sink does not stop the pipeline.
+"""
+import asyncio
+import sys
+import time
+from collections import Counter
+from async_pipeline import run_pipelined, ASYNC_WRITERS
+from construct_kg import load_data, stream_extractions, DATA_FILE, WRITE_BATCH_SIZE
+from entity_extractor import load_nlp
+from triple_table import TripleTable
+
+# Config
+SAMPLE_RECORDS = 1000
+WRITE_BATCH = WRITE_BATCH_SIZE // 4  # Smaller batches, so a sample gives the writers enough to overlap
+SECONDS_PER_1K_TRIPLES = 0.2  # Fake commit latency per batch, scaled by its size
+FAIL_AT_BATCH = 2  # The failing sink raises on this batch
+
+class FakeSink:
+    """Async sink that sleeps like a Bolt round trip and records what it was given"""
+
+    def __init__(self, seconds_per_1k=SECONDS_PER_1K_TRIPLES):
+        self.seconds_per_1k = seconds_per_1k
+        self.batches = []
+
+    async def __call__(self, triples, metadata_list):
+        await asyncio.sleep(self.seconds_per_1k * len(triples) / 1000)
+        self.batches.append((triples, metadata_list))
+
+    def triples(self):
+        """(subj, rel, obj, title) counts over everything written (computed after timing)"""
+        return Counter((*triple, metadata_list[i]['title'])
+                       for triples, metadata_list in self.batches for i, triple in enumerate(triples))
+
+class FailingSink(FakeSink):
+    """FakeSink that raises on its fail_at-th batch, like a lost connection mid-run"""
+
+    def __init__(self, fail_at=FAIL_AT_BATCH):
+        super().__init__(0)
+        self.fail_at = fail_at
+
+    async def __call__(self, triples, metadata_list):
+        if len(self.batches) + 1 == self.fail_at:
+            raise ConnectionError(f"sink failed on batch {self.fail_at}")
+        await super().__call__(triples, metadata_list)
+
+def check_failure(nlp, texts):
+    """
+    A sink error must come out of run_pipelined and stop extraction early;
+    returns the list of problems (empty when it does).
+    """
+    consumed = Counter()
+    def counted():
+        for text in texts:
+            consumed['records'] += 1
+            yield text
+
+    sink = FailingSink()
+    try:
+        asyncio.run(run_pipelined(nlp, sink, counted(), write_batch_size=WRITE_BATCH, queue_size=1))
+    except ConnectionError as e:
+        print(f"Failing sink: {e!r} raised after {consumed['records']} of {len(texts)} records were read")
+    else:
+        return ["the sink error was not raised"]
+    if consumed['records'] >= len(texts):
+        return ["extraction kept reading every record after the sink failed"]
+    return []
+
+def extract_batches(nlp, texts):
+    """Step 3 alone: every batch extracted before anything is written"""
+    batches, batch = [], TripleTable()
+    for metadata, _, triples in stream_extractions(texts, nlp):
+        batch.add_record(triples, metadata)
+        if len(batch) >= WRITE_BATCH:
+            batches.append(batch)
+            batch = TripleTable()
+    if len(batch):
+        batches.append(batch)
+    return batches
+
+async def write_batches(batches, sink, writers=ASYNC_WRITERS):
+    """Step 5 alone: the same batches through the same number of concurrent writers"""
+    pending = iter(batches)
+    async def writer():
+        for batch in pending:
+            await sink(batch, batch.metadata)
+    await asyncio.gather(*(writer() for _ in range(writers)))
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_FILE
+    nlp = load_nlp()
+    texts = load_data(SAMPLE_RECORDS, path)
+    if not texts:
+        print("No data to benchmark!")
+        return
+
+    start = time.perf_counter()
+    batches = extract_batches(nlp, texts)
+    extract_s = time.perf_counter() - start
+    sequential = FakeSink()
+    start = time.perf_counter()
+    asyncio.run(write_batches(batches, sequential))
+    write_s = time.perf_counter() - start
+
+    pipelined = FakeSink()
+    start = time.perf_counter()
+    records, written, _ = asyncio.run(run_pipelined(nlp, pipelined, texts, write_batch_size=WRITE_BATCH))
+    pipelined_s = time.perf_counter() - start
+
+    print(f"{records} records, {written} triples in {len(pipelined.batches)} batches, {ASYNC_WRITERS} writers")
+    print(f"Extract only:          {extract_s:.2f}s")
+    print(f"Write only:            {write_s:.2f}s")
+    print(f"Extract, then write:   {extract_s + write_s:.2f}s")
+    print(f"Pipelined:             {pipelined_s:.2f}s (ideal {max(extract_s, write_s):.2f}s)")
+
+    problems = check_failure(nlp, texts)
+    if pipelined.triples() != sequential.triples():
+        problems.append("the pipelined sink received different triples")
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem.capitalize()}")
+        sys.exit(1)
+    print("✅ Same triples written both ways, and a failing sink stops the pipeline")
+
+if __name__ == "__main__":
+    main()
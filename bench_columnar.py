@@ -0,0 +1,43 @@
+"""
+Micro-benchmark: loading chunks from JSONL vs. Arrow IPC and Parquet tables
+Run: python bench_columnar.py [chunks.jsonl]
+"""
+import os
+import sys
+import tempfile
+import time
+from columnar import convert_jsonl, read_table
+from construct_kg import iter_records, DATA_FILE
+
+# Config
+REPEATS = 5
+
+def time_records(path):
+    start = time.perf_counter()
+    n = sum(1 for _ in iter_records(None, path))
+    return time.perf_counter() - start, n
+
+def time_column(path):
+    """Whole text column only, no per-row Python objects"""
+    start = time.perf_counter()
+    n = read_table(path, ['text']).num_rows
+    return time.perf_counter() - start, n
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_FILE
+    with tempfile.TemporaryDirectory() as tmp:
+        tables = {}
+        for fmt in ("arrow", "parquet"):
+            tables[fmt] = os.path.join(tmp, f"chunks.{fmt}")
+            start = time.perf_counter()
+            rows = convert_jsonl(path, tables[fmt])
+            print(f"Converted {rows} rows to {fmt} in {time.perf_counter() - start:.2f}s")
+
+        print(f"{'format':<8} {'MB':>8} {'records':>9} {'iter_records':>14} {'text column':>13}")
+        for fmt, file in (("jsonl", path), *tables.items()):
+            elapsed, n = min(time_records(file) for _ in range(REPEATS))
+            column = f"{min(time_column(file) for _ in range(REPEATS))[0] * 1000:.1f} ms" if fmt != "jsonl" else "-"
+            print(f"{fmt:<8} {os.path.getsize(file) / 1e6:>8.1f} {n:>9} {elapsed * 1000:>11.1f} ms {column:>13}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: token-to-entity span index vs. the legacy substring scan
+Run: python bench_entity_index.py [chunks.jsonl]
+"""
+import sys
+import time
+from entity_extractor import load_nlp, extract_entity_mentions, MAX_CHARS
+from relationship_extractor import build_entity_index, find_entity_for_token, scan_entity_for_token
+from construct_kg import load_data, DATA_FILE
+
+# Config
+SAMPLE_RECORDS = 2000  # Chunks to parse before picking the densest ones
+DENSE_DOCS = 200  # Entity-dense Docs kept for timing
+REPEATS = 5
+LOOKUP_DEPS = {"nsubj", "nsubjpass", "dobj", "pobj", "attr", "acomp", "poss"}
+
+def load_dense_docs(nlp, path):
+    """Parse a sample of chunks and keep the most entity-dense Docs"""
+    texts = load_data(SAMPLE_RECORDS, path)
+    docs = list(nlp.pipe(item['text'][:MAX_CHARS] for item in texts))
+    docs.sort(key=lambda doc: len(doc.ents) / max(len(doc), 1), reverse=True)
+    return docs[:DENSE_DOCS]
+
+def lookup_tokens(doc):
+    """Tokens the relation rules look up (subject/object/possessive children)"""
+    return [token for token in doc if token.dep_ in LOOKUP_DEPS]
+
+def time_scan(prepared):
+    start = time.perf_counter()
+    for _, entities, _, tokens in prepared:
+        for token in tokens:
+            scan_entity_for_token(token, entities)
+    return time.perf_counter() - start
+
+def time_index(prepared):
+    start = time.perf_counter()
+    for doc, entities, mentions, tokens in prepared:
+        index = build_entity_index(doc, entities, mentions)  # Build cost is included
+        for token in tokens:
+            find_entity_for_token(token, index)
+    return time.perf_counter() - start
+
+def count_disagreements(prepared):
+    """Lookups where the substring scan and the span index return different entities"""
+    differ = 0
+    false_hits = 0
+    for doc, entities, mentions, tokens in prepared:
+        index = build_entity_index(doc, entities, mentions)
+        for token in tokens:
+            scanned = scan_entity_for_token(token, entities)
+            indexed = find_entity_for_token(token, index)
+            if scanned != indexed:
+                differ += 1
+                if scanned and not token.ent_type_:
+                    false_hits += 1  # e.g. "in" matching "Berlin"
+    return differ, false_hits
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_FILE
+    nlp = load_nlp()
+    docs = load_dense_docs(nlp, path)
+    if not docs:
+        print("No data to benchmark!")
+        return
+
+    # Mentions come out of entity extraction, which runs in both variants anyway
+    prepared = [(doc, *extract_entity_mentions(doc), lookup_tokens(doc)) for doc in docs]
+    n_lookups = sum(len(tokens) for *_, tokens in prepared)
+    n_entities = sum(len(entities) for _, entities, _, _ in prepared)
+    print(f"{len(prepared)} Docs, {n_entities} entities, {n_lookups} lookups per pass")
+
+    scan = min(time_scan(prepared) for _ in range(REPEATS))
+    indexed = min(time_index(prepared) for _ in range(REPEATS))
+    differ, false_hits = count_disagreements(prepared)
+
+    print(f"Substring scan: {scan * 1000:.2f} ms ({n_lookups / scan:,.0f} lookups/s)")
+    print(f"Span index:     {indexed * 1000:.2f} ms ({n_lookups / indexed:,.0f} lookups/s)")
+    print(f"Speedup: {scan / indexed:.1f}x")
+    print(f"Disagreements: {differ} ({false_hits} scan hits on tokens outside any entity)")
+
+if __name__ == "__main__":
+    main()
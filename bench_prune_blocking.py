@@ -0,0 +1,86 @@
+"""
+Benchmark: blocked duplicate detection vs. brute-force token_sort_ratio on a sample
+Run: python bench_prune_blocking.py [names.txt | entities.csv]
+"""
+import random
+import sys
+import time
+from thefuzz import fuzz
+from prune import SIMILARITY_THRESHOLD, find_duplicate_pairs
+
+# Config
+SAMPLE_SIZE = 3000  # Brute force is O(n^2), keep the sample small
+SEED = 7
+
+def load_names(path):
+    """One name per line, or the first column of an entities.csv export"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.split(',')[0].strip() for line in f if line.strip()]
+
+def synthetic_names(n, seed=SEED):
+    """Entity-like names with typo, case, punctuation and word-order variants"""
+    rng = random.Random(seed)
+    first = ["Apple", "Berlin", "Oxford", "Nokia", "Maria", "Intel", "Tesla", "Delta", "Kyoto", "Amazon",
+             "Victoria", "Jordan", "Lincoln", "Geneva", "Sierra", "Phoenix", "Atlas", "Orion", "Summit", "Harbor"]
+    second = ["Group", "Labs", "University", "Computer", "Systems", "City", "Museum", "Railway", "Bank", "Records",
+              "Institute", "Partners", "Holdings", "Council", "Foundation", "Studios", "Motors", "Press", "Airlines", "Hotel"]
+    third = ["", "", "", "International", "Inc", "of America", "Europe", "North", "Ltd", "Company"]
+
+    def variant(name):
+        choice = rng.random()
+        if choice < 0.3 and len(name) > 4:
+            i = rng.randrange(len(name))
+            return name[:i] + name[i + 1:]  # Dropped character
+        if choice < 0.5:
+            return name.upper() if rng.random() < 0.5 else name + "."
+        if choice < 0.6:
+            return " ".join(reversed(name.split()))
+        return name
+
+    names = set()
+    while len(names) < n:
+        base = " ".join(p for p in (rng.choice(first), rng.choice(second), rng.choice(third)) if p)
+        names.add(variant(base) if rng.random() < 0.5 else base)
+    return list(names)
+
+def brute_force_pairs(names, threshold):
+    """Every pair scored with thefuzz, exactly as the original greedy loop did"""
+    pairs = set()
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            if fuzz.token_sort_ratio(names[i], names[j]) > threshold:
+                pairs.add((i, j))
+    return pairs
+
+def main():
+    if len(sys.argv) > 1:
+        names = load_names(sys.argv[1])
+        random.Random(SEED).shuffle(names)
+        names = names[:SAMPLE_SIZE]
+    else:
+        names = synthetic_names(SAMPLE_SIZE)
+    print(f"Sample: {len(names)} names, threshold > {SIMILARITY_THRESHOLD}")
+
+    start = time.perf_counter()
+    truth = brute_force_pairs(names, SIMILARITY_THRESHOLD)
+    brute = time.perf_counter() - start
+
+    start = time.perf_counter()
+    blocked = set(find_duplicate_pairs(names, SIMILARITY_THRESHOLD))
+    fast = time.perf_counter() - start
+
+    found = len(truth & blocked)
+    recall = found / len(truth) if truth else 1.0
+    extra = len(blocked - truth)
+    n_pairs = len(names) * (len(names) - 1) // 2
+
+    print(f"Brute force: {brute:.2f}s for {n_pairs:,} pairs, {len(truth)} duplicates")
+    print(f"Blocked:     {fast:.2f}s, {len(blocked)} duplicates")
+    print(f"Recall: {recall:.4f} ({found}/{len(truth)}), false positives: {extra}")
+    print(f"Speedup: {brute / fast:.1f}x")
+    missed = sorted(truth - blocked)[:10]
+    for i, j in missed:
+        print(f"  missed: {names[i]!r} ~ {names[j]!r} ({fuzz.token_sort_ratio(names[i], names[j])})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Parity check and micro-benchmark: RELATION_RULES engine vs. spaCy's DependencyMatcher on the same patterns
+Run: python bench_relation_rules.py               (hand-built Docs in relation_rules_corpus.json, no model needed)
+     python bench_relation_rules.py chunks.jsonl  (parsed chunks; needs the spaCy model)
+Exits 1 if any Doc's triples differ.
+"""
+import json
+import os
+import sys
+import time
+import spacy
+from spacy.matcher import DependencyMatcher
+from spacy.tokens import Doc, Span
+from chunk_clean import segment_text
+from entity_extractor import load_nlp, extract_entity_mentions, MAX_CHARS, SEGMENT_OVERLAP
+from relationship_extractor import RELATION_RULES, RELATIONS, MIN_SCORE, build_entity_index, find_relationships_in_doc
+from construct_kg import load_data
+from benchmark import synthetic_corpus
+
+# Config
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "relation_rules_corpus.json")
+SAMPLE_RECORDS = 2000  # Chunks from the data file
+SYNTHETIC_ARTICLES = 50  # Plus relation-dense synthetic articles (every verb in RELATIONS)
+REPEATS = 5
+SHOW_MISMATCHES = 10
+
+def corpus_docs(vocab, path=CORPUS_FILE):
+    """(Doc, expected triples) for every hand-built Doc in the corpus file"""
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    docs = []
+    for entry in entries:
+        doc = Doc(vocab, words=entry['words'], heads=entry['heads'], deps=entry['deps'],
+                  pos=entry['pos'], lemmas=entry['lemmas'])
+        doc.ents = [Span(doc, start, end, label=label) for start, end, label in entry['ents']]
+        docs.append((doc, [tuple(triple) for triple in entry['triples']]))
+    return docs
+
+def load_docs(nlp, path):
+    texts = [item['text'] for item in load_data(SAMPLE_RECORDS, path)]
+    texts += [article['text'] for article in synthetic_corpus(SYNTHETIC_ARTICLES)]
+    segments = [segment for text in texts for segment in segment_text(text, MAX_CHARS, SEGMENT_OVERLAP)]
+    return list(nlp.pipe(segments))
+
+def dependency_matcher(vocab):
+    """RELATION_RULES loaded into spaCy's DependencyMatcher"""
+    matcher = DependencyMatcher(vocab)
+    for rule in RELATION_RULES:
+        matcher.add(rule['name'], rule['patterns'])
+    return matcher
+
+def matcher_triples(doc, entities, mentions, matcher):
+    """Reference output: DependencyMatcher matches assembled into triples the way find_relationships_in_doc does"""
+    if len(entities) < 2:
+        return []
+    index = build_entity_index(doc, entities, mentions)
+    rules = {doc.vocab.strings[rule['name']]: (order, rule) for order, rule in enumerate(RELATION_RULES)}
+    width = max(len(pattern) for rule in RELATION_RULES for pattern in rule['patterns'])
+
+    candidates = []
+    for match_id, tokens in matcher(doc):
+        order, rule = rules[match_id]
+        if rule['relation'] is None:
+            relation = RELATIONS.get(doc[tokens[0]].lemma_.lower())
+            if relation is None or relation[1] < MIN_SCORE:
+                continue
+        else:
+            relation = (rule['relation'], rule['score'])
+        # Matches only say which rule matched; a rule's patterns differ in length
+        pattern = next(pattern for pattern in rule['patterns'] if len(pattern) == len(tokens))
+        names = [node['RIGHT_ID'] for node in pattern]
+        subject, obj = tokens[names.index(rule['subject'])], tokens[names.index(rule['object'])]
+        subj, obj_entity = index[subject], index[obj]
+        if subj and obj_entity and subj != obj_entity and subj[0] != obj_entity[0]:
+            position = (order, *tokens, *[-1] * (width - len(tokens)))
+            candidates.append((position, subj[0], relation[0], obj_entity[0], relation[1]))
+    candidates.sort(key=lambda candidate: candidate[0])
+
+    seen = set()
+    triples = []
+    for _, subj, rel, obj, score in candidates:
+        key = (subj.lower(), rel, obj.lower())
+        if key not in seen and score >= MIN_SCORE:
+            seen.add(key)
+            triples.append((subj, rel, obj))
+    return triples
+
+def time_rules(prepared):
+    start = time.perf_counter()
+    for doc, entities, mentions in prepared:
+        find_relationships_in_doc(doc, entities, mentions)
+    return time.perf_counter() - start
+
+def time_matcher(prepared, matcher):
+    start = time.perf_counter()
+    for doc, entities, mentions in prepared:
+        matcher_triples(doc, entities, mentions, matcher)
+    return time.perf_counter() - start
+
+def main():
+    if len(sys.argv) > 1:
+        nlp = load_nlp()
+        docs = [(doc, None) for doc in load_docs(nlp, sys.argv[1])]
+        vocab = nlp.vocab
+    else:
+        vocab = spacy.blank("en").vocab
+        docs = corpus_docs(vocab)
+        print(f"Hand-built Docs from {CORPUS_FILE}")
+    if not docs:
+        print("No data to benchmark!")
+        return
+
+    matcher = dependency_matcher(vocab)
+    prepared = [(doc, *extract_entity_mentions(doc)) for doc, _ in docs]
+    mismatches = []
+    n_triples = 0
+    for (doc, entities, mentions), (_, expected) in zip(prepared, docs):
+        found = find_relationships_in_doc(doc, entities, mentions)
+        reference = matcher_triples(doc, entities, mentions, matcher)
+        n_triples += len(found)
+        if found != reference or (expected is not None and found != expected):
+            mismatches.append((doc, expected, reference, found))
+    n_tokens = sum(len(doc) for doc, _ in docs)
+    print(f"{len(docs)} Docs, {n_tokens} tokens, {n_triples} triples from the rule engine")
+
+    engine = min(time_rules(prepared) for _ in range(REPEATS))
+    spacy_matcher = min(time_matcher(prepared, matcher) for _ in range(REPEATS))
+    print(f"Rule engine:        {engine * 1000:.2f} ms ({n_tokens / engine:,.0f} tokens/s)")
+    print(f"DependencyMatcher:  {spacy_matcher * 1000:.2f} ms ({n_tokens / spacy_matcher:,.0f} tokens/s)")
+
+    if mismatches:
+        print(f"❌ {len(mismatches)} Docs with different triples")
+        for doc, expected, reference, found in mismatches[:SHOW_MISMATCHES]:
+            print(f"  {doc.text[:80]!r}")
+            if expected is not None:
+                print(f"    expected: {expected}")
+            print(f"    matcher:  {reference}")
+            print(f"    engine:   {found}")
+        sys.exit(1)
+    print("✅ Identical triples on every Doc")
+
+if __name__ == "__main__":
+    main()
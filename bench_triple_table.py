@@ -0,0 +1,80 @@
+"""
+Micro-benchmark: a batch of triples as tuple/metadata lists vs. an interned TripleTable
+Run: python bench_triple_table.py [n_triples]   (exits 1 if grouping or stats differ)
+"""
+import random
+import sys
+import time
+import tracemalloc
+from construct_kg import group_by_relation, get_stats
+from relationship_extractor import RELATIONS
+from triple_table import TripleTable
+
+# Config
+N_TRIPLES = 1_000_000
+N_ENTITIES = 50_000  # Distinct entity names
+TRIPLES_PER_RECORD = 5
+SEED = 7
+
+def synthetic_records(n_triples, seed=SEED):
+    """(metadata, triples) per record; names are built per triple, like fresh extraction output"""
+    rng = random.Random(seed)
+    relations = sorted({relation for relation, _ in RELATIONS.values()} | {'IS_A'})
+    for r in range(0, n_triples, TRIPLES_PER_RECORD):
+        metadata = {'domain': f"domain {r % 7}", 'title': f"Article {r // 50}", 'chunk_id': f"Article {r // 50}_{r}"}
+        triples = [(f"Entity {rng.randrange(N_ENTITIES)}", rng.choice(relations), f"Entity {rng.randrange(N_ENTITIES)}")
+                   for _ in range(min(TRIPLES_PER_RECORD, n_triples - r))]
+        yield metadata, triples
+
+def build_lists(n_triples):
+    triples, metadata_list = [], []
+    for metadata, record in synthetic_records(n_triples):
+        for triple in record:
+            triples.append(triple)
+            metadata_list.append(metadata)
+    return triples, metadata_list
+
+def build_table(n_triples):
+    table = TripleTable()
+    for metadata, record in synthetic_records(n_triples):
+        table.add_record(record, metadata)
+    return table
+
+def measure(build, n_triples):
+    """(result, build seconds, MB still allocated)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(n_triples)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current / 1e6
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    n_triples = int(sys.argv[1]) if len(sys.argv) > 1 else N_TRIPLES
+    (triples, metadata_list), list_build, list_mb = measure(build_lists, n_triples)
+    table, table_build, table_mb = measure(build_table, n_triples)
+
+    list_groups, list_group_s = timed(group_by_relation, triples, metadata_list)
+    table_groups, table_group_s = timed(group_by_relation, table, table.metadata)
+    list_stats, list_stats_s = timed(get_stats, triples)
+    table_stats, table_stats_s = timed(get_stats, table)
+
+    print(f"{n_triples:,} triples, {len(table.entities):,} entities, {len(table.titles):,} titles")
+    print(f"{'':<14} {'memory MB':>10} {'build s':>9} {'group s':>9} {'stats ms':>9}")
+    print(f"{'lists':<14} {list_mb:>10.1f} {list_build:>9.2f} {list_group_s:>9.2f} {list_stats_s * 1000:>9.1f}")
+    print(f"{'TripleTable':<14} {table_mb:>10.1f} {table_build:>9.2f} {table_group_s:>9.2f} {table_stats_s * 1000:>9.1f}")
+    print(f"ID columns: {table.nbytes() / 1e6:.1f} MB")
+
+    if list_groups != table_groups or list_stats != table_stats:
+        print("❌ TripleTable grouping or stats differ from the lists")
+        sys.exit(1)
+    print("✅ Identical Neo4j rows and stats")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+End-to-end benchmark - per-stage throughput, p50/p99 latency and peak RSS, saved as JSON
+Run: python benchmark.py [--sizes 100,1000,10000] [--sample wiki.jsonl] [--neo4j] [--out bench_results]
+     python benchmark.py compare <old.json> <new.json>
+     python benchmark.py profiles [n_docs]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+import spacy
+from chunk_clean import chunk_records, chunk_text, segment_text
+from entity_extractor import MAX_CHARS, PIPELINE_PROFILES, SEGMENT_OVERLAP, load_nlp, load_pipeline
+from graph_store import GraphBuilder
+from prune import SIMILARITY_THRESHOLD, find_duplicate_clusters
+from relationship_extractor import extract_from_doc, merge_extractions
+from retrieval import Retriever
+
+# Config
+SIZES = (100, 1000, 10000)  # Articles per corpus
+CHUNK_SIZE = 256  # Words per chunk, as in chunk_clean.py
+CHUNK_OVERLAP = 32
+NLP_BATCH_SIZE = 64
+N_QUESTIONS = 200
+N_PROFILE_DOCS = 500  # Chunks parsed per pipeline profile by `profiles`
+QUESTIONS_FILE = "replay_buffer_dataset.jsonl"
+RESULTS_DIR = "bench_results"
+RSS_INTERVAL = 0.01  # Seconds between RSS samples
+REGRESSION_TOLERANCE = 0.10  # compare flags throughput drops and latency rises above this
+SEED = 7
+
+def current_rss():
+    """Resident set size in bytes (Linux /proc; elsewhere the peak so far)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return peak_rss()
+
+def peak_rss():
+    """Process peak RSS in bytes (ru_maxrss is bytes on macOS, KiB on Linux)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class StageMeter:
+    """Per-item latencies plus the highest RSS seen while the stage runs"""
+
+    def __init__(self):
+        self.latencies = []
+        self.items = 0
+        self.peak = current_rss()
+        self.start_rss = self.peak
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(RSS_INTERVAL):
+            self.peak = max(self.peak, current_rss())
+
+    def record(self, seconds, items=1):
+        """One timed unit of work covering `items` items"""
+        self.latencies.append(seconds)
+        self.items += items
+
+    def timed(self, iterable):
+        """Yield from an iterable, recording the time spent producing each item"""
+        last = time.perf_counter()
+        for item in iterable:
+            now = time.perf_counter()
+            self.record(now - last)
+            yield item
+            last = time.perf_counter()
+
+@contextmanager
+def measure(results, stage):
+    """Time a stage and store its metrics in results[stage]"""
+    meter = StageMeter()
+    meter._sampler.start()
+    start = time.perf_counter()
+    try:
+        yield meter
+    finally:
+        seconds = time.perf_counter() - start
+        meter._stop.set()
+        meter._sampler.join()
+        meter.peak = max(meter.peak, current_rss())
+        latencies_ms = 1000 * np.asarray(meter.latencies or [seconds])
+        results[stage] = {
+            'items': meter.items,
+            'seconds': round(seconds, 4),
+            'throughput_per_s': round(meter.items / seconds, 2) if seconds > 0 else None,
+            'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+            'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3),
+            'peak_rss_mb': round(meter.peak / 1024 ** 2, 1),
+            'rss_growth_mb': round((meter.peak - meter.start_rss) / 1024 ** 2, 1)
+        }
+        print(f"  {stage:<20} {meter.items:>8} items  {results[stage]['throughput_per_s'] or 0:>10.1f}/s  "
+              f"p50 {results[stage]['p50_ms']:.2f} ms  p99 {results[stage]['p99_ms']:.2f} ms  "
+              f"peak {results[stage]['peak_rss_mb']:.0f} MB")
+
+def synthetic_corpus(n_articles, seed=SEED):
+    """Wikipedia-like articles: entity-dense sentences using the verbs in RELATIONS"""
+    rng = random.Random(seed)
+    first = ["Anna", "Boris", "Chen", "Diego", "Elena", "Farid", "Greta", "Hiro", "Ines", "Jonas", "Kofi", "Lena"]
+    last = ["Berg", "Costa", "Dubois", "Ebert", "Fischer", "Garcia", "Hansen", "Ito", "Jansen", "Kowalski"]
+    orgs = ["Acme", "Borealis", "Cobalt", "Dynamo", "Everest", "Fjord", "Granite", "Helix", "Ion", "Juniper"]
+    suffixes = ["Corporation", "Institute", "University", "Systems", "Foundation", "Group"]
+    places = ["Berlin", "Lisbon", "Osaka", "Toronto", "Nairobi", "Santiago", "Oslo", "Mumbai", "Denver", "Krakow"]
+    templates = ["{p} founded {o} in {c}.", "{p} works for {o}.", "{o} acquired {o2} in {y}.",
+                 "{o} is headquartered in {c}.", "{p} leads {o}.", "{p} studies physics at {o}.",
+                 "{o} develops software in {c}.", "{p} teaches history at {o} in {c}.",
+                 "In {y}, {p} moved to {c} and joined {o}.", "The weather in {c} was mild that year."]
+
+    articles = []
+    for i in range(n_articles):
+        sentences = []
+        for _ in range(rng.randint(20, 60)):
+            sentences.append(rng.choice(templates).format(
+                p=f"{rng.choice(first)} {rng.choice(last)}",
+                o=f"{rng.choice(orgs)} {rng.choice(suffixes)}",
+                o2=f"{rng.choice(orgs)} {rng.choice(suffixes)}",
+                c=rng.choice(places), y=rng.randint(1900, 2020)))
+        articles.append({'title': f"Synthetic article {i}", 'domain': 'synthetic', 'text': " ".join(sentences)})
+    return articles
+
+def sample_corpus(path, n_articles, seed=SEED):
+    """Reservoir sample of n_articles records with text from a JSONL dump"""
+    rng = random.Random(seed)
+    sample = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not record.get('text'):
+                continue
+            if len(sample) < n_articles:
+                sample.append(record)
+            else:
+                j = rng.randint(0, i)
+                if j < n_articles:
+                    sample[j] = record
+    return sample
+
+def load_questions(path=QUESTIONS_FILE, n=N_QUESTIONS):
+    with open(path, 'r', encoding='utf-8') as f:
+        questions = [json.loads(line)['question'] for line in f if line.strip()]
+    random.Random(SEED).shuffle(questions)
+    return questions[:n]
+
+def run_corpus(articles, nlp, questions, use_neo4j=False):
+    """Run every stage on one corpus; returns {stage: metrics}"""
+    results = {}
+
+    with measure(results, 'clean_chunk') as meter:
+        for article in articles:
+            start = time.perf_counter()
+            chunk_records(article, CHUNK_SIZE, CHUNK_OVERLAP)
+            meter.record(time.perf_counter() - start)
+
+    # Extraction parses raw-text chunks (chunk_clean lowercases, which NER cannot use), split into
+    # sentence-aligned segments and merged back per record the way construct_kg.stream_extractions does
+    records = [{'text': chunk, 'title': article.get('title', 'unknown'),
+                'domain': article.get('domain', 'unknown'), 'chunk_id': f"{article.get('title')}_{i + 1}"}
+               for article in articles for i, chunk in enumerate(chunk_text(article['text'], CHUNK_SIZE, CHUNK_OVERLAP))]
+    segments = []
+    for record in records:
+        texts = segment_text(record['text'], MAX_CHARS, SEGMENT_OVERLAP)
+        segments += [(text, (record, i == len(texts) - 1)) for i, text in enumerate(texts)]
+
+    # The whole nlp.pipe (tagger, parser, lemmatizer, NER), one latency per segment
+    parsed = []
+    with measure(results, 'parse') as meter:
+        docs = nlp.pipe(segments, as_tuples=True, batch_size=NLP_BATCH_SIZE)
+        for doc, (record, last) in meter.timed(docs):
+            parsed.append((doc, record, last))
+
+    # Entity mentions and relation rules per segment, one latency per record
+    extracted = []
+    with measure(results, 'extract') as meter:
+        parts, start = [], time.perf_counter()
+        for doc, record, last in parsed:
+            parts.append(extract_from_doc(doc))
+            if last:
+                _, triples = merge_extractions(parts)
+                meter.record(time.perf_counter() - start)
+                extracted.append((triples, record))
+                parts, start = [], time.perf_counter()
+    del parsed
+
+    builder = GraphBuilder()
+    if use_neo4j:
+        from construct_kg import close_driver, write_to_neo4j
+    try:
+        with measure(results, 'graph_write') as meter:
+            for triples, record in extracted:
+                start = time.perf_counter()
+                builder.add(triples, [record] * len(triples))
+                if use_neo4j:
+                    write_to_neo4j(triples, [record] * len(triples))
+                meter.record(time.perf_counter() - start, len(triples))
+            start = time.perf_counter()
+            store = builder.build()
+            meter.record(time.perf_counter() - start, 0)
+    finally:
+        if use_neo4j:
+            close_driver()
+
+    with measure(results, 'prune') as meter:
+        start = time.perf_counter()
+        find_duplicate_clusters(store.nodes.names, SIMILARITY_THRESHOLD)
+        meter.record(time.perf_counter() - start, store.num_nodes)
+
+    retriever = Retriever(store, nlp)
+    with measure(results, 'retrieval') as meter:
+        for question in questions:
+            start = time.perf_counter()
+            retriever.retrieve(question)
+            meter.record(time.perf_counter() - start)
+
+    results['graph'] = {'records': len(records), 'nodes': store.num_nodes, 'edges': store.num_edges}
+    return results
+
+def environment(nlp):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'spacy': spacy.__version__,
+        'model': f"{nlp.meta.get('lang')}_{nlp.meta.get('name')}-{nlp.meta.get('version')}",
+        'pipeline': list(nlp.pipe_names)
+    }
+
+def run(sizes, sample_path=None, use_neo4j=False, out_dir=RESULTS_DIR):
+    start = time.perf_counter()
+    nlp = load_nlp()
+    load_seconds = time.perf_counter() - start
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'environment': {**environment(nlp), 'nlp_load_s': round(load_seconds, 3)},
+              'config': {'chunk_size': CHUNK_SIZE, 'chunk_overlap': CHUNK_OVERLAP, 'nlp_batch_size': NLP_BATCH_SIZE,
+                         'n_questions': N_QUESTIONS, 'neo4j': use_neo4j},
+              'corpora': {}}
+
+    corpora = [('synthetic', size, lambda n: synthetic_corpus(n)) for size in sizes]
+    if sample_path:
+        corpora += [('sampled', size, lambda n: sample_corpus(sample_path, n)) for size in sizes]
+
+    for kind, size, make in corpora:
+        articles = make(size)
+        name = f"{kind}_{size}"
+        print(f"\n📊 {name}: {len(articles)} articles")
+        # Synthetic entities never appear in the QA set, so ask about names from the corpus instead
+        questions = load_questions() if kind == 'sampled' else [
+            f"Who works for {a['text'].split(' works for ')[1].split('.')[0]}?"
+            for a in articles if ' works for ' in a['text']][:N_QUESTIONS]
+        report['corpora'][name] = run_corpus(articles, nlp, questions, use_neo4j)
+
+    os.makedirs(out_dir, exist_ok=True)
+    commit = report['environment']['commit'] or 'nocommit'
+    stem = os.path.join(out_dir, f"bench_{time.strftime('%Y%m%d_%H%M%S')}_{commit}")
+    path, n = f"{stem}.json", 1
+    while os.path.exists(path):
+        path, n = f"{stem}_{n}.json", n + 1
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results saved to {path}")
+    return path
+
+def profile_pipelines(n_docs=N_PROFILE_DOCS, profiles=tuple(PIPELINE_PROFILES)):
+    """Startup time and per-doc parse latency of each pipeline profile (fresh load each)"""
+    texts = [segment for article in synthetic_corpus(n_docs)
+             for chunk in chunk_text(article['text'], CHUNK_SIZE, CHUNK_OVERLAP)
+             for segment in segment_text(chunk, MAX_CHARS, SEGMENT_OVERLAP)][:n_docs]
+    print(f"{len(texts)} segments per profile (the first load also pays for cold imports and disk cache)")
+    results = {}
+    for profile in profiles:
+        with measure(results, f"load_{profile}") as meter:
+            start = time.perf_counter()
+            nlp = load_pipeline(profile)
+            meter.record(time.perf_counter() - start)
+        with measure(results, f"parse_{profile}") as meter:
+            for _ in meter.timed(nlp.pipe(texts, batch_size=NLP_BATCH_SIZE)):
+                pass
+        del nlp
+    return results
+
+def compare(old_path, new_path, tolerance=REGRESSION_TOLERANCE):
+    """Print per-stage changes between two result files; returns the number of regressions"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{old['environment']['commit']} -> {new['environment']['commit']}")
+
+    regressions = 0
+    for corpus, stages in new['corpora'].items():
+        if corpus not in old['corpora']:
+            continue
+        print(f"\n{corpus}")
+        for stage, metrics in stages.items():
+            before = old['corpora'][corpus].get(stage)
+            if stage == 'graph' or not before or not before['throughput_per_s'] or not metrics['throughput_per_s']:
+                continue
+            speed = metrics['throughput_per_s'] / before['throughput_per_s']
+            p99 = metrics['p99_ms'] / before['p99_ms'] if before['p99_ms'] else 1.0
+            slower = speed < 1 - tolerance or p99 > 1 + tolerance
+            regressions += slower
+            print(f"  {'❌' if slower else '  '} {stage:<20} throughput x{speed:.2f}  p99 x{p99:.2f}  "
+                  f"peak RSS {before['peak_rss_mb']:.0f} -> {metrics['peak_rss_mb']:.0f} MB")
+    print(f"\n{regressions} regressions above {tolerance:.0%}")
+    return regressions
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "compare":
+        if len(sys.argv) != 4:
+            print("Usage: python benchmark.py compare <old.json> <new.json>")
+            sys.exit(2)
+        sys.exit(1 if compare(sys.argv[2], sys.argv[3]) else 0)
+    if len(sys.argv) >= 2 and sys.argv[1] == "profiles":
+        profile_pipelines(int(sys.argv[2]) if len(sys.argv) > 2 else N_PROFILE_DOCS)
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=",".join(map(str, SIZES)), help="Articles per corpus, comma separated")
+    parser.add_argument('--sample', help="JSONL dump to sample Wikipedia-like corpora from")
+    parser.add_argument('--neo4j', action='store_true', help="Also write each batch to Neo4j in graph_write")
+    parser.add_argument('--out', default=RESULTS_DIR)
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(",")], args.sample, args.neo4j, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,15 @@
 import json
 import re
 import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from columnar import CHUNK_COLUMNS, ColumnarWriter, file_format, iter_batches
+
+# Compiled once at import instead of looked up in the re cache on every call
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+HTML_TAG_PATTERN = re.compile(r'<.*?>')
+DISALLOWED_CHARS_PATTERN = re.compile(r'[^a-z0-9\s.,?!]+')
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
 
 def clean_text(text: str) -> str:
     if not isinstance(text, str):
@@ -9,20 +18,22 @@ def clean_text(text: str) -> str:
     # 1. Convert to lowercase
     text = text.lower()
 
-    # 2. Remove URLs
-    text = re.sub(r'https?://\S+|www\.\S+', '', text)
+    # 2. Remove URLs (skipped when no URL can match)
+    if 'http' in text or 'www.' in text:
+        text = URL_PATTERN.sub('', text)
 
-    # 3. Remove HTML tags
-    text = re.sub(r'<.*?>', '', text)
+    # 3. Remove HTML tags (skipped when there is no tag opener)
+    if '<' in text:
+        text = HTML_TAG_PATTERN.sub('', text)
 
     # 4. Remove anything that isn't a letter, number, or basic punctuation (.,?!)
     # This helps remove strange characters, control characters, etc.
-    text = re.sub(r'[^a-z0-9\s.,?!]', '', text)
-
-    # 5. Remove extra whitespace (multiple spaces, newlines, tabs)
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = DISALLOWED_CHARS_PATTERN.sub('', text)
 
-    return text
+    # 5. Remove extra whitespace (multiple spaces, newlines, tabs).
+    # str.split() uses the same whitespace definition as \s, so this equals
+    # re.sub(r'\s+', ' ', text).strip() without another regex pass.
+    return ' '.join(text.split())
 
 def chunk_text(text: str, chunk_size: int, overlap: int) -> list[str]:
     words = text.split()
@@ -46,23 +57,123 @@ def chunk_text(text: str, chunk_size: int, overlap: int) -> list[str]:
 
     return chunks
 
+def split_sentences(text: str, max_chars: int) -> list[str]:
+    """Split raw text at sentence ends and blank lines; sentences over max_chars are cut at spaces."""
+    sentences = []
+    for sentence in SENTENCE_BOUNDARY_PATTERN.split(text):
+        sentence = sentence.strip()
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars + 1)
+            if cut <= 0:
+                cut = max_chars
+            sentences.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+def segment_text(text: str, max_chars: int, overlap: int = 0) -> list[str]:
+    """
+    Cover the whole text with segments of at most max_chars that end on
+    sentence boundaries. Each segment after the first repeats the trailing
+    sentences of the previous one (up to `overlap` characters), so a sentence
+    cut off at a boundary is still parsed whole. Texts that fit are returned as is.
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    segments = []
+    current, size = [], 0
+    for sentence in split_sentences(text, max_chars):
+        if current and size + 1 + len(sentence) > max_chars:
+            segments.append(" ".join(current))
+            # Carry trailing sentences over, as long as they fit in the overlap and leave room for this one
+            budget = min(overlap, max_chars - len(sentence) - 1)
+            carried, size = [], 0
+            for previous in reversed(current):
+                if size + len(previous) + (1 if carried else 0) > budget:
+                    break
+                size += len(previous) + (1 if carried else 0)
+                carried.insert(0, previous)
+            current = carried
+        size += len(sentence) + (1 if current else 0)
+        current.append(sentence)
+    if current:
+        segments.append(" ".join(current))
+    return segments or [text[:max_chars]]
+
+def chunk_rows(data: dict, chunk_size: int, chunk_overlap: int) -> list[dict]:
+    """Clean and chunk one article; returns one record per chunk."""
+    # Get the original text, domain, and title
+    original_text = data.get("text", "")
+    domain = data.get("domain")
+    title = data.get("title")
+
+    # 1. Clean the text
+    cleaned_text = clean_text(original_text)
+    
+    # 2. Chunk the cleaned text
+    chunks = chunk_text(cleaned_text, chunk_size, chunk_overlap)
+    
+    # 3. Create a new record for each chunk
+    return [{
+        "domain": domain,
+        "title": title,
+        "chunk_id": f"{title}_{i+1}", # Unique ID for the chunk
+        "text": chunk
+    } for i, chunk in enumerate(chunks)]
+
+def chunk_records(data: dict, chunk_size: int, chunk_overlap: int) -> list[str]:
+    """Clean and chunk one article; returns the JSONL lines for its chunks."""
+    return [json.dumps(record) + '\n' for record in chunk_rows(data, chunk_size, chunk_overlap)]
+
+class ChunkWriter:
+    """Chunk output: JSONL lines, or an Arrow/Parquet table (see columnar.py) for fmt "arrow"/"parquet"."""
+
+    def __init__(self, output_path: str, fmt: str = "jsonl"):
+        self.fmt = fmt
+        if fmt == "jsonl":
+            self._file = open(output_path, 'w', encoding='utf-8')
+        else:
+            self._table = ColumnarWriter(output_path, CHUNK_COLUMNS, fmt=fmt)
+
+    def write_article(self, data: dict, chunk_size: int, chunk_overlap: int) -> int:
+        """Clean, chunk and write one article; returns the number of chunks."""
+        if self.fmt == "jsonl":
+            lines = chunk_records(data, chunk_size, chunk_overlap)
+            self._file.writelines(lines)
+            return len(lines)
+        rows = chunk_rows(data, chunk_size, chunk_overlap)
+        for row in rows:
+            self._table.append(row)
+        return len(rows)
+
+    def close(self):
+        if self.fmt == "jsonl":
+            self._file.close()
+        else:
+            self._table.close()
+
+def _ensure_output_dir(output_path: str):
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"Created output directory: {output_dir}")
+
 def process_wikipedia_dump(input_path: str, output_path: str, chunk_size: int, chunk_overlap: int):
     """
     Reads a JSONL file, cleans and chunks the 'text' field, and writes
-    the new chunked data to another JSONL file.
+    the new chunked data to another JSONL file (or an Arrow/Parquet table,
+    by the output file extension).
     """
     print(f"Starting processing for file: {input_path}")
     
     # Ensure the output directory exists
-    output_dir = os.path.dirname(output_path)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        print(f"Created output directory: {output_dir}")
+    _ensure_output_dir(output_path)
 
     try:
-        with open(input_path, 'r', encoding='utf-8') as infile, \
-             open(output_path, 'w', encoding='utf-8') as outfile:
-            
+        with open(input_path, 'r', encoding='utf-8') as infile:
+            outfile = ChunkWriter(output_path, file_format(output_path))
             processed_lines = 0
             total_chunks = 0
             
@@ -71,27 +182,8 @@ def process_wikipedia_dump(input_path: str, output_path: str, chunk_size: int, c
                     # Load the JSON object from the line
                     data = json.loads(line)
                     
-                    # Get the original text, domain, and title
-                    original_text = data.get("text", "")
-                    domain = data.get("domain")
-                    title = data.get("title")
-
-                    # 1. Clean the text
-                    cleaned_text = clean_text(original_text)
-                    
-                    # 2. Chunk the cleaned text
-                    chunks = chunk_text(cleaned_text, chunk_size, chunk_overlap)
-                    
-                    # 3. Write each chunk as a new JSON object to the output file
-                    for i, chunk in enumerate(chunks):
-                        new_record = {
-                            "domain": domain,
-                            "title": title,
-                            "chunk_id": f"{title}_{i+1}", # Unique ID for the chunk
-                            "text": chunk
-                        }
-                        outfile.write(json.dumps(new_record) + '\n')
-                        total_chunks += 1
+                    # Clean, chunk and write each chunk to the output file
+                    total_chunks += outfile.write_article(data, chunk_size, chunk_overlap)
 
                     processed_lines += 1
                     if processed_lines % 1000 == 0:
@@ -100,6 +192,7 @@ def process_wikipedia_dump(input_path: str, output_path: str, chunk_size: int, c
                 except json.JSONDecodeError:
                     print(f"Warning: Skipping a line due to JSON decoding error.")
                     continue
+            outfile.close()
 
         print("\nProcessing complete!")
         print(f"Total articles processed: {processed_lines}")
@@ -111,16 +204,133 @@ def process_wikipedia_dump(input_path: str, output_path: str, chunk_size: int, c
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
+def shard_offsets(input_path: str, num_shards: int) -> list[int]:
+    """
+    Split a JSONL file into byte ranges that start on line boundaries.
+    Returns sorted offsets [0, ..., file_size]; shard k covers offsets[k]:offsets[k+1].
+    """
+    size = os.path.getsize(input_path)
+    offsets = [0]
+    with open(input_path, 'rb') as f:
+        for k in range(1, num_shards):
+            position = size * k // num_shards
+            if position <= offsets[-1]:
+                continue
+            # Step back one byte so a line starting exactly at `position` is kept
+            f.seek(position - 1)
+            f.readline()
+            if f.tell() > offsets[-1] and f.tell() < size:
+                offsets.append(f.tell())
+    offsets.append(size)
+    return offsets
+
+def shard_path(output_path: str, index: int) -> str:
+    return f"{output_path}.shard-{index:05d}"
+
+def process_shard(input_path: str, start: int, end: int, output_path: str,
+                  chunk_size: int, chunk_overlap: int, fmt: str = "jsonl") -> tuple[int, int, int]:
+    """
+    Clean and chunk the lines starting in [start, end) of the input file.
+    Runs in a worker process; returns (articles, chunks, skipped lines).
+    """
+    processed_lines = 0
+    total_chunks = 0
+    skipped = 0
+    outfile = ChunkWriter(output_path, fmt)
+    with open(input_path, 'rb') as infile:
+        infile.seek(start)
+        while infile.tell() < end:
+            line = infile.readline()
+            if not line:
+                break
+            try:
+                data = json.loads(line.decode('utf-8'))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                skipped += 1
+                continue
+            total_chunks += outfile.write_article(data, chunk_size, chunk_overlap)
+            processed_lines += 1
+    outfile.close()
+    return processed_lines, total_chunks, skipped
+
+def merge_shards(shard_paths: list[str], output_path: str, fmt: str = "jsonl"):
+    """Concatenate shard files in order into one output file and remove them."""
+    if fmt != "jsonl":
+        # Record batches are copied as they are, each keeping its own dictionaries
+        writer = ColumnarWriter(output_path, CHUNK_COLUMNS, fmt=fmt)
+        for path in shard_paths:
+            for batch in iter_batches(path, fmt=fmt):
+                writer.write_batch(batch)
+            os.remove(path)
+        writer.close()
+        return
+    with open(output_path, 'wb') as outfile:
+        for path in shard_paths:
+            with open(path, 'rb') as shard:
+                shutil.copyfileobj(shard, outfile, 1024 * 1024)
+            os.remove(path)
+
+def process_wikipedia_dump_sharded(input_path: str, output_path: str, chunk_size: int, chunk_overlap: int,
+                                   num_workers: int = os.cpu_count() or 1, merge: bool = True) -> list[str]:
+    """
+    Parallel version of process_wikipedia_dump. The input is split by byte offset,
+    each worker process writes its own output shard, and shards are optionally
+    merged into output_path. The merged file is identical to the serial output.
+    Returns the paths written.
+    """
+    print(f"Starting sharded processing for file: {input_path} ({num_workers} workers)")
+    _ensure_output_dir(output_path)
+
+    try:
+        offsets = shard_offsets(input_path, num_workers)
+    except FileNotFoundError:
+        print(f"Error: Input file not found at '{input_path}'")
+        return []
+
+    ranges = list(zip(offsets[:-1], offsets[1:]))
+    paths = [shard_path(output_path, i) for i in range(len(ranges))]
+    fmt = file_format(output_path)  # Shards are written in the output's format
+
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        futures = [pool.submit(process_shard, input_path, start, end, path, chunk_size, chunk_overlap, fmt)
+                   for (start, end), path in zip(ranges, paths)]
+        results = [future.result() for future in futures]
+
+    processed_lines = sum(r[0] for r in results)
+    total_chunks = sum(r[1] for r in results)
+    skipped = sum(r[2] for r in results)
+
+    if merge:
+        merge_shards(paths, output_path, fmt)
+        paths = [output_path]
+
+    print("\nProcessing complete!")
+    print(f"Total articles processed: {processed_lines}")
+    print(f"Total chunks generated: {total_chunks}")
+    if skipped:
+        print(f"Warning: Skipped {skipped} lines due to JSON decoding errors.")
+    more = f" (+{len(paths) - 1} more shards)" if len(paths) > 1 else ""
+    print(f"Cleaned and chunked data saved to: {paths[0]}{more}")
+    return paths
+
 
 if __name__ == '__main__':
     # --- Configuration ---
     # Set your input and output file paths here
     INPUT_FILE = '/Users/kabir/Desktop/Research/Implementation/wikipedia_subset.jsonl'
-    OUTPUT_FILE = '/Users/kabir/Desktop/Research/Implementation/clean_raw_wiki.jsonl'
+    OUTPUT_FILE = '/Users/kabir/Desktop/Research/Implementation/clean_raw_wiki.jsonl'  # .arrow / .parquet write a columnar table
 
     # Set your desired chunking parameters
     CHUNK_SIZE = 256  # Number of words per chunk
     CHUNK_OVERLAP = 32 # Number of words to overlap between chunks
 
+    # Parallelism: more than one worker splits the input into byte-range shards
+    NUM_WORKERS = os.cpu_count() or 1
+    MERGE_SHARDS = True  # False keeps one output file per worker
+
     # --- Run the script ---
-    process_wikipedia_dump(INPUT_FILE, OUTPUT_FILE, CHUNK_SIZE, CHUNK_OVERLAP)
\ No newline at end of file
+    if NUM_WORKERS > 1:
+        process_wikipedia_dump_sharded(INPUT_FILE, OUTPUT_FILE, CHUNK_SIZE, CHUNK_OVERLAP,
+                                       NUM_WORKERS, MERGE_SHARDS)
+    else:
+        process_wikipedia_dump(INPUT_FILE, OUTPUT_FILE, CHUNK_SIZE, CHUNK_OVERLAP)
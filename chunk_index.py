@@ -0,0 +1,149 @@
+"""
+Chunk inverted index - entity ID -> array-backed posting list of (chunk ID, count)
+"""
+import json
+from array import array
+import numpy as np
+from columnar import file_format, iter_rows
+from ingest_manifest import chunk_key
+
+POSTING_ARRAYS = ("chunk_indptr", "chunk_ids", "chunk_counts", "chunk_offsets")
+
+class ChunkIndexBuilder:
+    """
+    Collect postings while triples stream in. A chunk's count for an entity is
+    the number of that chunk's triples the entity takes part in.
+    Postings are appended to flat array('i') columns (12 bytes each) and only
+    sorted into lists by build().
+    """
+
+    def __init__(self, entities):
+        self.entities = entities  # Interner shared with the graph, so entity IDs line up
+        self.chunk_ids = {}
+        self.chunk_names = []
+        self.chunk_titles = []
+        self.chunk_offsets = array('q')  # Byte offset of each chunk's line, or its row in a table input (-1 if unknown)
+        self._entity = array('i')
+        self._chunk = array('i')
+        self._count = array('i')
+
+    def _chunk_id(self, metadata):
+        key = chunk_key(metadata)
+        i = self.chunk_ids.get(key)
+        if i is None:
+            i = self.chunk_ids[key] = len(self.chunk_names)
+            self.chunk_names.append(key)
+            self.chunk_titles.append(metadata.get('title', 'unknown'))
+            self.chunk_offsets.append(metadata.get('line_start', -1))
+        return i
+
+    def add_record(self, triples, metadata):
+        """Post every entity in one chunk's triples"""
+        counts = {}
+        for subj, _, obj in triples:
+            counts[subj] = counts.get(subj, 0) + 1
+            if obj != subj:
+                counts[obj] = counts.get(obj, 0) + 1
+        if not counts:
+            return
+        chunk = self._chunk_id(metadata)
+        for name, count in counts.items():
+            self._entity.append(self.entities.intern(name))
+            self._chunk.append(chunk)
+            self._count.append(count)
+
+    def add(self, triples, metadata_list):
+        """Add a batch of triples (same arguments as write_to_neo4j); records share one metadata dict"""
+        metadata_at = lambda i: metadata_list[i] if i < len(metadata_list) else {}
+        start = 0
+        for i in range(1, len(triples) + 1):
+            if i == len(triples) or metadata_at(i) is not metadata_at(start):
+                self.add_record(triples[start:i], metadata_at(start))
+                start = i
+
+    def build(self):
+        """Freeze into a ChunkIndex (postings sorted by entity, then chunk; repeats summed)"""
+        n = len(self.entities)
+        entity = np.frombuffer(self._entity, dtype=np.int32).copy()  # Copies release the arrays for more appends
+        chunk = np.frombuffer(self._chunk, dtype=np.int32).copy()
+        count = np.frombuffer(self._count, dtype=np.int32).copy()
+
+        codes = entity.astype(np.int64) * max(len(self.chunk_names), 1) + chunk
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        first = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.int64)
+        counts = np.add.reduceat(count[order], first).astype(np.int32) if len(first) else np.array([], dtype=np.int32)
+        entity = entity[order][first]
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entity, minlength=n), out=indptr[1:])
+        return ChunkIndex(self.chunk_names, self.chunk_titles, indptr, chunk[order][first], counts,
+                          np.frombuffer(self.chunk_offsets, dtype=np.int64).copy())
+
+class ChunkIndex:
+    """
+    Read-only postings: the chunks mentioning entity i are
+    chunk_ids[chunk_indptr[i]:chunk_indptr[i+1]], with parallel counts.
+    Arrays may be memory-mapped; they are saved alongside the GraphStore arrays.
+    """
+
+    def __init__(self, chunk_names, chunk_titles, chunk_indptr, chunk_ids, chunk_counts, chunk_offsets):
+        self.chunk_names = list(chunk_names)
+        self.chunk_titles = list(chunk_titles)
+        self.chunk_indptr = chunk_indptr
+        self.chunk_ids = chunk_ids
+        self.chunk_counts = chunk_counts
+        self.chunk_offsets = chunk_offsets
+
+    @property
+    def num_chunks(self):
+        return len(self.chunk_names)
+
+    @property
+    def num_postings(self):
+        return len(self.chunk_ids)
+
+    def postings(self, entity_id):
+        """(chunk IDs, counts) for one entity"""
+        lo, hi = self.chunk_indptr[entity_id], self.chunk_indptr[entity_id + 1]
+        return self.chunk_ids[lo:hi], self.chunk_counts[lo:hi]
+
+    def arrays(self):
+        return {name: np.asarray(getattr(self, name)) for name in POSTING_ARRAYS}
+
+    def meta(self):
+        return {'names': self.chunk_names, 'titles': self.chunk_titles}
+
+    @classmethod
+    def from_saved(cls, meta, arrays):
+        return cls(meta['names'], meta['titles'], *arrays)
+
+def read_passages(path, offsets):
+    """
+    Fetch chunk texts by seeking to their line offsets (None where the offset is unknown).
+    For an Arrow/Parquet chunk table the offsets are row numbers instead.
+    """
+    if file_format(path) != "jsonl":
+        return read_table_passages(path, offsets)
+    texts = []
+    with open(path, 'rb') as f:
+        for offset in offsets:
+            if offset < 0:
+                texts.append(None)
+                continue
+            f.seek(int(offset))
+            texts.append(json.loads(f.readline().decode('utf-8'))['text'])
+    return texts
+
+def read_table_passages(path, rows):
+    """read_passages for a chunk table: one pass over the batches spanning the wanted rows"""
+    wanted = {int(row) for row in rows if row >= 0}
+    texts = {}
+    if wanted:
+        last = max(wanted)
+        for row, record in iter_rows(path, ('text',), min(wanted)):
+            if row in wanted:
+                texts[row] = record['text']
+            if row >= last:
+                break
+    return [texts.get(int(row)) for row in rows]
@@ -0,0 +1,257 @@
+"""
+Columnar intermediates - chunk and triple tables as Arrow IPC or Parquet instead of JSONL
+Run: python columnar.py convert <chunks.jsonl> <chunks.arrow | chunks.parquet>
+     python columnar.py query <triples.arrow | triples.parquet> <entity> [relation]
+     python columnar.py info <table.arrow | table.parquet>
+"""
+import json
+import os
+import sys
+from triple_table import TripleTable
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # Optional; only needed for .arrow / .parquet paths
+    pa = None
+
+# Config
+TRIPLES_FILE = "/Users/kabir/Desktop/Research/Implementation/triples.arrow"
+BATCH_ROWS = 10_000  # Rows per record batch (Arrow) or row group (Parquet)
+PARQUET_COMPRESSION = "zstd"
+FORMATS = {".arrow": "arrow", ".parquet": "parquet"}  # Any other extension is JSONL
+
+# (column, dictionary-encoded); every column is a string
+CHUNK_COLUMNS = (("domain", True), ("title", True), ("chunk_id", False), ("text", False))
+TRIPLE_COLUMNS = (("subject", True), ("relation", True), ("object", True),
+                  ("domain", True), ("source", True), ("chunk_id", False))
+
+def _require():
+    if pa is None:
+        raise RuntimeError("Arrow/Parquet files need pyarrow: pip install pyarrow")
+
+def file_format(path):
+    """'arrow', 'parquet' or 'jsonl', from the file extension"""
+    return FORMATS.get(os.path.splitext(path)[1].lower(), "jsonl")
+
+def _schema(columns):
+    return pa.schema([(name, pa.dictionary(pa.int32(), pa.string()) if dictionary else pa.string())
+                      for name, dictionary in columns])
+
+class ColumnarWriter:
+    """
+    Buffer rows column by column and write them as record batches of batch_rows.
+    Arrow files use the IPC stream format, so every batch carries its own
+    dictionaries (the file format would need one dictionary grown over the
+    whole file); Parquet dictionary-encodes per row group. The file only
+    appears under its name on close().
+    """
+
+    def __init__(self, path, columns, batch_rows=BATCH_ROWS, fmt=None):
+        _require()
+        self.path = path
+        self.columns = columns
+        self.batch_rows = batch_rows
+        self.fmt = fmt or file_format(path)
+        if self.fmt not in FORMATS.values():
+            raise ValueError(f"Not a columnar format: {self.fmt}")
+        self.schema = _schema(columns)
+        self.rows = 0
+        self._buffers = [[] for _ in columns]
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._tmp = f"{path}.tmp"
+        if self.fmt == "parquet":
+            self._sink = None
+            self._writer = pq.ParquetWriter(self._tmp, self.schema, compression=PARQUET_COMPRESSION,
+                                            use_dictionary=[name for name, dictionary in columns if dictionary])
+        else:
+            self._sink = pa.OSFile(self._tmp, 'wb')
+            self._writer = ipc.new_stream(self._sink, self.schema)
+
+    def append(self, row):
+        """Add one row (a dict; missing columns are null)"""
+        for (name, _), values in zip(self.columns, self._buffers):
+            values.append(row.get(name))
+        if len(self._buffers[0]) >= self.batch_rows:
+            self._flush()
+
+    def write_batch(self, batch):
+        """Write an already built record batch with this schema (e.g. read from another table)"""
+        self._flush()
+        self._write(batch)
+
+    def _write(self, batch):
+        if self.fmt == "parquet":
+            self._writer.write_table(pa.Table.from_batches([batch], schema=self.schema))
+        else:
+            self._writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def _flush(self):
+        if not self._buffers[0]:
+            return
+        arrays = []
+        for (_, dictionary), values in zip(self.columns, self._buffers):
+            array = pa.array(values, pa.string())
+            arrays.append(array.dictionary_encode() if dictionary else array)
+        self._write(pa.record_batch(arrays, schema=self.schema))
+        self._buffers = [[] for _ in self.columns]
+
+    def close(self):
+        """Write the last batch, move the file into place and return the row count"""
+        self._flush()
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+        os.replace(self._tmp, self.path)
+        return self.rows
+
+    def abort(self):
+        """Give up after a failed run: discard the temp file, leaving any earlier file at path untouched"""
+        try:
+            self._writer.close()
+            if self._sink is not None:
+                self._sink.close()
+        finally:
+            if os.path.exists(self._tmp):
+                os.remove(self._tmp)
+
+class TripleTableWriter(ColumnarWriter):
+    """Graph sink writing one row per extracted triple (same arguments as write_to_neo4j)"""
+
+    def __init__(self, path=TRIPLES_FILE, batch_rows=BATCH_ROWS):
+        super().__init__(path, TRIPLE_COLUMNS, batch_rows)
+
+    def add(self, triples, metadata_list):
+        if isinstance(triples, TripleTable):
+            self.write_batch(self._table_batch(triples))
+            return
+        for i, (subj, rel, obj) in enumerate(triples):
+            metadata = metadata_list[i] if i < len(metadata_list) else {}
+            self.append({
+                'subject': subj,
+                'relation': rel,
+                'object': obj,
+                'domain': metadata.get('domain', 'unknown'),
+                'source': metadata.get('title', 'unknown'),
+                'chunk_id': metadata.get('chunk_id')
+            })
+
+    def _table_batch(self, table):
+        """A TripleTable's ID columns become the dictionary indices, its interned names the dictionaries"""
+        columns = table.columns()
+        def encoded(indices, names):
+            return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(names, pa.string()))
+        return pa.record_batch([
+            encoded(columns['subject'], table.entities.names),
+            encoded(columns['relation'], table.relations.names),
+            encoded(columns['object'], table.entities.names),
+            encoded(columns['domain'], table.domains.names),
+            encoded(columns['title'], table.titles.names),
+            pa.array(table.source_chunks, pa.string()).take(pa.array(columns['source'], pa.int32()))
+        ], schema=self.schema)
+
+def read_table(path, columns=None, fmt=None):
+    """
+    Whole table. Arrow files are memory-mapped and read zero-copy: columns are
+    views of the page cache, not copies. Parquet is decoded from a memory map.
+    """
+    _require()
+    if (fmt or file_format(path)) == "parquet":
+        return pq.read_table(path, columns=columns, memory_map=True)
+    table = ipc.open_stream(pa.memory_map(path)).read_all()
+    return table.select(columns) if columns else table
+
+def iter_batches(path, columns=None, fmt=None):
+    """Record batches in file order, one at a time"""
+    _require()
+    if (fmt or file_format(path)) == "parquet":
+        yield from pq.ParquetFile(path, memory_map=True).iter_batches(BATCH_ROWS, columns=columns)
+        return
+    for batch in ipc.open_stream(pa.memory_map(path)):
+        yield batch.select(columns) if columns else batch
+
+def count_rows(path, fmt=None):
+    """Rows in a table: from the Parquet footer, or by walking the Arrow stream's batches (no data is decoded)"""
+    _require()
+    if (fmt or file_format(path)) == "parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    return sum(batch.num_rows for batch in ipc.open_stream(pa.memory_map(path)))
+
+def iter_rows(path, columns=None, start_row=0, fmt=None):
+    """Yield (row number, row dict) from start_row on; batches before it are skipped unread"""
+    row = 0
+    for batch in iter_batches(path, columns, fmt):
+        if row + batch.num_rows <= start_row:
+            row += batch.num_rows
+            continue
+        data = batch.to_pydict()
+        names = list(data)
+        for values in zip(*data.values()):
+            if row >= start_row:
+                yield row, dict(zip(names, values))
+            row += 1
+
+def convert_jsonl(input_path, output_path, columns=CHUNK_COLUMNS):
+    """Convert a JSONL file (e.g. chunk_clean.py output) to an Arrow/Parquet table; returns rows written"""
+    writer = ColumnarWriter(output_path, columns)
+    skipped = 0
+    with open(input_path, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                writer.append(json.loads(line.decode('utf-8')))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                skipped += 1
+    rows = writer.close()
+    if skipped:
+        print(f"⚠️ Skipped {skipped} lines that are not valid JSON")
+    return rows
+
+def query_triples(path, entity=None, relation=None):
+    """Triples with the entity as subject or object, optionally of one relation, as a table"""
+    table = read_table(path)
+    mask = None
+    if entity is not None:
+        mask = pc.or_(pc.equal(table['subject'], entity), pc.equal(table['object'], entity))
+    if relation is not None:
+        is_relation = pc.equal(table['relation'], relation)
+        mask = is_relation if mask is None else pc.and_(mask, is_relation)
+    return table if mask is None else table.filter(mask)
+
+def relation_counts(table):
+    """[(relation, triples)] most frequent first"""
+    table = table.select(['relation']).unify_dictionaries()  # Each batch has its own dictionary
+    counts = table.group_by('relation').aggregate([('relation', 'count')]).to_pydict()
+    return sorted(zip(counts['relation'], counts['relation_count']), key=lambda c: -c[1])
+
+def main():
+    if len(sys.argv) >= 4 and sys.argv[1] == "convert":
+        rows = convert_jsonl(sys.argv[2], sys.argv[3])
+        print(f"✅ Wrote {rows} rows to {sys.argv[3]} ({os.path.getsize(sys.argv[3]) / 1e6:.1f} MB, "
+              f"JSONL was {os.path.getsize(sys.argv[2]) / 1e6:.1f} MB)")
+    elif len(sys.argv) >= 4 and sys.argv[1] == "query":
+        matches = query_triples(sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
+        for row in matches.to_pylist():
+            print(f"  {row['subject']} -[{row['relation']}]-> {row['object']}  ({row['source']})")
+        print(f"{matches.num_rows} triples")
+    elif len(sys.argv) == 3 and sys.argv[1] == "info":
+        table = read_table(sys.argv[2])
+        print(f"{table.num_rows} rows, {os.path.getsize(sys.argv[2]) / 1e6:.1f} MB")
+        print(table.schema)
+        if 'relation' in table.column_names:
+            print(f"Top relations: {relation_counts(table)[:5]}")
+    else:
+        print("Usage: python columnar.py convert <chunks.jsonl> <chunks.arrow | chunks.parquet>")
+        print("       python columnar.py query <triples.arrow | triples.parquet> <entity> [relation]")
+        print("       python columnar.py info <table.arrow | table.parquet>")
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -2,93 +2,416 @@
 Enhanced Knowledge Graph Constructor - Quality and performance
 """
 import json
+import os
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from neo4j import GraphDatabase
-from entity_extractor import load_nlp, extract_entities
-from relationship_extractor import find_relationships
+from chunk_clean import segment_text
+from entity_extractor import load_nlp, MAX_CHARS, SEGMENT_OVERLAP
+from relationship_extractor import extract_from_doc, merge_extractions
+from neo4j_export import CsvExporter, EXPORT_DIR, import_command
+from extraction_cache import ExtractionCache, CACHE_FILE
+from graph_store import GraphBuilder, STORE_DIR
+from ingest_manifest import IngestManifest, MANIFEST_FILE, chunk_key, chunk_token, text_hash
+from instrumentation import METRICS, profile
+from parse_store import PARSE_STORE_DIR, ParseStoreWriter, iter_parsed
+from columnar import TRIPLES_FILE, TripleTableWriter, count_rows, file_format, iter_rows
+from triple_table import TripleTable
 
 # Config
-DATA_FILE = "/Users/kabir/Desktop/Research/Implementation/good_raw.jsonl"
+DATA_FILE = "/Users/kabir/Desktop/Research/Implementation/good_raw.jsonl"  # Or a .arrow / .parquet chunk table (columnar.py)
 NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USER = "neo4j" 
 NEO4J_PASSWORD = "password"
 MAX_RECORDS = 1000  # Balanced for quality and speed
+NLP_BATCH_SIZE = 64  # Texts per nlp.pipe batch
+NLP_N_PROCESS = 1  # Worker processes for nlp.pipe (set to core count on ingest boxes)
+SEGMENT_MODE = "sentences"  # "sentences" parses whole texts in MAX_CHARS segments, "truncate" keeps text[:MAX_CHARS]
+WRITE_BATCH_SIZE = 1000  # Rows per UNWIND write transaction
+WRITE_CONCURRENCY = 4  # Concurrent write transactions (1 when the Entity.name constraint cannot be created)
+OUTPUT_MODE = "neo4j"  # "neo4j" for transactional MERGE, "csv" for neo4j-admin import files, "store" for graph_store.py, "columnar" for a TRIPLES_FILE table
+QUEUE_SIZE = 8  # Batches buffered between pipeline stages (bounds peak memory)
+USE_CACHE = True  # Reuse cached extractions for unchanged chunks (see extraction_cache.py)
+INCREMENTAL = False  # Only ingest new or changed chunks, tracked in the manifest (see ingest_manifest.py)
+APPEND_ONLY = False  # Incremental runs seek past bytes already ingested instead of rescanning the file
+SAVE_PARSES = False  # Full runs also save every parsed Doc to PARSE_STORE_DIR (see parse_store.py); bypasses the cache
+REEXTRACT = False  # Rebuild from the saved Docs with only the rule layer, no spaCy parse (use a fresh graph: weights add up)
 
-def load_data(max_records=None):
-    """Load JSONL data efficiently"""
-    data = []
-    print(f"Loading up to {max_records} records...")
-    
-    with open(DATA_FILE, 'r', encoding='utf-8') as f:
+# Neo4j schema: MERGE (:Entity {name}) from concurrent transactions needs the uniqueness constraint
+NAME_CONSTRAINT = "CREATE CONSTRAINT entity_name_unique IF NOT EXISTS FOR (n:Entity) REQUIRE n.name IS UNIQUE"
+NAME_INDEX = "CREATE INDEX entity_name IF NOT EXISTS FOR (n:Entity) ON (n.name)"  # Fallback without the constraint
+DROP_NAME_INDEX = "DROP INDEX entity_name IF EXISTS"
+DOMAIN_INDEX = "CREATE INDEX entity_domain IF NOT EXISTS FOR (n:Entity) ON (n.domain)"
+
+# Record fields carried into metadata when the source has them (file offsets, manifest hash)
+PROVENANCE_FIELDS = ('line_start', 'offset', 'text_hash')
+
+_driver = None
+_indexes_created = False
+_unique_names = False  # Whether the uniqueness constraint on Entity.name is in place
+_relation_queries = {}
+
+def iter_records(max_records=None, path=DATA_FILE, start_offset=0):
+    """
+    Lazily yield quality records from a JSONL file, one line at a time.
+    Reading starts at byte start_offset; each record carries the byte offsets
+    of its line (line_start, and offset just past it) so it can be re-read
+    directly and a later run can resume from there.
+    Arrow/Parquet chunk tables are read by iter_table_records instead.
+    """
+    if file_format(path) != "jsonl":
+        yield from iter_table_records(max_records, path, start_offset)
+        return
+    with open(path, 'rb') as f:
+        f.seek(start_offset)
+        offset = start_offset
         for i, line in enumerate(f):
             if max_records and i >= max_records:
                 break
+            line_start = offset
+            offset += len(line)
+            if not line.strip():
+                continue
             try:
-                record = json.loads(line.strip())
-                if 'text' in record and len(record['text']) > 100:  # Quality filter
-                    data.append({
+                record = json.loads(line.decode('utf-8').strip())
+                METRICS.count('records_read')
+                if 'text' not in record or len(record['text']) <= 100:  # Quality filter
+                    METRICS.count('records_filtered')
+                else:
+                    yield {
                         'text': record['text'],
-                        'domain': record.get('domain', 'unknown'),
-                        'title': record.get('title', 'unknown')
-                    })
-            except json.JSONDecodeError:
+                        'domain': 'unknown' if record.get('domain') is None else record['domain'],
+                        'title': 'unknown' if record.get('title') is None else record['title'],
+                        'chunk_id': record.get('chunk_id'),
+                        'line_start': line_start,
+                        'offset': offset
+                    }
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                METRICS.error('read', e)
                 continue
-    
+
+def iter_table_records(max_records=None, path=DATA_FILE, start_row=0):
+    """
+    iter_records for an Arrow/Parquet chunk table, decoded batch by batch from
+    the memory-mapped file instead of one json.loads per line. line_start and
+    offset are row numbers here, so incremental runs resume by row. A null
+    domain or title becomes 'unknown', as in iter_records.
+    """
+    for row, record in iter_rows(path, ('domain', 'title', 'chunk_id', 'text'), start_row):
+        if max_records and row - start_row >= max_records:
+            break
+        METRICS.count('records_read')
+        if not record['text'] or len(record['text']) <= 100:  # Quality filter
+            METRICS.count('records_filtered')
+            continue
+        yield {
+            'text': record['text'],
+            'domain': 'unknown' if record['domain'] is None else record['domain'],
+            'title': 'unknown' if record['title'] is None else record['title'],
+            'chunk_id': record['chunk_id'],
+            'line_start': row,
+            'offset': row + 1
+        }
+
+def load_data(max_records=None, path=DATA_FILE):
+    """Load JSONL data efficiently"""
+    print(f"Loading up to {max_records} records...")
+    data = list(iter_records(max_records, path))
     print(f"Loaded {len(data)} quality records")
     return data
 
-def write_to_neo4j(triples, metadata_list):
-    """Enhanced Neo4j writing with metadata"""
-    if not triples:
-        return
-        
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    
-    with driver.session() as session:
-        # Batch write for performance
-        batch_size = 50
-        for i in range(0, len(triples), batch_size):
-            batch = triples[i:i+batch_size]
-            
-            def write_batch(tx):
-                for j, (subj, rel, obj) in enumerate(batch):
-                    metadata = metadata_list[i+j] if i+j < len(metadata_list) else {}
-                    
-                    # Enhanced query with metadata
-                    query = """
-                    MERGE (s:Entity {name: $subj})
-                    SET s.type = COALESCE(s.type, $subj_type),
-                        s.domain = COALESCE(s.domain, $domain)
-                    MERGE (o:Entity {name: $obj}) 
-                    SET o.type = COALESCE(o.type, $obj_type),
-                        o.domain = COALESCE(o.domain, $domain)
-                    MERGE (s)-[r:`""" + rel.replace(' ', '_') + """`]->(o)
-                    SET r.weight = COALESCE(r.weight, 0) + 1,
-                        r.source = $source
-                    """
-                    
-                    tx.run(query, 
-                          subj=subj, obj=obj,
-                          subj_type='ENTITY', obj_type='ENTITY',
-                          domain=metadata.get('domain', 'unknown'),
-                          source=metadata.get('title', 'unknown'))
-            
-            session.execute_write(write_batch)
+def get_driver():
+    """Long-lived driver shared by every write; the driver pools its own connections"""
+    global _driver
+    if _driver is None:
+        _driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    return _driver
+
+def close_driver():
+    """Close the shared driver (call once at the end of a run)"""
+    global _driver, _indexes_created, _unique_names
+    if _driver is not None:
+        _driver.close()
+        _driver = None
+        _indexes_created = False
+        _unique_names = False
+
+def create_indexes(driver):
+    """
+    Create the Entity.name uniqueness constraint and lookup indexes, and wait
+    until they are online, so the MERGEs below can use them. Concurrent
+    transactions merging the same new name only stay safe with the constraint
+    (with a plain index both can create the node); returns whether it exists.
+    Entity.name keeps an index either way: the plain entity_name index from
+    earlier runs is only dropped for the constraint (Neo4j will not create
+    the constraint while it exists) and is recreated if the constraint fails.
+    """
+    global _indexes_created, _unique_names
+    if _indexes_created:
+        return _unique_names
     
-    # Create indices for performance
     with driver.session() as session:
         try:
-            session.run("CREATE INDEX entity_name IF NOT EXISTS FOR (n:Entity) ON (n.name)")
-            session.run("CREATE INDEX entity_domain IF NOT EXISTS FOR (n:Entity) ON (n.domain)")
-        except:
-            pass  # Indices might already exist
+            session.run(NAME_CONSTRAINT).consume()
+            _unique_names = True
+        except Exception:
+            try:
+                session.run(DROP_NAME_INDEX).consume()  # Plain index from earlier runs blocks the constraint
+                session.run(NAME_CONSTRAINT).consume()
+                _unique_names = True
+            except Exception as e:
+                METRICS.error('create_indexes', e)  # e.g. duplicate names already in the graph
+                print(f"⚠️ No uniqueness constraint on Entity.name ({e}); writing with one transaction at a time")
+        try:
+            if not _unique_names:
+                session.run(NAME_INDEX).consume()
+            session.run(DOMAIN_INDEX).consume()
+            session.run("CALL db.awaitIndexes()").consume()
+        except Exception as e:
+            METRICS.error('create_indexes', e)
+    _indexes_created = True
+    return _unique_names
+
+def relation_query(rel):
+    """
+    Parameterised UNWIND query for one relation type.
+    The type cannot be a parameter, so each type gets one fixed query text and one cached plan.
+    """
+    if rel not in _relation_queries:
+        rel_type = rel.replace(' ', '_').replace('`', '``')
+        _relation_queries[rel] = """
+        UNWIND $rows AS row
+        MERGE (s:Entity {name: row.subj})
+        SET s.type = COALESCE(s.type, 'ENTITY'),
+            s.domain = COALESCE(s.domain, row.domain)
+        MERGE (o:Entity {name: row.obj})
+        SET o.type = COALESCE(o.type, 'ENTITY'),
+            o.domain = COALESCE(o.domain, row.domain)
+        MERGE (s)-[r:`""" + rel_type + """`]->(o)
+        SET r.weight = COALESCE(r.weight, 0) + row.weight,
+            r.source = row.source
+        """
+    return _relation_queries[rel]
+
+def group_by_relation(triples, metadata_list):
+    """
+    Group triples into UNWIND rows per relation type.
+    Repeated (subj, rel, obj) triples collapse into one row with a summed weight.
+    A TripleTable is grouped on its ID columns instead (see group_table_by_relation).
+    """
+    if isinstance(triples, TripleTable):
+        return group_table_by_relation(triples)
+    groups = {}
+    for i, (subj, rel, obj) in enumerate(triples):
+        metadata = metadata_list[i] if i < len(metadata_list) else {}
+        rows = groups.setdefault(rel, {})
+        row = rows.get((subj, obj))
+        if row is None:
+            rows[(subj, obj)] = {
+                'subj': subj, 'obj': obj, 'weight': 1,
+                'domain': metadata.get('domain', 'unknown'),
+                'source': metadata.get('title', 'unknown')
+            }
+        else:
+            row['weight'] += 1
+            row['source'] = metadata.get('title', 'unknown')  # Last writer wins, as before
+    return {rel: list(rows.values()) for rel, rows in groups.items()}
+
+def group_table_by_relation(table):
+    """
+    group_by_relation on a TripleTable's int32 columns: repeats are found with
+    np.unique on (relation, subject, object) codes, and strings are only looked
+    up once per output row. Rows, weights, domains and sources are the same as
+    for the equivalent lists.
+    """
+    if not len(table):
+        return {}
+    columns = table.columns()
+    n_entities = len(table.entities)
+    codes = (columns['relation'].astype(np.int64) * n_entities + columns['subject']) * n_entities + columns['object']
+    _, first, inverse, weights = np.unique(codes, return_index=True, return_inverse=True, return_counts=True)
+    last = np.zeros(len(first), dtype=np.int64)
+    np.maximum.at(last, inverse.ravel(), np.arange(len(codes)))  # Position of each key's last occurrence
+    order = np.argsort(first, kind='stable')  # First-seen order, like the dict version
+
+    rows_first, rows_last = first[order], last[order]
+    entities, titles = table.entities.names, table.titles.names
+    relations = [table.relations.names[i] for i in columns['relation'][rows_first].tolist()]
+    subjects = [entities[i] for i in columns['subject'][rows_first].tolist()]
+    objects = [entities[i] for i in columns['object'][rows_first].tolist()]
+    domains = [table.domains.names[i] for i in columns['domain'][rows_first].tolist()]  # First occurrence, as before
+    sources = [titles[i] for i in columns['title'][rows_last].tolist()]  # Last occurrence wins
+    groups = {}
+    for rel, subj, obj, weight, domain, source in zip(relations, subjects, objects, weights[order].tolist(),
+                                                       domains, sources):
+        groups.setdefault(rel, []).append({'subj': subj, 'obj': obj, 'weight': weight,
+                                           'domain': domain, 'source': source})
+    return groups
+
+def _write_rows(tx, query, rows):
+    tx.run(query, rows=rows).consume()
+
+def _write_batch(driver, query, rows):
+    with driver.session() as session:
+        session.execute_write(_write_rows, query, rows)
+    return len(rows)
+
+def write_rows(query, rows, batch_size=WRITE_BATCH_SIZE):
+    """
+    Run one UNWIND $rows query over rows, batch_size rows per write transaction,
+    on the shared driver (after create_indexes). For writers with their own
+    query, such as SYNONYM edges; returns the number of rows written.
+    """
+    if not rows:
+        return 0
+
+    driver = get_driver()
+    create_indexes(driver)
+    return sum(_write_batch(driver, query, rows[i:i + batch_size]) for i in range(0, len(rows), batch_size))
+
+def _run_grouped(driver, groups, query_for, batch_size, concurrency):
+    """Run each relation's rows through its query in batches of batch_size"""
+    batches = []
+    for rel, rows in groups.items():
+        query = query_for(rel)
+        for i in range(0, len(rows), batch_size):
+            batches.append((query, rows[i:i+batch_size]))
+    
+    # execute_write retries transient errors such as deadlocks between concurrent batches
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return sum(pool.map(lambda batch: _write_batch(driver, *batch), batches))
+
+def write_to_neo4j(triples, metadata_list, batch_size=WRITE_BATCH_SIZE, concurrency=WRITE_CONCURRENCY):
+    """Bulk-write triples as UNWIND batches grouped by relation type"""
+    if not triples:
+        return 0
+        
+    driver = get_driver()
+    if not create_indexes(driver):  # Before the MERGEs, so they can use the indexes
+        concurrency = 1  # Without the constraint, concurrent MERGEs can duplicate nodes
+    return _run_grouped(driver, group_by_relation(triples, metadata_list), relation_query,
+                        batch_size, concurrency)
+
+def retract_query(rel):
+    """Inverse of relation_query: subtract row weights and drop relationships that reach zero"""
+    key = ('retract', rel)
+    if key not in _relation_queries:
+        rel_type = rel.replace(' ', '_').replace('`', '``')
+        _relation_queries[key] = """
+        UNWIND $rows AS row
+        MATCH (s:Entity {name: row.subj})-[r:`""" + rel_type + """`]->(o:Entity {name: row.obj})
+        SET r.weight = COALESCE(r.weight, 0) - row.weight
+        WITH r WHERE r.weight <= 0
+        DELETE r
+        """
+    return _relation_queries[key]
+
+def retract_from_neo4j(triples, batch_size=WRITE_BATCH_SIZE, concurrency=WRITE_CONCURRENCY):
+    """Remove the weight a set of triples contributed, e.g. the old triples of an edited chunk"""
+    if not triples:
+        return 0
     
-    driver.close()
+    driver = get_driver()
+    create_indexes(driver)
+    return _run_grouped(driver, group_by_relation(triples, []), retract_query,
+                        batch_size, concurrency)
+
+def chunk_query(rel, retract=False):
+    """
+    Idempotent per-chunk write for incremental ingest. Each row is one edge
+    of one chunk version: its weight there, its token (chunk_token), and the
+    token and weight of the version it replaces. r.chunks lists the tokens
+    of the chunk versions currently on the edge, so a row whose token is
+    already there is skipped, and the replaced token is dropped in the same
+    statement. Rows for edges only the replaced version had (retract) just
+    subtract and drop its token. Edges written before r.chunks existed are
+    treated as holding the replaced version.
+    """
+    key = ('chunk', rel, retract)
+    if key not in _relation_queries:
+        rel_type = rel.replace(' ', '_').replace('`', '``')
+        if retract:
+            _relation_queries[key] = """
+            UNWIND $rows AS row
+            MATCH (s:Entity {name: row.subj})-[r:`""" + rel_type + """`]->(o:Entity {name: row.obj})
+            WHERE r.chunks IS NULL OR row.prev IN r.chunks
+            SET r.weight = COALESCE(r.weight, 0) - row.prev_weight,
+                r.chunks = [token IN COALESCE(r.chunks, []) WHERE token <> row.prev]
+            WITH r WHERE r.weight <= 0
+            DELETE r
+            """
+        else:
+            _relation_queries[key] = """
+            UNWIND $rows AS row
+            MERGE (s:Entity {name: row.subj})
+            SET s.type = COALESCE(s.type, 'ENTITY'),
+                s.domain = COALESCE(s.domain, row.domain)
+            MERGE (o:Entity {name: row.obj})
+            SET o.type = COALESCE(o.type, 'ENTITY'),
+                o.domain = COALESCE(o.domain, row.domain)
+            MERGE (s)-[r:`""" + rel_type + """`]->(o)
+            WITH r, row WHERE NOT row.token IN COALESCE(r.chunks, [])
+            WITH r, row, row.prev IS NOT NULL AND (r.chunks IS NULL OR row.prev IN r.chunks) AS replacing
+            SET r.weight = COALESCE(r.weight, 0) + row.weight - CASE WHEN replacing THEN row.prev_weight ELSE 0 END,
+                r.source = row.source,
+                r.chunks = [token IN COALESCE(r.chunks, []) WHERE token <> row.prev] + row.token
+            """
+    return _relation_queries[key]
+
+def chunk_rows(chunks):
+    """
+    UNWIND rows for chunk_query from (metadata, triples, previous) per chunk,
+    previous being the replaced (token, triples) or None.
+    Returns ({rel: rows to write}, {rel: rows to retract}).
+    """
+    writes, retracts = {}, {}
+    for metadata, triples, previous in chunks:
+        token = chunk_token(chunk_key(metadata), metadata['text_hash'])
+        prev, prev_triples = previous if previous is not None else (None, [])
+        new_weights, old_weights = Counter(map(tuple, triples)), Counter(map(tuple, prev_triples))
+        for (subj, rel, obj), weight in new_weights.items():
+            writes.setdefault(rel, []).append({
+                'subj': subj, 'obj': obj, 'weight': weight, 'token': token,
+                'prev': prev, 'prev_weight': old_weights[(subj, rel, obj)],
+                'domain': metadata.get('domain', 'unknown'),
+                'source': metadata.get('title', 'unknown')
+            })
+        for (subj, rel, obj), weight in old_weights.items():
+            if (subj, rel, obj) not in new_weights:
+                retracts.setdefault(rel, []).append({'subj': subj, 'obj': obj, 'prev': prev, 'prev_weight': weight})
+    return writes, retracts
+
+def write_chunks_to_neo4j(chunks, batch_size=WRITE_BATCH_SIZE, concurrency=WRITE_CONCURRENCY):
+    """
+    Replace chunk versions in the graph: chunks are (metadata with text_hash,
+    triples, replaced (token, triples) or None). Safe to repeat after a crash.
+    Each (edge, chunk) pair is one row, so concurrent batches never touch
+    the same token; pass each chunk key at most once per call.
+    """
+    writes, retracts = chunk_rows(chunks)
+    if not writes and not retracts:
+        return 0
+
+    driver = get_driver()
+    if not create_indexes(driver):
+        concurrency = 1
+    written = _run_grouped(driver, writes, chunk_query, batch_size, concurrency)
+    _run_grouped(driver, retracts, lambda rel: chunk_query(rel, retract=True), batch_size, concurrency)
+    return written
 
 def get_stats(triples):
     """Quick statistics"""
     if not triples:
         return "No relationships found"
     
+    if isinstance(triples, TripleTable):
+        relations = triples.relation_counts()  # One bincount over the relation column
+        top_rels = sorted(relations.items(), key=lambda x: x[1], reverse=True)[:5]
+        return f"Top relations: {top_rels}"
+    
     relations = {}
     for _, rel, _ in triples:
         relations[rel] = relations.get(rel, 0) + 1
@@ -96,54 +419,365 @@ def get_stats(triples):
     top_rels = sorted(relations.items(), key=lambda x: x[1], reverse=True)[:5]
     return f"Top relations: {top_rels}"
 
-def process_data(texts, nlp):
-    """Process texts efficiently"""
-    all_triples = []
-    all_metadata = []
+def extract_records(parsed, cache=None):
+    """
+    Rule layer: run extract_from_doc over (doc, metadata, key, cached, last)
+    segments and yield (metadata, entities, triples) once each record's last
+    segment is in, with the segments' extractions merged.
+    """
+    parts = []
+    for doc, metadata, key, cached, last in parsed:
+        if cached is not None:
+            METRICS.count('cache_hits')
+            parts.append(cached)
+        else:
+            try:
+                with METRICS.stage('extract'):
+                    extraction = extract_from_doc(doc)
+            except Exception:
+                pass  # Skip problematic texts (counted as extract errors)
+            else:
+                if cache is not None:
+                    cache.put(key, *extraction)
+                parts.append(extraction)
+        if not last:
+            continue
+        
+        record_parts, parts = parts, []
+        if not record_parts:
+            continue
+        entities, triples = merge_extractions(record_parts)
+        METRICS.count('records_extracted')
+        METRICS.count('segments_extracted', len(record_parts))
+        METRICS.count('triples_extracted', len(triples))
+        yield metadata, entities, triples
+
+def stream_extractions(records, nlp, batch_size=NLP_BATCH_SIZE, n_process=NLP_N_PROCESS, cache=None,
+                       parse_store=None):
+    """
+    Stream records through nlp.pipe and yield (metadata, entities, triples) per record.
+    Metadata (domain, title, chunk_id) travels with each text via as_tuples.
+    Texts longer than MAX_CHARS are parsed as overlapping sentence-aligned
+    segments (SEGMENT_MODE) whose extractions are merged back into one record.
+    With a cache, unchanged segments skip parsing: they pass through the pipe as
+    empty strings so output order and memory stay the same as without a cache.
+    With a parse_store (ParseStoreWriter), every parsed Doc is also saved.
+    """
+    def text_tuples():
+        for item in records:
+            metadata = {
+                'domain': item.get('domain', 'unknown'),
+                'title': item.get('title', 'unknown'),
+                'chunk_id': item.get('chunk_id')
+            }
+            for field in PROVENANCE_FIELDS:
+                if field in item:
+                    metadata[field] = item[field]
+            if SEGMENT_MODE == "truncate":
+                segments = [item['text'][:MAX_CHARS]]
+            else:
+                segments = segment_text(item['text'], MAX_CHARS, SEGMENT_OVERLAP)
+            for i, text in enumerate(segments):
+                last = i == len(segments) - 1  # The record is complete after its last segment
+                if cache is None:
+                    yield text, (metadata, None, None, last)
+                    continue
+                
+                key = cache.key(text)
+                cached = cache.get(key)
+                if cached is None:
+                    yield text, (metadata, key, None, last)
+                else:
+                    yield "", (metadata, key, cached, last)
+
+    def parsed():
+        docs = nlp.pipe(text_tuples(), as_tuples=True, batch_size=batch_size, n_process=n_process)
+        for doc, (metadata, key, cached, last) in METRICS.timed('parse', docs):
+            if parse_store is not None and cached is None:
+                parse_store.add(doc, metadata, last)
+            yield doc, metadata, key, cached, last
+
+    return extract_records(parsed(), cache)
+
+def stream_triples(records, nlp, batch_size=NLP_BATCH_SIZE, n_process=NLP_N_PROCESS):
+    """Yield (triple, metadata) pairs as soon as each record is parsed"""
+    for metadata, _, triples in stream_extractions(records, nlp, batch_size, n_process):
+        for triple in triples:
+            yield triple, metadata
+
+def process_data(texts, nlp, batch_size=NLP_BATCH_SIZE, n_process=NLP_N_PROCESS, cache=None):
+    """
+    Process texts efficiently. Returns a TripleTable, which can also be passed
+    on as (table, table.metadata) where parallel triples/metadata lists were.
+    """
+    table = TripleTable()
     
-    for i, item in enumerate(texts):
+    extractions = stream_extractions(texts, nlp, batch_size, n_process, cache)
+    for i, (metadata, _, triples) in enumerate(extractions):
         if i % 50 == 0:
             print(f"  Processing {i}/{len(texts)}...")
         
-        text = item['text']
-        entities = extract_entities(text, nlp)
+        table.add_record(triples, metadata)
+    
+    return table
+
+_DONE = object()
+
+def _put(out_queue, item, stop):
+    """Blocking put that gives up once the pipeline is stopped"""
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _produce(source, out_queue, errors, stop):
+    """Drain an iterable into a bounded queue until done or stopped; runs in a stage thread"""
+    try:
+        for item in source:
+            if not _put(out_queue, item, stop):
+                return
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        _put(out_queue, _DONE, stop)
+
+def _drain(in_queue):
+    """Iterate a stage queue until the producer signals it is done"""
+    while True:
+        item = in_queue.get()
+        if item is _DONE:
+            return
+        yield item
+
+def _consume(in_queue, sink, errors, on_written=None):
+    """Hand each batch to the sink; keeps draining after a failure so producers never block"""
+    for triples, done in _drain(in_queue):
+        if not errors:
+            try:
+                if triples:
+                    with METRICS.stage('write'):
+                        sink(triples, triples.metadata)
+                if on_written is not None:
+                    with METRICS.stage('manifest'):
+                        on_written(done)
+            except BaseException as e:
+                errors.append(e)
+
+def run_streaming(nlp, sink, path=DATA_FILE, max_records=None, batch_size=NLP_BATCH_SIZE,
+                  n_process=NLP_N_PROCESS, write_batch_size=WRITE_BATCH_SIZE, queue_size=QUEUE_SIZE,
+                  cache=None, records=None, on_written=None, parse_store=None, parsed=False):
+    """
+    Stream file -> extraction -> sink with bounded queues between the stages.
+    A reader thread parses JSONL lines, this thread runs nlp.pipe, and a writer
+    thread passes batches of about write_batch_size triples to sink(triples, metadata_list),
+    as a TripleTable and its metadata view.
+    Memory stays bounded by the queue sizes, not the corpus size.
+    records replaces the file as the source; on_written(done) is called in the
+    writer thread with the (metadata, triples) of every record in a batch once
+    the sink has accepted it.
+    With parsed=True, records are (doc, metadata, last) from parse_store.iter_parsed
+    and only the rule layer runs (nlp is unused).
+    Returns (records processed, triples written, relation counts).
+    """
+    errors = []
+    stop = threading.Event()
+    source = iter_records(max_records, path) if records is None else records
+    records = queue.Queue(maxsize=queue_size * batch_size)
+    batches = queue.Queue(maxsize=queue_size)
+    reader = threading.Thread(target=_produce, args=(source, records, errors, stop), daemon=True)
+    writer = threading.Thread(target=_consume, args=(batches, sink, errors, on_written), daemon=True)
+    reader.start()
+    writer.start()
+
+    n_records = 0
+    n_triples = 0
+    relations = Counter()
+    triples, done = TripleTable(), []
+    try:
+        if parsed:
+            extractions = extract_records((doc, metadata, None, None, last)
+                                          for doc, metadata, last in _drain(records))
+        else:
+            extractions = stream_extractions(_drain(records), nlp, batch_size, n_process, cache, parse_store)
+        for metadata, _, record_triples in extractions:
+            n_records += 1
+            if n_records % 100 == 0:
+                print(f"  Processed {n_records} records, {n_triples + len(triples)} triples...")
+            
+            triples.add_record(record_triples, metadata)
+            for triple in record_triples:
+                relations[triple[1]] += 1
+            if on_written is not None:
+                done.append((metadata, record_triples))
+            
+            if len(triples) >= write_batch_size or len(done) >= write_batch_size:
+                batches.put((triples, done))
+                n_triples += len(triples)
+                triples, done = TripleTable(), []
+            if errors:
+                break
         
-        if len(entities) >= 2:  # Need at least 2 entities for relationships
-            triples = find_relationships(text, entities, nlp)
-            for triple in triples:
-                all_triples.append(triple)
-                all_metadata.append(item)
+        if (triples or done) and not errors:
+            batches.put((triples, done))
+            n_triples += len(triples)
+    finally:
+        stop.set()  # Release the reader if extraction ended early
+        batches.put(_DONE)
+        writer.join()
+        reader.join()
     
-    return all_triples, all_metadata
+    if errors:
+        raise errors[0]
+    return n_records, n_triples, relations
+
+def run_incremental(nlp, path=DATA_FILE, manifest_path=MANIFEST_FILE, max_records=None,
+                    append_only=APPEND_ONLY, cache=None):
+    """
+    Ingest only chunks that are new or changed since the last run.
+    Unchanged chunks (same content hash in the manifest) are skipped before
+    parsing. A changed chunk replaces its old triples' weight in the same
+    statement that writes the new ones (write_chunks_to_neo4j), so r.weight
+    ends up as if the graph had been rebuilt.
+    The manifest is only updated after a batch is written, so an interrupted
+    run redoes the last batch; edges record which chunk versions they hold,
+    so redoing it does not count any weight twice.
+    Returns (records processed, triples written, relation counts).
+    """
+    manifest = IngestManifest(manifest_path)
+    start_offset = manifest.get_offset(path) if append_only else 0
+    is_table = file_format(path) != "jsonl"
+    if start_offset > (count_rows(path) if is_table else os.path.getsize(path)):
+        start_offset = 0  # File was rewritten, not appended to
+    counts = Counter()
+
+    def pending_records():
+        for record in iter_records(max_records, path, start_offset):
+            digest = text_hash(record['text'], record['domain'], record['title'])
+            previous = manifest.get(chunk_key(record))
+            if previous is not None and previous[0] == digest:
+                counts['unchanged'] += 1
+                continue
+            record['text_hash'] = digest
+            yield record
+
+    def on_written(done):
+        # Every record of the batch, including those without triples (their old triples still go);
+        # a chunk changed twice in one batch only has its last version applied
+        latest = {}
+        for metadata, triples in done:
+            key = chunk_key(metadata)
+            counts['changed' if key in latest or manifest.get(key) is not None else 'new'] += 1
+            latest[key] = (metadata, triples)
+        chunks = []
+        for key, (metadata, triples) in latest.items():
+            previous = manifest.get(key)
+            chunks.append((metadata, triples, (chunk_token(key, previous[0]), previous[1]) if previous else None))
+        with METRICS.stage('write'):
+            write_chunks_to_neo4j(chunks)
+        manifest.record((key, metadata['text_hash'], triples) for key, (metadata, triples) in latest.items())
+        manifest.set_offset(path, max(metadata['offset'] for metadata, _ in done))
+
+    print(f"Incremental ingest from {'row' if is_table else 'byte'} {start_offset} of {path}")
+    try:
+        result = run_streaming(nlp, lambda triples, metadata_list: None, path, max_records, cache=cache,
+                               records=pending_records(), on_written=on_written)  # on_written does the writes
+    finally:
+        manifest.close()
+    print(f"Chunks: {counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged (skipped)")
+    return result
 
 def main():
     print("🚀 Enhanced Knowledge Graph Pipeline")
     print("=" * 40)
     
-    # Load spaCy
-    print("Loading spaCy model...")
-    nlp = load_nlp()
+    # Load spaCy (re-extraction only runs the rules over saved Docs)
+    if REEXTRACT:
+        nlp = None
+    else:
+        print("Loading spaCy model...")
+        with METRICS.stage('load_nlp'):
+            nlp = load_nlp()
+    full_run = not REEXTRACT and not (INCREMENTAL and OUTPUT_MODE == "neo4j")
+    
+    if OUTPUT_MODE == "csv":
+        exporter = CsvExporter(EXPORT_DIR)
+        sink = exporter.add
+    elif OUTPUT_MODE == "store":
+        builder = GraphBuilder()
+        sink = builder.add
+    elif OUTPUT_MODE == "columnar":
+        triple_table = TripleTableWriter(TRIPLES_FILE)
+        sink = triple_table.add
+    else:
+        sink = write_to_neo4j
+    parse_store = None
+    if SAVE_PARSES and full_run:  # Cached texts are never parsed, so saving needs the cache off
+        parse_store = ParseStoreWriter(nlp, PARSE_STORE_DIR, settings={
+            'max_chars': MAX_CHARS, 'segment_mode': SEGMENT_MODE, 'segment_overlap': SEGMENT_OVERLAP})
+    cache = ExtractionCache(nlp, CACHE_FILE) if USE_CACHE and not REEXTRACT and parse_store is None else None
+    
+    # Stream: file -> extraction -> graph sink
+    finished = False
+    try:
+        with profile():
+            if REEXTRACT:
+                print(f"Re-extracting from the parsed Docs in {PARSE_STORE_DIR} into {OUTPUT_MODE}...")
+                records, total, relations = run_streaming(None, sink, records=iter_parsed(PARSE_STORE_DIR),
+                                                          parsed=True)
+            elif INCREMENTAL and OUTPUT_MODE == "neo4j":  # The file outputs are always full rebuilds
+                print(f"Incrementally ingesting up to {MAX_RECORDS} records from {DATA_FILE}...")
+                records, total, relations = run_incremental(nlp, DATA_FILE, MANIFEST_FILE, MAX_RECORDS, cache=cache)
+            else:
+                print(f"Streaming up to {MAX_RECORDS} records from {DATA_FILE} into {OUTPUT_MODE}...")
+                records, total, relations = run_streaming(nlp, sink, DATA_FILE, MAX_RECORDS, cache=cache,
+                                                          parse_store=parse_store)
+        if parse_store is not None:
+            print(f"Saved {parse_store.close()} parsed Docs to {PARSE_STORE_DIR}")
+
+        # Only a complete run replaces the previous outputs
+        if OUTPUT_MODE == "csv":
+            nodes, edges = exporter.close()
+        elif OUTPUT_MODE == "store":
+            store = builder.build()
+            store.save(STORE_DIR)
+        elif OUTPUT_MODE == "columnar":
+            triple_table.close()
+        finished = True
+    finally:
+        if not finished:
+            if OUTPUT_MODE == "csv":
+                exporter.abort()
+            elif OUTPUT_MODE == "columnar":
+                triple_table.abort()
+        close_driver()  # No-op unless a Neo4j write opened the driver
+        if cache is not None:
+            print(cache.stats())
+            cache.close()
+        print(METRICS.report())
+        METRICS.export()
     
-    # Load data
-    texts = load_data(MAX_RECORDS)
-    if not texts:
+    if not records:
         print("No data to process!")
         return
     
-    # Process
-    print(f"Processing {len(texts)} texts...")
-    triples, metadata = process_data(texts, nlp)
+    print(f"Extracted {total} quality relationships from {records} records")
+    print(f"Top relations: {relations.most_common(5)}" if total else "No relationships found")
     
-    print(f"Extracted {len(triples)} quality relationships")
-    print(get_stats(triples))
-    
-    # Write to Neo4j
-    if triples:
-        print("Writing to Neo4j...")
-        write_to_neo4j(triples, metadata)
-        print("✅ Knowledge graph created successfully!")
-    else:
+    if not total:
         print("❌ No relationships found to write")
+    elif OUTPUT_MODE == "csv":
+        print(f"✅ Exported {nodes} nodes and {edges} edges. Load with:")
+        print(f"  {import_command()}")
+    elif OUTPUT_MODE == "store":
+        print(f"✅ {store.stats()} saved to {STORE_DIR}")
+    elif OUTPUT_MODE == "columnar":
+        print(f"✅ Wrote {triple_table.rows} triples to {TRIPLES_FILE}. Query with:")
+        print(f"  python columnar.py query {TRIPLES_FILE} <entity> [relation]")
+    else:
+        print("✅ Knowledge graph created successfully!")
 
 if __name__ == "__main__":
     main()
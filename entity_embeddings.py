@@ -0,0 +1,347 @@
+"""
+Entity embeddings - dense vectors for entity names, an ANN index, SYNONYM edges and query-time linking
+Run: python entity_embeddings.py <store_dir> [--neo4j]
+"""
+import json
+import os
+import sys
+import zlib
+import numpy as np
+from graph_store import GraphStore
+
+try:
+    import hnswlib
+except ImportError:  # Optional; the NumPy IVF index below is used instead
+    hnswlib = None
+
+# Config
+EMBEDDER = "auto"  # "sentence-transformers", "spacy" (en_core_web_lg vectors), "ngram" or "auto" (first available)
+SENTENCE_MODEL = "sentence-transformers/all-MiniLM-L6-v2"  # Small CPU model
+NGRAM_SIZE = 3
+NGRAM_DIM = 512  # Hashed character n-gram features when no model is available
+EMBED_BATCH = 1024  # Names embedded (and written to the memmap) per step
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_META_FILE = "ann_meta.json"
+
+ANN_BACKEND = "auto"  # "hnsw" (needs hnswlib), "ivf" or "auto"
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_PROBES = 8  # Inverted lists scanned per query
+KMEANS_ITER = 10
+KMEANS_SAMPLE = 100_000  # Names used to train the IVF centroids
+SEARCH_BATCH = 512  # Queries per vectorised search step
+
+SYNONYM_THRESHOLD = 0.8  # Cosine similarity for a SYNONYM edge (HippoRAG uses 0.8)
+SYNONYM_TOP_K = 10  # Nearest neighbours considered per entity
+LINK_THRESHOLD = 0.8  # Cosine similarity for linking a question mention to an entity
+SYNONYM_RELATION = "SYNONYM"
+SYNONYM_SOURCE = "entity_embeddings"
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+class NgramEmbedder:
+    """Hashed character n-gram counts: no model needed, catches spelling and formatting variants"""
+    name = "ngram"
+
+    def __init__(self, dim=NGRAM_DIM):
+        self.dim = dim
+
+    def encode(self, names):
+        vectors = np.zeros((len(names), self.dim), dtype=np.float32)
+        for row, name in enumerate(names):
+            padded = f" {name.lower()} "
+            for i in range(max(len(padded) - NGRAM_SIZE + 1, 1)):
+                vectors[row, zlib.crc32(padded[i:i + NGRAM_SIZE].encode('utf-8')) % self.dim] += 1
+        return _normalize(vectors)
+
+class SpacyEmbedder:
+    """Mean static word vectors of the name's tokens (tokenizer only, no pipeline)"""
+    name = "spacy"
+
+    def __init__(self, nlp):
+        self.nlp = nlp
+        self.dim = nlp.vocab.vectors.shape[1]
+
+    def encode(self, names):
+        vectors = np.array([self.nlp.make_doc(name).vector for name in names], dtype=np.float32)
+        return _normalize(vectors.reshape(len(names), self.dim))
+
+class SentenceEmbedder:
+    """Small sentence-transformers model on CPU"""
+    name = "sentence-transformers"
+
+    def __init__(self, model=SENTENCE_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, names):
+        return self.model.encode(list(names), batch_size=64, convert_to_numpy=True,
+                                 normalize_embeddings=True).astype(np.float32)
+
+def load_embedder(kind=EMBEDDER, nlp=None):
+    """Pick the embedding backend; "auto" prefers a sentence model, then spaCy vectors, then n-grams"""
+    if kind in ("sentence-transformers", "auto"):
+        try:
+            return SentenceEmbedder()
+        except (ImportError, OSError):  # Package missing, or the model is not downloaded
+            if kind != "auto":
+                raise RuntimeError("Install: pip install sentence-transformers")
+    if kind in ("spacy", "auto"):
+        if nlp is None:
+            try:
+                from entity_extractor import load_nlp
+                nlp = load_nlp('vectors')
+            except (ImportError, RuntimeError):
+                nlp = None
+        if nlp is not None and nlp.vocab.vectors.shape[0] > 0:
+            return SpacyEmbedder(nlp)
+        if kind != "auto":
+            raise RuntimeError("Set SPACY_MODEL to a model with word vectors (en_core_web_md or _lg)")
+    return NgramEmbedder()
+
+def embed_names(names, embedder, path):
+    """Embed names into a float32 .npy memmap of shape (len(names), dim), one batch at a time"""
+    vectors = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(len(names), embedder.dim))
+    for start in range(0, len(names), EMBED_BATCH):
+        vectors[start:start + EMBED_BATCH] = embedder.encode(names[start:start + EMBED_BATCH])
+        if start and start % (EMBED_BATCH * 100) == 0:
+            print(f"  Embedded {start}/{len(names)} names...")
+    vectors.flush()
+    return vectors
+
+def _top_k_rows(scores, k):
+    """Column indices of the k largest values in each row, best first"""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
+
+class IVFIndex:
+    """
+    Inverted-file index for cosine search: spherical k-means centroids, and
+    each query scans only the members of its IVF_PROBES nearest lists.
+    """
+    backend = "ivf"
+
+    def __init__(self, vectors, centroids, list_indptr, list_ids):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_indptr = list_indptr
+        self.list_ids = list_ids
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, seed=42):
+        n = len(vectors)
+        if n == 0:  # Empty store: no lists, every search finds nothing
+            return cls(vectors, np.zeros((0, vectors.shape[1]), dtype=np.float32),
+                       np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32))
+        n_lists = n_lists or max(1, min(n, int(4 * np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(vectors[np.sort(rng.choice(n, min(n, KMEANS_SAMPLE), replace=False))])
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(KMEANS_ITER):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=n_lists) == 0
+            sums[empty] = centroids[empty]  # Keep centroids that lost all members
+            centroids = _normalize(sums)
+
+        assign = np.concatenate([np.argmax(np.asarray(vectors[i:i + SEARCH_BATCH * 8]) @ centroids.T, axis=1)
+                                 for i in range(0, n, SEARCH_BATCH * 8)]) if n else np.array([], dtype=np.int64)
+        list_ids = np.argsort(assign, kind='stable').astype(np.int32)
+        list_indptr = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=list_indptr[1:])
+        return cls(vectors, centroids, list_indptr, list_ids)
+
+    def search(self, queries, k, probes=IVF_PROBES):
+        """(ids, scores) of the k most similar vectors per query; ids are -1 where fewer were found"""
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        if not len(self.centroids):
+            return ids, scores
+        nearest = _top_k_rows(queries @ self.centroids.T, probes)
+        for q, lists in enumerate(nearest):
+            candidates = np.concatenate([self.list_ids[self.list_indptr[c]:self.list_indptr[c + 1]] for c in lists])
+            if not len(candidates):
+                continue
+            sims = np.asarray(self.vectors[candidates]) @ queries[q]
+            top = _top_k_rows(sims[None, :], k)[0]
+            ids[q, :len(top)] = candidates[top]
+            scores[q, :len(top)] = sims[top]
+        return ids, scores
+
+    def save(self, path):
+        for name in ("centroids", "list_indptr", "list_ids"):
+            np.save(os.path.join(path, f"ivf_{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, vectors):
+        arrays = [np.load(os.path.join(path, f"ivf_{name}.npy"), mmap_mode='r')
+                  for name in ("centroids", "list_indptr", "list_ids")]
+        return cls(vectors, np.asarray(arrays[0]), *arrays[1:])
+
+class HNSWIndex:
+    """hnswlib graph index over the same normalised vectors (cosine space)"""
+    backend = "hnsw"
+
+    def __init__(self, index):
+        self.index = index
+
+    @classmethod
+    def build(cls, vectors):
+        index = hnswlib.Index(space='cosine', dim=vectors.shape[1])
+        index.init_index(max_elements=len(vectors), M=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION)
+        for start in range(0, len(vectors), SEARCH_BATCH * 8):
+            index.add_items(np.asarray(vectors[start:start + SEARCH_BATCH * 8]),
+                            np.arange(start, min(start + SEARCH_BATCH * 8, len(vectors))))
+        index.set_ef(HNSW_EF_SEARCH)
+        return cls(index)
+
+    def search(self, queries, k):
+        k = min(k, self.index.get_current_count())
+        labels, distances = self.index.knn_query(queries, k=k)
+        return labels.astype(np.int64), (1 - distances).astype(np.float32)
+
+    def save(self, path):
+        self.index.save_index(os.path.join(path, "hnsw.bin"))
+
+    @classmethod
+    def load(cls, path, vectors):
+        index = hnswlib.Index(space='cosine', dim=vectors.shape[1])
+        index.load_index(os.path.join(path, "hnsw.bin"), max_elements=len(vectors))
+        index.set_ef(HNSW_EF_SEARCH)
+        return cls(index)
+
+def build_ann(vectors, backend=ANN_BACKEND):
+    if backend == "hnsw" or (backend == "auto" and hnswlib is not None and len(vectors)):
+        if hnswlib is None:
+            raise RuntimeError("Install: pip install hnswlib")
+        return HNSWIndex.build(vectors)
+    return IVFIndex.build(vectors)
+
+def find_synonyms(vectors, index, threshold=SYNONYM_THRESHOLD, top_k=SYNONYM_TOP_K):
+    """Entity pairs (i, j, score) with i < j whose cosine similarity is at least threshold"""
+    pairs = {}
+    for start in range(0, len(vectors), SEARCH_BATCH):
+        queries = np.asarray(vectors[start:start + SEARCH_BATCH])
+        ids, scores = index.search(queries, top_k + 1)  # +1: each entity finds itself
+        for row, (neighbours, sims) in enumerate(zip(ids, scores)):
+            i = start + row
+            for j, score in zip(neighbours, sims):
+                if j >= 0 and j != i and score >= threshold:
+                    pairs[(min(i, j), max(i, j))] = float(score)
+    return [(i, j, score) for (i, j), score in sorted(pairs.items())]
+
+def add_synonym_edges(store, pairs):
+    """
+    New GraphStore with one SYNONYM edge per pair (weight 1), replacing any
+    SYNONYM edges from an earlier run. Nodes, other edges and postings are unchanged.
+    """
+    relation_names = list(store.relation_names)
+    if SYNONYM_RELATION not in relation_names:
+        relation_names.append(SYNONYM_RELATION)
+    source_names = list(store.source_names)
+    if SYNONYM_SOURCE not in source_names:
+        source_names.append(SYNONYM_SOURCE)
+    rel_id = relation_names.index(SYNONYM_RELATION)
+    source_id = source_names.index(SYNONYM_SOURCE)
+
+    keep = np.asarray(store.relations) != rel_id
+    pairs = np.asarray([(i, j) for i, j, _ in pairs], dtype=np.int32).reshape(-1, 2)
+    src = np.concatenate([store.edge_sources()[keep], pairs[:, 0]])
+    dst = np.concatenate([np.asarray(store.indices)[keep], pairs[:, 1]])
+    rel = np.concatenate([np.asarray(store.relations)[keep], np.full(len(pairs), rel_id, dtype=np.int32)])
+    weight = np.concatenate([np.asarray(store.weights)[keep], np.ones(len(pairs), dtype=np.int32)])
+    source = np.concatenate([np.asarray(store.sources)[keep], np.full(len(pairs), source_id, dtype=np.int32)])
+
+    order = np.lexsort((rel, dst, src))
+    indptr = np.zeros(store.num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=store.num_nodes), out=indptr[1:])
+    return GraphStore(store.nodes.names, store.node_domains, relation_names, source_names,
+                      indptr, dst[order], weight[order], rel[order], source[order], store.chunk_index)
+
+def write_synonyms_to_neo4j(names, pairs):
+    """MERGE SYNONYM relationships (with their similarity score) between existing Entity nodes"""
+    from construct_kg import close_driver, write_rows
+    query = """
+    UNWIND $rows AS row
+    MATCH (a:Entity {name: row.a})
+    MATCH (b:Entity {name: row.b})
+    MERGE (a)-[r:SYNONYM]->(b)
+    SET r.score = row.score
+    """
+    rows = [{'a': names[i], 'b': names[j], 'score': score} for i, j, score in pairs]
+    try:
+        return write_rows(query, rows)
+    finally:
+        close_driver()
+
+class EntityLinker:
+    """Query-time linking of mention strings to entity IDs by nearest embedding"""
+
+    def __init__(self, embedder, index, threshold=LINK_THRESHOLD):
+        self.embedder = embedder
+        self.index = index
+        self.threshold = threshold
+
+    @classmethod
+    def load(cls, path, embedder=None, threshold=LINK_THRESHOLD):
+        """Open the embeddings and ANN index saved by build_embedding_index"""
+        with open(os.path.join(path, INDEX_META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        embedder = embedder or load_embedder(meta['embedder'])
+        if embedder.name != meta['embedder']:
+            raise ValueError(f"Index was built with {meta['embedder']}, not {embedder.name}")
+        vectors = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode='r')
+        index = (HNSWIndex if meta['backend'] == "hnsw" else IVFIndex).load(path, vectors)
+        return cls(embedder, index, threshold)
+
+    def link(self, mentions):
+        """Entity ID for each mention string, or None if nothing is similar enough"""
+        if not mentions:
+            return []
+        ids, scores = self.index.search(self.embedder.encode(list(mentions)), 1)
+        return [int(i) if i >= 0 and s >= self.threshold else None for i, s in zip(ids[:, 0], scores[:, 0])]
+
+def build_embedding_index(store, path, embedder):
+    """Embed every node name into path, build and save the ANN index; returns (vectors, index)"""
+    os.makedirs(path, exist_ok=True)
+    vectors = embed_names(store.nodes.names, embedder, os.path.join(path, EMBEDDINGS_FILE))
+    index = build_ann(vectors)
+    index.save(path)
+    with open(os.path.join(path, INDEX_META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'embedder': embedder.name, 'dim': embedder.dim, 'backend': index.backend}, f)
+    return vectors, index
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python entity_embeddings.py <store_dir> [--neo4j]")
+        sys.exit(2)
+    path = sys.argv[1]
+
+    store = GraphStore.load(path, mmap=False)  # Arrays are rewritten below, so don't map them
+    print(store.stats())
+    embedder = load_embedder()
+    print(f"Embedding {store.num_nodes} entity names with {embedder.name} ({embedder.dim} dims)...")
+    vectors, index = build_embedding_index(store, path, embedder)
+    print(f"Built {index.backend} index")
+
+    pairs = find_synonyms(vectors, index)
+    print(f"Found {len(pairs)} synonym pairs (cosine >= {SYNONYM_THRESHOLD})")
+    names = store.nodes.names
+    for i, j, score in sorted(pairs, key=lambda p: -p[2])[:10]:
+        print(f"  {score:.3f}  {names[i]} ~ {names[j]}")
+
+    store = add_synonym_edges(store, pairs)
+    store.save(path)
+    print(f"✅ {store.stats()}")
+    if "--neo4j" in sys.argv:
+        print(f"Wrote {write_synonyms_to_neo4j(names, pairs)} SYNONYM relationships to Neo4j")
+
+if __name__ == "__main__":
+    main()
@@ -3,21 +3,53 @@ Enhanced Entity Extractor - Quality entity recognition with filtering
 """
 import spacy
 import re
+import time
+from functools import lru_cache
+from chunk_clean import segment_text
 
-def load_nlp():
-    """Load best available spacy model"""
+# Config
+SPACY_MODEL = "en_core_web_lg"  # en_core_web_sm / _md / _lg; load fails rather than falling back to another size
+MAX_CHARS = 3000  # Reasonable limit per parsed Doc
+SEGMENT_OVERLAP = 300  # Characters of trailing sentences repeated at the start of the next segment
+MODEL_COMPONENTS = ('tok2vec', 'transformer', 'tagger', 'morphologizer', 'parser', 'senter',
+                    'attribute_ruler', 'lemmatizer', 'ner')  # Components of the en_core_web pipelines
+PIPELINE_PROFILES = {
+    'entities': ('tok2vec', 'transformer', 'ner'),  # doc.ents only: NER, query linking
+    'relations': ('tok2vec', 'transformer', 'tagger', 'parser', 'attribute_ruler', 'lemmatizer',
+                  'ner'),  # + dep_, pos_ (attribute_ruler) and lemma_ for relationship_extractor
+    'vectors': (),  # Static word vectors only (entity embeddings)
+    'full': None  # Everything the model ships with
+}
+DEFAULT_PROFILE = 'relations'
+
+_pipelines = {}
+
+def load_pipeline(profile=DEFAULT_PROFILE, model=SPACY_MODEL):
+    """
+    Load a model with only the components a profile needs. The rest are
+    excluded, so their weights are never read from disk. Not cached.
+    """
+    if profile not in PIPELINE_PROFILES:
+        raise ValueError(f"Unknown pipeline profile: {profile} (expected one of {', '.join(PIPELINE_PROFILES)})")
+    keep = PIPELINE_PROFILES[profile]
+    exclude = [] if keep is None else [name for name in MODEL_COMPONENTS if name not in keep]
+    start = time.perf_counter()
     try:
-        nlp = spacy.load("en_core_web_lg")
-        print("Loaded large spaCy model")
-        return nlp
+        nlp = spacy.load(model, exclude=exclude)
     except OSError:
-        try:
-            nlp = spacy.load("en_core_web_sm")
-            print("Loaded small spaCy model")
-            return nlp
-        except OSError:
-            raise RuntimeError("Install: python -m spacy download en_core_web_sm")
+        raise RuntimeError(f"Install: python -m spacy download {model}")
+    print(f"Loaded {model} ({profile}: {', '.join(nlp.pipe_names) or 'no components'}) "
+          f"in {time.perf_counter() - start:.2f}s")
+    return nlp
 
+def load_nlp(profile=DEFAULT_PROFILE, model=SPACY_MODEL):
+    """Load a pipeline profile once per process; later calls return the same Language"""
+    key = (model, profile)
+    if key not in _pipelines:
+        _pipelines[key] = load_pipeline(profile, model)
+    return _pipelines[key]
+
+@lru_cache(maxsize=100_000)  # Entity surface forms repeat heavily across a corpus
 def clean_entity_text(text):
     """Clean and normalize entity text"""
     text = re.sub(r'\s+', ' ', text.strip())
@@ -39,18 +71,41 @@ def is_quality_entity(text, ent_type):
     important_types = ['PERSON', 'ORG', 'GPE', 'LOC', 'PRODUCT', 'EVENT', 'FAC']
     return ent_type in important_types
 
-def extract_entities(text, nlp):
-    """Extract quality entities with proper filtering"""
-    doc = nlp(text[:3000])  # Reasonable limit
+def extract_entity_mentions(doc):
+    """
+    Extract quality entities plus the (start, end, key) token span of every
+    doc.ents mention, where key is the lowercased clean entity text.
+    """
     entities = []
+    mentions = []
     seen = set()
     
     for ent in doc.ents:
         clean_text = clean_entity_text(ent.text)
+        key = clean_text.lower()
+        mentions.append((ent.start, ent.end, key))
         
         if (is_quality_entity(clean_text, ent.label_) and 
-            clean_text.lower() not in seen):
+            key not in seen):
             entities.append((clean_text, ent.label_))
-            seen.add(clean_text.lower())
+            seen.add(key)
     
+    return entities, mentions
+
+def extract_entities_from_doc(doc):
+    """Extract quality entities from an already parsed Doc"""
+    return extract_entity_mentions(doc)[0]
+
+def extract_entities(text, nlp):
+    """
+    Extract quality entities with proper filtering. Long texts are parsed in
+    sentence-aligned segments, as by the pipeline; an entity found in several
+    segments is listed once.
+    """
+    entities, seen = [], set()
+    for doc in nlp.pipe(segment_text(text, MAX_CHARS, SEGMENT_OVERLAP)):
+        for entity in extract_entities_from_doc(doc):
+            if entity[0].lower() not in seen:
+                seen.add(entity[0].lower())
+                entities.append(entity)
     return entities
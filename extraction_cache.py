@@ -0,0 +1,131 @@
+"""
+Content-addressed extraction cache - skip NLP for chunks that were already parsed
+"""
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import time
+import entity_extractor
+import relationship_extractor
+
+# Config
+CACHE_FILE = "/Users/kabir/Desktop/Research/Implementation/extraction_cache.sqlite"
+CACHE_MAX_BYTES = 2 * 1024 ** 3  # Least recently used entries are evicted above this
+EVICT_TO = 0.9  # Fraction of CACHE_MAX_BYTES left after an eviction pass
+COMMIT_EVERY = 500  # Writes buffered per SQLite transaction
+
+def extractor_fingerprint(nlp):
+    """
+    Hash of everything that changes extraction output: the spaCy model name,
+    version and pipeline, the text limit, and the source of both extractor
+    modules (so editing RELATIONS or a rule invalidates old entries).
+    """
+    meta = nlp.meta
+    config = {
+        'model': f"{meta.get('lang')}_{meta.get('name')}",
+        'version': meta.get('version'),
+        'spacy_version': meta.get('spacy_version'),
+        'pipeline': list(nlp.pipe_names),
+        'max_chars': entity_extractor.MAX_CHARS,
+        'extractor_source': [
+            hashlib.sha256(inspect.getsource(module).encode('utf-8')).hexdigest()
+            for module in (entity_extractor, relationship_extractor)
+        ],
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+class ExtractionCache:
+    """
+    SQLite map from hash(extractor fingerprint, text) to (entities, triples).
+    Total payload size is tracked and least recently used entries are evicted
+    once it passes max_bytes.
+    """
+
+    def __init__(self, nlp, path=CACHE_FILE, max_bytes=CACHE_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.fingerprint = extractor_fingerprint(nlp)
+        self.hits = 0
+        self.misses = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self._touched = []
+        self._pending = 0
+
+    def key(self, text):
+        """Content address of a text under the current extractor fingerprint"""
+        digest = hashlib.sha256(self.fingerprint.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Cached (entities, triples) for a key, or None"""
+        row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched.append(key)
+        value = json.loads(row[0])
+        return ([tuple(e) for e in value['entities']], [tuple(t) for t in value['triples']])
+
+    def put(self, key, entities, triples):
+        value = json.dumps({'entities': entities, 'triples': triples})
+        size = len(value)
+        old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        self._db.execute("INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                         (key, value, size, time.time()))
+        self._size += size - (old[0] if old else 0)
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        """Flush recency updates and buffered writes, evicting if over budget"""
+        if self._touched:
+            now = time.time()
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                 [(now, key) for key in self._touched])
+            self._touched = []
+        if self._size > self.max_bytes:
+            self.evict()
+        self._db.commit()
+        self._pending = 0
+
+    def evict(self, target=None):
+        """Delete least recently used entries until the payload fits in target bytes"""
+        target = self.max_bytes * EVICT_TO if target is None else target
+        while self._size > target:
+            rows = self._db.execute("SELECT key, size FROM entries ORDER BY last_used LIMIT 1000").fetchall()
+            if not rows:
+                self._size = 0
+                break
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+            self._size -= sum(size for _, size in rows)
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"Cache: {self.hits} hits, {self.misses} misses ({rate:.0%}), {self._size / 1024 ** 2:.1f} MB"
@@ -0,0 +1,252 @@
+"""
+Embedded entity graph - integer-interned nodes and NumPy CSR adjacency mirroring Neo4j
+Run: python graph_store.py build <export_dir> <store_dir | store.npz>
+     python graph_store.py info <store_dir | store.npz> [entity]
+"""
+import csv
+import json
+import os
+import sys
+import numpy as np
+from chunk_index import POSTING_ARRAYS, ChunkIndex, ChunkIndexBuilder
+from neo4j_export import EDGES_FILES, NODES_FILES
+from triple_table import Interner, TripleTable
+
+# Config
+STORE_DIR = "/Users/kabir/Desktop/Research/Implementation/graph_store"
+META_FILE = "meta.json"
+ARRAYS = ("indptr", "indices", "weights", "relations", "sources")
+
+class GraphBuilder:
+    """
+    Accumulate triples with the same semantics as write_to_neo4j: one edge per
+    (subj, type, obj), weights summed, last source wins, first domain kept on nodes.
+    add() has the sink signature, so it can replace Neo4j in run_streaming,
+    and also fills the chunk inverted index (see chunk_index.py).
+    """
+
+    def __init__(self):
+        self.nodes = Interner()
+        self.domains = []
+        self.relations = Interner()
+        self.sources = Interner()
+        self.postings = ChunkIndexBuilder(self.nodes)
+        self._edges = {}
+
+    def add_node(self, name, domain='unknown'):
+        i = self.nodes.intern(name)
+        if i == len(self.domains):
+            self.domains.append(domain)
+        return i
+
+    def add_edge(self, subj, rel, obj, weight=1, source='unknown', domain='unknown'):
+        key = (self.add_node(subj, domain), self.relations.intern(rel.replace(' ', '_')),
+               self.add_node(obj, domain))
+        edge = self._edges.get(key)
+        if edge is None:
+            self._edges[key] = [weight, self.sources.intern(source)]
+        else:
+            edge[0] += weight
+            edge[1] = self.sources.intern(source)
+
+    def add(self, triples, metadata_list):
+        """Add a batch of triples (same arguments as write_to_neo4j)"""
+        if isinstance(triples, TripleTable):
+            for metadata, record in triples.records():
+                for subj, rel, obj in record:
+                    self.add_edge(subj, rel, obj, 1, metadata['title'], metadata['domain'])
+                self.postings.add_record(record, metadata)
+            return len(triples)
+        for i, (subj, rel, obj) in enumerate(triples):
+            metadata = metadata_list[i] if i < len(metadata_list) else {}
+            self.add_edge(subj, rel, obj, 1, metadata.get('title', 'unknown'), metadata.get('domain', 'unknown'))
+        self.postings.add(triples, metadata_list)
+        return len(triples)
+
+    def build(self):
+        """Freeze into a GraphStore (edges sorted by source node, then target)"""
+        n = len(self.nodes)
+        m = len(self._edges)
+        src = np.empty(m, dtype=np.int32)
+        dst = np.empty(m, dtype=np.int32)
+        rel = np.empty(m, dtype=np.int32)
+        weight = np.empty(m, dtype=np.int32)
+        source = np.empty(m, dtype=np.int32)
+        for k, ((s, r, o), (w, title)) in enumerate(self._edges.items()):
+            src[k], rel[k], dst[k], weight[k], source[k] = s, r, o, w, title
+
+        order = np.lexsort((rel, dst, src))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        chunk_index = self.postings.build() if self.postings.chunk_names else None
+        return GraphStore(self.nodes.names, self.domains, self.relations.names, self.sources.names,
+                          indptr, dst[order], weight[order], rel[order], source[order], chunk_index)
+
+class GraphStore:
+    """
+    Read-only entity graph in CSR form. Node i's outgoing edges are
+    indices[indptr[i]:indptr[i+1]], with parallel weights, relation type IDs
+    and source (chunk title) IDs. Arrays may be memory-mapped from disk.
+    chunk_index maps entity IDs to the chunks they came from, when the store
+    was built from extraction output (a CSV export only keeps the last source).
+    """
+
+    def __init__(self, node_names, node_domains, relation_names, source_names,
+                 indptr, indices, weights, relations, sources, chunk_index=None):
+        self.nodes = Interner(node_names)
+        self.node_domains = list(node_domains)
+        self.relation_names = list(relation_names)
+        self.source_names = list(source_names)
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.relations = relations
+        self.sources = sources
+        self.chunk_index = chunk_index
+        self._reverse = None
+
+    @property
+    def num_nodes(self):
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @classmethod
+    def from_triples(cls, triples, metadata_list=()):
+        """Build from extraction output (triples and their per-triple metadata)"""
+        builder = GraphBuilder()
+        builder.add(triples, metadata_list)
+        return builder.build()
+
+    @classmethod
+    def from_csv_export(cls, out_dir):
+        """Build from the neo4j-admin import files written by CsvExporter"""
+        builder = GraphBuilder()
+        with open(os.path.join(out_dir, NODES_FILES[1]), 'r', encoding='utf-8', newline='') as f:
+            for name, _, domain, _ in csv.reader(f):
+                builder.add_node(name, domain)
+        with open(os.path.join(out_dir, EDGES_FILES[1]), 'r', encoding='utf-8', newline='') as f:
+            for start, end, rel, weight, source, domain in csv.reader(f):
+                builder.add_edge(start, rel, end, int(weight), source, domain)
+        return builder.build()
+
+    def node_id(self, name):
+        """Dense ID of an entity name, or None"""
+        return self.nodes.get(name)
+
+    def out_degree(self):
+        return np.diff(self.indptr)
+
+    def neighbors(self, name):
+        """Outgoing edges of an entity as (object, relation, weight) tuples"""
+        i = self.nodes.get(name)
+        if i is None:
+            return []
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        names = self.nodes.names
+        return [(names[j], self.relation_names[r], int(w))
+                for j, r, w in zip(self.indices[lo:hi], self.relations[lo:hi], self.weights[lo:hi])]
+
+    def in_neighbors(self, name):
+        """Incoming edges of an entity as (subject, relation, weight) tuples"""
+        i = self.nodes.get(name)
+        if i is None:
+            return []
+        indptr, edge_ids = self.reverse()
+        src = self.edge_sources()
+        names = self.nodes.names
+        return [(names[src[e]], self.relation_names[self.relations[e]], int(self.weights[e]))
+                for e in edge_ids[indptr[i]:indptr[i + 1]]]
+
+    def edge_sources(self):
+        """Subject node ID of every edge (expands indptr to COO rows)"""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr))
+
+    def reverse(self):
+        """CSR of incoming edges: (indptr, edge IDs sorted by target), built once"""
+        if self._reverse is None:
+            order = np.argsort(self.indices, kind='stable')
+            indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.indices, minlength=self.num_nodes), out=indptr[1:])
+            self._reverse = (indptr, order)
+        return self._reverse
+
+    def triples(self):
+        """Yield (subj, rel, obj, weight) for every edge"""
+        names = self.nodes.names
+        for s, o, r, w in zip(self.edge_sources(), self.indices, self.relations, self.weights):
+            yield names[s], self.relation_names[r], names[o], int(w)
+
+    def stats(self):
+        degree = self.out_degree()
+        stats = (f"Graph: {self.num_nodes} nodes, {self.num_edges} edges, "
+                 f"{len(self.relation_names)} relation types, max out-degree {degree.max() if len(degree) else 0}")
+        if self.chunk_index is not None:
+            stats += f", {self.chunk_index.num_postings} postings over {self.chunk_index.num_chunks} chunks"
+        return stats
+
+    def _meta(self):
+        meta = {'nodes': self.nodes.names, 'domains': self.node_domains,
+                'relations': self.relation_names, 'sources': self.source_names}
+        if self.chunk_index is not None:
+            meta['chunks'] = self.chunk_index.meta()
+        return meta
+
+    def save(self, path=STORE_DIR):
+        """Write a directory of .npy arrays (memory-mappable), or a single .npz file"""
+        arrays = {name: np.asarray(getattr(self, name)) for name in ARRAYS}
+        if self.chunk_index is not None:
+            arrays.update(self.chunk_index.arrays())
+        if path.endswith('.npz'):
+            meta = np.frombuffer(json.dumps(self._meta()).encode('utf-8'), dtype=np.uint8)
+            np.savez(path, meta=meta, **arrays)
+            return
+
+        os.makedirs(path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), array)
+        with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self._meta(), f)
+
+    @classmethod
+    def load(cls, path=STORE_DIR, mmap=True):
+        """Load a saved store; directory stores are memory-mapped read-only unless mmap=False"""
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+                names = ARRAYS + (POSTING_ARRAYS if 'chunks' in meta else ())
+                arrays = [data[name] for name in names]
+        else:
+            with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            names = ARRAYS + (POSTING_ARRAYS if 'chunks' in meta else ())
+            arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None)
+                      for name in names]
+        chunk_index = ChunkIndex.from_saved(meta['chunks'], arrays[len(ARRAYS):]) if 'chunks' in meta else None
+        return cls(meta['nodes'], meta['domains'], meta['relations'], meta['sources'],
+                   *arrays[:len(ARRAYS)], chunk_index)
+
+def main():
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        store = GraphStore.from_csv_export(sys.argv[2])
+        store.save(sys.argv[3])
+        print(store.stats())
+        print(f"✅ Saved to {sys.argv[3]}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "info":
+        store = GraphStore.load(sys.argv[2])
+        print(store.stats())
+        for entity in sys.argv[3:]:
+            print(f"{entity}:")
+            for obj, rel, weight in store.neighbors(entity):
+                print(f"  -[{rel} x{weight}]-> {obj}")
+            for subj, rel, weight in store.in_neighbors(entity):
+                print(f"  <-[{rel} x{weight}]- {subj}")
+    else:
+        print("Usage: python graph_store.py build <export_dir> <store_dir | store.npz>")
+        print("       python graph_store.py info <store_dir | store.npz> [entity ...]")
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Processed-chunk manifest for incremental ingest - which chunks are already in the graph
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+# Config
+MANIFEST_FILE = "/Users/kabir/Desktop/Research/Implementation/ingest_manifest.sqlite"
+
+def chunk_key(record):
+    """Stable identity of a record: its chunk_id, or the title for unchunked dumps"""
+    return record.get('chunk_id') or record.get('title', 'unknown')
+
+def text_hash(text, domain, title):
+    """Change detector for a chunk: text plus the metadata that ends up on the graph"""
+    digest = hashlib.sha1(text.encode('utf-8'))
+    digest.update(f"\0{domain}\0{title}".encode('utf-8'))
+    return digest.hexdigest()
+
+def chunk_token(key, digest):
+    """One version of one chunk, as stored on the edges it contributed to (see chunk_query)"""
+    return f"{key}@{digest}"
+
+class IngestManifest:
+    """
+    SQLite record of ingested chunks (content hash and the triples they
+    contributed) and of how far each input file has been read.
+    Safe to share between the reader and writer threads of run_streaming.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_key TEXT PRIMARY KEY,
+                text_hash TEXT NOT NULL,
+                triples TEXT NOT NULL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                byte_offset INTEGER NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    def get(self, key):
+        """(text_hash, triples) recorded for a chunk, or None if it was never ingested"""
+        with self._lock:
+            row = self._db.execute("SELECT text_hash, triples FROM chunks WHERE chunk_key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], [tuple(t) for t in json.loads(row[1])]
+
+    def record(self, entries):
+        """Mark chunks as ingested: entries are (key, text_hash, triples)"""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_key, text_hash, triples) VALUES (?, ?, ?)",
+                [(key, digest, json.dumps(triples)) for key, digest, triples in entries])
+            self._db.commit()
+
+    def get_offset(self, path):
+        """Byte offset (row, for a chunk table) up to which a file has been ingested (0 if never seen)"""
+        with self._lock:
+            row = self._db.execute("SELECT byte_offset FROM files WHERE path = ?",
+                                   (os.path.abspath(path),)).fetchone()
+        return row[0] if row else 0
+
+    def set_offset(self, path, offset):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO files (path, byte_offset) VALUES (?, ?)",
+                             (os.path.abspath(path), offset))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
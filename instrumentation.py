@@ -0,0 +1,272 @@
+"""
+Pipeline instrumentation - per-stage timers, counters and tagged error counts, plus profiling hooks
+Metrics export as JSON lines or Prometheus text; profiles as cProfile stats or collapsed stacks.
+"""
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Config
+METRICS_FILE = None  # Opt-in export path, e.g. "pipeline_metrics.jsonl"; None only prints the report
+METRICS_FORMAT = "jsonl"  # "jsonl" (one snapshot per line, appended) or "prometheus" (textfile collector)
+PROFILE_MODE = None  # None, "cprofile" (deterministic, higher overhead) or "sample" (stack sampler)
+PROFILE_FILE = "/Users/kabir/Desktop/Research/Implementation/pipeline_profile"
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+LATENCY_SAMPLES = 2048  # Reservoir size per stage for p50/p99
+ERROR_EXAMPLES = 5  # Most recent error messages kept per stage
+
+def _percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+class StageStats:
+    """Count, total/max time and a latency reservoir for one stage"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if len(self.samples) < LATENCY_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            i = random.randrange(self.count)
+            if i < LATENCY_SAMPLES:
+                self.samples[i] = seconds
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 4),
+            'mean_ms': round(1000 * self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(1000 * _percentile(self.samples, 50), 3),
+            'p99_ms': round(1000 * _percentile(self.samples, 99), 3),
+            'max_ms': round(1000 * self.max, 3)
+        }
+
+class Metrics:
+    """
+    Thread-safe registry of stage timers, counters and errors tagged by stage
+    and exception type. One shared instance (METRICS) is used by the pipeline.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.stages = {}
+        self.counters = Counter()
+        self.errors = Counter()
+        self.error_examples = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.add(seconds)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def error(self, stage, exc):
+        """Count an error under its stage and exception type (the record is skipped, not lost silently)"""
+        kind = type(exc).__name__
+        with self._lock:
+            self.errors[(stage, kind)] += 1
+            examples = self.error_examples.setdefault(stage, [])
+            examples.append(f"{kind}: {exc}"[:300])
+            del examples[:-ERROR_EXAMPLES]
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block as one observation of a stage; exceptions are counted and re-raised"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(name, e)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name, iterable):
+        """Yield from an iterable, observing the time taken to produce each item"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(name, time.perf_counter() - start)
+            yield item
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.stages.clear()
+            self.counters.clear()
+            self.errors.clear()
+            self.error_examples.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'timestamp': time.time(),
+                'uptime_s': round(time.time() - self.started, 3),
+                'pid': os.getpid(),
+                'stages': {name: stats.summary() for name, stats in self.stages.items()},
+                'counters': dict(self.counters),
+                'errors': [{'stage': stage, 'type': kind, 'count': n} for (stage, kind), n in self.errors.items()],
+                'error_examples': {stage: list(examples) for stage, examples in self.error_examples.items()}
+            }
+
+    def write_jsonl(self, path):
+        """Append one snapshot as a JSON line"""
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.snapshot()) + '\n')
+
+    def prometheus_text(self, prefix="kg"):
+        """Snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {prefix}_stage_seconds summary"]
+        for name, stats in snapshot['stages'].items():
+            for quantile, key in (("0.5", 'p50_ms'), ("0.99", 'p99_ms')):
+                lines.append(f'{prefix}_stage_seconds{{stage="{name}",quantile="{quantile}"}} {stats[key] / 1000}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stats["total_s"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, value in snapshot['counters'].items():
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+        lines.append(f"# TYPE {prefix}_errors_total counter")
+        for error in snapshot['errors']:
+            lines.append(f'{prefix}_errors_total{{stage="{error["stage"]}",type="{error["type"]}"}} {error["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically replace a .prom file (for node_exporter's textfile collector)"""
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def export(self, path=None, fmt=None):
+        """
+        Write a snapshot to path (default METRICS_FILE; nothing when unset).
+        Runs from finally blocks, so a failed export is only printed: it
+        must neither fail a good run nor hide the error of a bad one.
+        """
+        path = path or METRICS_FILE
+        if not path:
+            return
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if (fmt or METRICS_FORMAT) == "prometheus":
+                self.write_prometheus(path)
+            else:
+                self.write_jsonl(path)
+        except OSError as e:
+            print(f"⚠️ Could not export metrics to {path}: {e}")
+
+    def report(self):
+        """Human-readable summary: slowest stages first, then counters and errors"""
+        snapshot = self.snapshot()
+        lines = ["Stage timings:"]
+        for name, stats in sorted(snapshot['stages'].items(), key=lambda s: -s[1]['total_s']):
+            lines.append(f"  {name:<16} {stats['count']:>8} x  total {stats['total_s']:>8.2f}s  "
+                         f"p50 {stats['p50_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms")
+        if snapshot['counters']:
+            lines.append("Counters: " + ", ".join(f"{k}={v}" for k, v in sorted(snapshot['counters'].items())))
+        for error in snapshot['errors']:
+            lines.append(f"  ⚠️ {error['count']} {error['type']} errors in {error['stage']}")
+        return "\n".join(lines)
+
+METRICS = Metrics()
+
+class StackSampler:
+    """
+    Low-overhead statistical profiler: a thread samples one thread's Python
+    stack every interval and counts collapsed stacks ("a;b;c count" lines,
+    the format py-spy --format raw writes and flamegraph.pl / speedscope read).
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profile(mode=PROFILE_MODE, path=PROFILE_FILE):
+    """
+    Profile the enclosed block. "cprofile" writes <path>.prof (open with pstats
+    or snakeviz); "sample" writes <path>.folded collapsed stacks. None does nothing.
+    """
+    if mode is None:
+        yield
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{path}.prof")
+            print(f"Profile written to {path}.prof")
+    elif mode == "sample":
+        sampler = StackSampler().start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write(f"{path}.folded")
+            print(f"Stack samples written to {path}.folded ({sum(sampler.stacks.values())} samples)")
+    else:
+        raise ValueError(f"Unknown profile mode: {mode}")
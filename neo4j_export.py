@@ -0,0 +1,172 @@
+"""
+Offline Neo4j bulk-import exporter - header + data CSV files for neo4j-admin
+Run: python neo4j_export.py check <export_dir>
+"""
+import csv
+import os
+import sys
+from triple_table import TripleTable
+
+# Config
+EXPORT_DIR = "/Users/kabir/Desktop/Research/Implementation/neo4j_import"
+NODE_LABEL = "Entity"
+
+NODES_HEADER = ["name:ID", "type", "domain", ":LABEL"]
+EDGES_HEADER = [":START_ID", ":END_ID", ":TYPE", "weight:int", "source", "domain"]
+NODES_FILES = ("entities_header.csv", "entities.csv")
+EDGES_FILES = ("relationships_header.csv", "relationships.csv")
+
+def _writer(f):
+    return csv.writer(f, lineterminator='\n')
+
+class CsvExporter:
+    """
+    Stream triples into neo4j-admin import files.
+    Nodes are written as soon as they are first seen; edges are aggregated
+    (weight summed, like r.weight in write_to_neo4j) and written on close().
+    """
+
+    def __init__(self, out_dir=EXPORT_DIR):
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+
+        for name, header in ((NODES_FILES[0], NODES_HEADER), (EDGES_FILES[0], EDGES_HEADER)):
+            with open(os.path.join(out_dir, name), 'w', encoding='utf-8', newline='') as f:
+                _writer(f).writerow(header)
+
+        self._nodes_file = open(os.path.join(out_dir, NODES_FILES[1]), 'w', encoding='utf-8', newline='')
+        self._nodes = _writer(self._nodes_file)
+        self._seen_nodes = set()
+        self._edges = {}
+
+    def _add_node(self, name, domain):
+        if name not in self._seen_nodes:
+            self._seen_nodes.add(name)
+            self._nodes.writerow([name, 'ENTITY', domain, NODE_LABEL])
+
+    def add(self, triples, metadata_list):
+        """Add a batch of triples (same arguments as write_to_neo4j)"""
+        if isinstance(triples, TripleTable):
+            for metadata, record in triples.records():
+                self.add_record(record, metadata)
+            return
+        for i, triple in enumerate(triples):
+            self._add_triple(triple, metadata_list[i] if i < len(metadata_list) else {})
+
+    def add_record(self, triples, metadata):
+        """Add all triples extracted from one record"""
+        for triple in triples:
+            self._add_triple(triple, metadata)
+
+    def _add_triple(self, triple, metadata):
+        subj, rel, obj = triple
+        domain = metadata.get('domain', 'unknown')
+        source = metadata.get('title', 'unknown')
+
+        self._add_node(subj, domain)
+        self._add_node(obj, domain)
+
+        key = (subj, rel.replace(' ', '_'), obj)
+        edge = self._edges.get(key)
+        if edge is None:
+            self._edges[key] = [1, source, domain]
+        else:
+            edge[0] += 1
+            edge[1] = source  # Last source wins, as in write_to_neo4j
+
+    def close(self):
+        """Write the aggregated edges and return (node_count, edge_count)"""
+        self._nodes_file.close()
+
+        with open(os.path.join(self.out_dir, EDGES_FILES[1]), 'w', encoding='utf-8', newline='') as f:
+            writer = _writer(f)
+            for (subj, rel, obj), (weight, source, domain) in self._edges.items():
+                writer.writerow([subj, obj, rel, weight, source, domain])
+
+        return len(self._seen_nodes), len(self._edges)
+
+    def abort(self):
+        """Give up after a failed run: remove the data files, so no partial export is left to import"""
+        self._nodes_file.close()
+        for name in (NODES_FILES[1], EDGES_FILES[1]):  # Edges may be left over from an earlier export
+            path = os.path.join(self.out_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+def import_command(out_dir=EXPORT_DIR, database="neo4j"):
+    """neo4j-admin command that loads the exported files into an empty database"""
+    nodes = ",".join(os.path.join(out_dir, name) for name in NODES_FILES)
+    edges = ",".join(os.path.join(out_dir, name) for name in EDGES_FILES)
+    return (f"neo4j-admin database import full {database} "
+            f"--nodes={nodes} --relationships={edges} --overwrite-destination")
+
+def _read_part(out_dir, files, expected_header, errors):
+    header_path, data_path = (os.path.join(out_dir, name) for name in files)
+    for path in (header_path, data_path):
+        if not os.path.exists(path):
+            errors.append(f"Missing file: {path}")
+            return []
+
+    with open(header_path, 'r', encoding='utf-8', newline='') as f:
+        header = list(csv.reader(f))
+    if header != [expected_header]:
+        errors.append(f"{files[0]}: expected header {expected_header}, found {header}")
+
+    with open(data_path, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.reader(f))
+
+def check_import_files(out_dir=EXPORT_DIR):
+    """
+    Validate an export without a database: headers, column counts, unique node IDs,
+    edge endpoints that exist, and positive integer weights. Returns a list of errors.
+    """
+    errors = []
+    node_rows = _read_part(out_dir, NODES_FILES, NODES_HEADER, errors)
+    edge_rows = _read_part(out_dir, EDGES_FILES, EDGES_HEADER, errors)
+
+    node_ids = set()
+    for line, row in enumerate(node_rows, 1):
+        if len(row) != len(NODES_HEADER):
+            errors.append(f"{NODES_FILES[1]}:{line}: expected {len(NODES_HEADER)} columns, found {len(row)}")
+            continue
+        if not row[0]:
+            errors.append(f"{NODES_FILES[1]}:{line}: empty node ID")
+        elif row[0] in node_ids:
+            errors.append(f"{NODES_FILES[1]}:{line}: duplicate node ID {row[0]!r}")
+        node_ids.add(row[0])
+
+    edge_keys = set()
+    for line, row in enumerate(edge_rows, 1):
+        if len(row) != len(EDGES_HEADER):
+            errors.append(f"{EDGES_FILES[1]}:{line}: expected {len(EDGES_HEADER)} columns, found {len(row)}")
+            continue
+        start, end, rel, weight = row[:4]
+        for node in (start, end):
+            if node not in node_ids:
+                errors.append(f"{EDGES_FILES[1]}:{line}: unknown node {node!r}")
+        if not rel:
+            errors.append(f"{EDGES_FILES[1]}:{line}: empty relationship type")
+        if not weight.isdigit() or int(weight) < 1:
+            errors.append(f"{EDGES_FILES[1]}:{line}: weight must be a positive integer, found {weight!r}")
+        if (start, rel, end) in edge_keys:
+            errors.append(f"{EDGES_FILES[1]}:{line}: edge ({start})-[{rel}]->({end}) is not aggregated")
+        edge_keys.add((start, rel, end))
+
+    return errors
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] != "check":
+        print("Usage: python neo4j_export.py check <export_dir>")
+        sys.exit(2)
+
+    errors = check_import_files(sys.argv[2])
+    for error in errors[:50]:
+        print(error)
+    if errors:
+        print(f"❌ {len(errors)} problems found")
+        sys.exit(1)
+    print("✅ Import files are valid")
+    print(import_command(sys.argv[2]))
+
+if __name__ == "__main__":
+    main()
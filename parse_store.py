@@ -0,0 +1,83 @@
+"""
+Parse store - parsed Docs saved as sharded DocBin files during ingest, so relation
+rules can be re-run over them without spaCy parsing (see REEXTRACT in construct_kg.py)
+"""
+import glob
+import json
+import os
+import spacy
+from spacy.tokens import DocBin
+
+# Config
+PARSE_STORE_DIR = "/Users/kabir/Desktop/Research/Implementation/parse_store"
+SHARD_DOCS = 1000  # Docs per DocBin shard (bounds writer and reader memory)
+SHARD_PATTERN = "docs-{:05d}.spacy"
+META_FILE = "meta.json"
+USER_DATA_KEY = "kg"  # doc.user_data entry holding the record metadata and segment position
+
+class ParseStoreWriter:
+    """
+    Append parsed Docs with their record metadata to DocBin shards.
+    Opening a writer replaces any store already in the directory; meta.json
+    is written by close(), so a store without it is incomplete.
+    """
+
+    def __init__(self, nlp, path=PARSE_STORE_DIR, shard_docs=SHARD_DOCS, settings=None):
+        os.makedirs(path, exist_ok=True)
+        for old in glob.glob(os.path.join(path, "docs-*.spacy")) + [os.path.join(path, META_FILE)]:
+            if os.path.exists(old):
+                os.remove(old)
+        self.path = path
+        self.shard_docs = shard_docs
+        self.meta = {
+            'lang': nlp.lang,
+            'model': f"{nlp.meta.get('lang')}_{nlp.meta.get('name')}-{nlp.meta.get('version')}",
+            'pipeline': list(nlp.pipe_names),
+            'settings': settings or {}
+        }
+        self.shards = 0
+        self.docs = 0
+        self._bin = DocBin(store_user_data=True)
+
+    def add(self, doc, metadata, last=True):
+        """Store one Doc; last marks the final segment of its record"""
+        doc.user_data[USER_DATA_KEY] = {'metadata': metadata, 'last': last}
+        self._bin.add(doc)
+        self.docs += 1
+        if len(self._bin) >= self.shard_docs:
+            self._flush()
+
+    def _flush(self):
+        if not len(self._bin):
+            return
+        path = os.path.join(self.path, SHARD_PATTERN.format(self.shards))
+        self._bin.to_disk(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        self.shards += 1
+        self._bin = DocBin(store_user_data=True)
+
+    def close(self):
+        self._flush()
+        with open(os.path.join(self.path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({**self.meta, 'shards': self.shards, 'docs': self.docs}, f, indent=2)
+        return self.docs
+
+def load_meta(path=PARSE_STORE_DIR):
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        raise RuntimeError(f"No complete parse store in {path} (run an ingest with SAVE_PARSES = True)")
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def iter_parsed(path=PARSE_STORE_DIR):
+    """
+    Yield (doc, metadata, last) in ingest order, one shard in memory at a time.
+    Docs are rebuilt on a blank vocab of the model's language, so no model is loaded.
+    """
+    meta = load_meta(path)
+    vocab = spacy.blank(meta['lang']).vocab
+    for shard in range(meta['shards']):
+        doc_bin = DocBin(store_user_data=True).from_disk(os.path.join(path, SHARD_PATTERN.format(shard)))
+        for doc in doc_bin.get_docs(vocab):
+            stored = doc.user_data.pop(USER_DATA_KEY)
+            yield doc, stored['metadata'], stored['last']
@@ -1,3 +1,4 @@
+import asyncio
 import time
 import sys
 from pathlib import Path
@@ -5,121 +6,187 @@ from pathlib import Path
 # Add current directory to path
 sys.path.append(str(Path(__file__).parent))
 
-from entity_extractor import load_nlp, extract_entities
-from relationship_extractor import find_relationships  
-from construct_kg import load_data, write_to_neo4j, get_stats
+from entity_extractor import load_nlp
+from construct_kg import (load_data, write_to_neo4j, close_driver, get_stats, stream_extractions,
+                          NLP_BATCH_SIZE, NLP_N_PROCESS, OUTPUT_MODE, USE_CACHE)
+from extraction_cache import ExtractionCache, CACHE_FILE
+from neo4j_export import CsvExporter, EXPORT_DIR, import_command
+from columnar import TripleTableWriter, TRIPLES_FILE
+from triple_table import TripleTable
+from async_pipeline import ASYNC_WRITERS, pipeline_to_neo4j
+from instrumentation import METRICS, profile
 
-def run_pipeline():
+# Config
+PIPELINED = False  # Overlap extraction with async Neo4j writes instead of writing after Step 4 (see async_pipeline.py)
+
+def run_pipeline(batch_size=NLP_BATCH_SIZE, n_process=NLP_N_PROCESS, output_mode=OUTPUT_MODE,
+                 use_cache=USE_CACHE, pipelined=PIPELINED):
     """Complete pipeline execution with quality and speed"""
-    print("KNOWLEDGE GRAPH PIPELINE")
-    print("=" * 50)
-    start_time = time.time()
-    
-    # Step 1: Initialize
-    print("\nStep 1: Loading spaCy model...")
     try:
-        nlp = load_nlp()
-        print("spaCy loaded successfully")
-    except Exception as e:
-        print(f"Failed to load spaCy: {e}")
-        return
+        print("KNOWLEDGE GRAPH PIPELINE")
+        print("=" * 50)
+        start_time = time.time()
     
-    # Step 2: Load data
-    print("Step 2: Loading data...")
-    try:
-        texts = load_data(max_records=1000)  # Balanced batch
-        if not texts:
-            print("No data loaded")
+        # Step 1: Initialize
+        print("\nStep 1: Loading spaCy model...")
+        try:
+            with METRICS.stage('load_nlp'):
+                nlp = load_nlp()
+            print("spaCy loaded successfully")
+        except Exception as e:
+            print(f"Failed to load spaCy: {e}")
             return
-        print(f"Loaded {len(texts)} texts")
-    except Exception as e:
-        print(f"Failed to load data: {e}")
-        return
-    
-    # Step 3: Entity extraction
-    print("Step 3: Extracting entities...")
-    total_entities = 0
-    valid_texts = []
     
-    for i, item in enumerate(texts):
-        if i % 100 == 0:
-            print(f"  Processing {i}/{len(texts)}...")
-        
+        # Step 2: Load data
+        print("Step 2: Loading data...")
         try:
-            entities = extract_entities(item['text'], nlp)
-            if len(entities) >= 2:  # Need minimum entities for relationships
-                item['entities'] = entities
-                valid_texts.append(item)
-                total_entities += len(entities)
+            with METRICS.stage('load_data'):
+                texts = load_data(max_records=1000)  # Balanced batch
+            if not texts:
+                print("No data loaded")
+                return
+            print(f"Loaded {len(texts)} texts")
         except Exception as e:
-            continue  # Skip problematic texts
-    
-    print(f"Extracted {total_entities} entities from {len(valid_texts)} valid texts")
+            print(f"Failed to load data: {e}")
+            return
     
-    if not valid_texts:
-        print("No valid texts with entities found")
-        return
+        if pipelined and output_mode == "neo4j":
+            run_pipelined_steps(nlp, texts, batch_size, n_process, use_cache, start_time)
+            return
     
-    # Step 4: Relationship extraction
-    print("Step 4: Extracting relationships...")
-    all_triples = []
-    all_metadata = []
+        # Step 3: Entity and relationship extraction (single parse per text, via nlp.pipe)
+        print(f"Step 3: Extracting entities (batch_size={batch_size}, n_process={n_process})...")
+        total_entities = 0
+        valid_texts = []
     
-    for i, item in enumerate(valid_texts):
-        if i % 50 == 0:
-            print(f"  Processing relationships {i}/{len(valid_texts)}...")
-        
+        cache = ExtractionCache(nlp, CACHE_FILE) if use_cache else None
         try:
-            triples = find_relationships(item['text'], item['entities'], nlp)
-            for triple in triples:
-                all_triples.append(triple)
-                all_metadata.append({
-                    'domain': item.get('domain', 'unknown'),
-                    'title': item.get('title', 'unknown')
-                })
-        except Exception as e:
-            continue  # Skip problematic relationships
+            extractions = stream_extractions(texts, nlp, batch_size, n_process, cache)
+            with profile():
+                for i, (metadata, entities, triples) in enumerate(extractions):
+                    if i % 100 == 0:
+                        print(f"  Processing {i}/{len(texts)}...")
+                
+                    if len(entities) >= 2:  # Need minimum entities for relationships
+                        metadata['entities'] = entities
+                        metadata['triples'] = triples
+                        valid_texts.append(metadata)
+                        total_entities += len(entities)
+        finally:
+            if cache is not None:
+                print(cache.stats())
+                cache.close()
     
-    print(f"Extracted {len(all_triples)} relationships")
+        print(f"Extracted {total_entities} entities from {len(valid_texts)} valid texts")
     
-    if not all_triples:
-        print("No relationships found")
-        return
+        if not valid_texts:
+            print("No valid texts with entities found")
+            return
+    
+        # Step 4: Relationship collection (already extracted from the Step 3 parse)
+        print("Step 4: Extracting relationships...")
+        all_triples = TripleTable()  # Interned IDs in int32 columns, not tuples of strings
+    
+        for item in valid_texts:
+            metadata = {
+                'domain': item['domain'],
+                'title': item['title'],
+                'chunk_id': item['chunk_id']
+            }
+            all_triples.add_record(item['triples'], metadata)
+    
+        print(f"Extracted {len(all_triples)} relationships")
     
-    # Quick quality analysis
-    print(f"\nQuality Analysis:")
-    print(get_stats(all_triples))
+        if not all_triples:
+            print("No relationships found")
+            return
+    
+        # Quick quality analysis
+        print(f"\nQuality Analysis:")
+        print(get_stats(all_triples))
+    
+        # Step 5: Graph construction
+        if output_mode == "csv":
+            print(f"\nStep 5: Exporting neo4j-admin import files to {EXPORT_DIR}...")
+            with METRICS.stage('write'):
+                exporter = CsvExporter(EXPORT_DIR)
+                exporter.add(all_triples, all_triples.metadata)
+                nodes, edges = exporter.close()
+            print(f"Exported {nodes} nodes and {edges} edges. Load with:")
+            print(f"  {import_command()}")
+        elif output_mode == "columnar":
+            print(f"\nStep 5: Writing the triple table to {TRIPLES_FILE}...")
+            with METRICS.stage('write'):
+                triple_table = TripleTableWriter(TRIPLES_FILE)
+                triple_table.add(all_triples, all_triples.metadata)
+                rows = triple_table.close()
+            print(f"Wrote {rows} triples")
+        else:
+            print("\nStep 5: Building knowledge graph...")
+            try:
+                with METRICS.stage('write'):
+                    write_to_neo4j(all_triples, all_triples.metadata)
+                print("Knowledge graph created successfully!")
+            except Exception as e:
+                print(f"Failed to write to Neo4j: {e}")
+                return
+            finally:
+                close_driver()
+    
+        # Final summary
+        end_time = time.time()
+        duration = end_time - start_time
     
-    # Step 5: Graph construction
-    print("\nStep 5: Building knowledge graph...")
+        print(f"\nPIPELINE COMPLETED")
+        print("=" * 50)
+        print(f"Results:")
+        print(f"  • Processed: {len(texts)} texts")
+        print(f"  • Valid texts: {len(valid_texts)}")
+        print(f"  • Entities found: {total_entities}")
+        print(f"  • Relationships: {len(all_triples)}")
+        print(f"  • Processing time: {duration:.1f} seconds")
+        print(f"  • Speed: {len(texts)/duration:.1f} texts/second")
+    
+        # Performance rating
+        if len(all_triples) > 100 and duration < 60:
+            print("Excellent performance")
+        elif len(all_triples) > 50:
+            print("Good performance")
+        else:
+            print("Consider increasing MAX_RECORDS for better results")
+    finally:
+        print(METRICS.report())  # Also after a failed step, where the error counts matter most
+        METRICS.export()
+
+def run_pipelined_steps(nlp, texts, batch_size, n_process, use_cache, start_time):
+    """
+    Steps 3-5 overlapped: extraction batches go to async Neo4j writers while parsing continues.
+    run_pipeline reports the metrics afterwards, whether or not this succeeds.
+    """
+    print(f"Steps 3-5: Extracting and writing concurrently (batch_size={batch_size}, "
+          f"{ASYNC_WRITERS} async writers)...")
+    cache = ExtractionCache(nlp, CACHE_FILE) if use_cache else None
     try:
-        write_to_neo4j(all_triples, all_metadata)
-        print("Knowledge graph created successfully!")
+        with profile():
+            processed, written, relations = asyncio.run(pipeline_to_neo4j(
+                nlp, texts, batch_size=batch_size, n_process=n_process, cache=cache))
     except Exception as e:
-        print(f"Failed to write to Neo4j: {e}")
+        print(f"Failed to build the knowledge graph: {e}")
         return
+    finally:
+        if cache is not None:
+            print(cache.stats())
+            cache.close()
     
-    # Final summary
-    end_time = time.time()
-    duration = end_time - start_time
-    
+    duration = time.time() - start_time
     print(f"\nPIPELINE COMPLETED")
     print("=" * 50)
     print(f"Results:")
-    print(f"  • Processed: {len(texts)} texts")
-    print(f"  • Valid texts: {len(valid_texts)}")
-    print(f"  • Entities found: {total_entities}")
-    print(f"  • Relationships: {len(all_triples)}")
+    print(f"  • Processed: {processed} texts")
+    print(f"  • Relationships: {written}")
+    print(f"  • Top relations: {relations.most_common(5)}")
     print(f"  • Processing time: {duration:.1f} seconds")
-    print(f"  • Speed: {len(texts)/duration:.1f} texts/second")
-    
-    # Performance rating
-    if len(all_triples) > 100 and duration < 60:
-        print("Excellent performance")
-    elif len(all_triples) > 50:
-        print("Good performance")
-    else:
-        print("Consider increasing MAX_RECORDS for better results")
+    print(f"  • Speed: {processed/duration:.1f} texts/second")
 
 def main():
     """Main pipeline execution"""
@@ -3,10 +3,21 @@
 # This script automatically finds and merges similar nodes.
 # ==============================================================================
 
+import json
+import os
+import time
+import zlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from neo4j import GraphDatabase
-from thefuzz import fuzz
+from thefuzz import fuzz, utils as fuzz_utils
 from collections import defaultdict
 
+try:
+    from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+except ImportError:  # thefuzz normally pulls rapidfuzz in; fall back to per-pair scoring
+    rf_fuzz = rf_process = None
+
 # --- SECTION 1: DATABASE CREDENTIALS ---
 NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USER = "neo4j"
@@ -20,6 +31,20 @@ SIMILARITY_THRESHOLD = 90
 # List of node labels you want to process for deduplication.
 LABELS_TO_PROCESS = ["Entity"] # Add other labels like "GPE", etc.
 
+# Candidate generation (blocking). Only pairs that share a MinHash LSH bucket over
+# character n-grams and pass the length filter are scored.
+NGRAM_SIZE = 3
+LSH_BANDS = 40
+LSH_ROWS = 3  # Rows per band; bands * rows MinHash permutations in total
+MINHASH_CHUNK = 2000  # Names hashed per vectorised MinHash step (bounds memory)
+SCORE_BATCH = 100000  # Candidate pairs scored per batch (one process-pool task each)
+SCORE_WORKERS = os.cpu_count() or 1  # Processes scoring candidate batches in parallel
+
+# Merging. Each batch of duplicates is committed in its own transaction and logged
+# to the checkpoint file, so a failed run resumes where it stopped.
+MERGE_BATCH_SIZE = 500  # Duplicate nodes merged per transaction
+CHECKPOINT_FILE = "prune_checkpoint.jsonl"
+
 # --- SECTION 3: AUTOMATED PRUNING LOGIC ---
 
 def get_nodes_by_label(tx, label):
@@ -28,71 +53,299 @@ def get_nodes_by_label(tx, label):
     result = tx.run(query)
     return [record["name"] for record in result]
 
-def find_duplicate_clusters(node_names, threshold):
+def sorted_token_key(name):
+    """
+    The string token_sort_ratio actually compares: thefuzz's full_process
+    (ASCII, lowercase, alphanumerics only) followed by sorted tokens.
+    """
+    return " ".join(sorted(fuzz_utils.full_process(name, force_ascii=True).split()))
+
+def max_length_ratio(threshold):
+    """
+    Length filter: ratio() <= 200 * shorter / (shorter + longer), so a rounded
+    score above the threshold bounds how much longer one key may be.
+    """
+    needed = threshold + 0.5
+    return (200 - needed) / needed
+
+def _shingle_hashes(key):
+    padded = f" {key} "
+    if len(padded) <= NGRAM_SIZE:
+        return [zlib.crc32(padded.encode())]
+    return sorted({zlib.crc32(padded[i:i + NGRAM_SIZE].encode())
+                   for i in range(len(padded) - NGRAM_SIZE + 1)})
+
+def minhash_signatures(keys, seed=42):
+    """MinHash signatures (len(keys) x bands*rows, uint32) over character n-grams"""
+    rng = np.random.default_rng(seed)
+    num_perm = LSH_BANDS * LSH_ROWS
+    # Multiply-shift hashing: wraps mod 2**64 by design, keep the high 32 bits
+    a = rng.integers(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+    b = rng.integers(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64, endpoint=True)
+
+    signatures = np.empty((len(keys), num_perm), dtype=np.uint32)
+    for start in range(0, len(keys), MINHASH_CHUNK):
+        shingles = [_shingle_hashes(key) for key in keys[start:start + MINHASH_CHUNK]]
+        offsets = np.cumsum([0] + [len(s) for s in shingles[:-1]])
+        flat = np.fromiter((h for s in shingles for h in s), dtype=np.uint64)
+        hashed = (flat[:, None] * a + b) >> np.uint64(32)  # (total shingles, num_perm)
+        signatures[start:start + len(shingles)] = np.minimum.reduceat(hashed, offsets, axis=0)
+    return signatures
+
+def candidate_pairs(keys, threshold):
+    """
+    Blocking stage: (i, j) index pairs of distinct keys that share at least one
+    LSH band bucket and pass the length filter. Returns an (n, 2) int64 array.
+    """
+    n = len(keys)
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    lengths = np.fromiter((len(key) for key in keys), dtype=np.int64, count=n)
+    ratio = max_length_ratio(threshold)
+    signatures = minhash_signatures(keys).astype(np.uint64)
+
+    found = []
+    for band in range(LSH_BANDS):
+        rows = signatures[:, band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        bucket = rows[:, 0].copy()
+        for col in range(1, LSH_ROWS):
+            bucket = bucket * np.uint64(0x9E3779B97F4A7C15) + rows[:, col]
+
+        order = np.argsort(bucket, kind="stable")
+        sorted_buckets = bucket[order]
+        starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+        sizes = np.diff(np.r_[starts, n])
+        for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+            members = order[start:start + size]
+            members = members[np.argsort(lengths[members], kind="stable")]
+            member_lengths = lengths[members]
+            # Members are length-sorted, so each one only pairs with the next few
+            limits = np.searchsorted(member_lengths, member_lengths * ratio, side="right")
+            counts = np.maximum(limits - np.arange(size) - 1, 0)
+            total = counts.sum()
+            if not total:
+                continue
+            left = np.repeat(np.arange(size), counts)
+            right = left + 1 + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            a, b = members[left], members[right]
+            # Encode (min, max) as one int64 so deduplication is a flat unique
+            found.append(np.minimum(a, b) * n + np.maximum(a, b))
+
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    codes = np.sort(np.concatenate(found))
+    codes = codes[np.r_[True, codes[1:] != codes[:-1]]]
+    return np.stack([codes // n, codes % n], axis=1)
+
+def _score_batch(left, right):
+    """Rounded ratio() scores for two aligned lists of keys (runs in a worker process)"""
+    if rf_process is not None and hasattr(rf_process, "cpdist"):
+        raw = rf_process.cpdist(left, right, scorer=rf_fuzz.ratio, workers=1)
+    elif rf_fuzz is not None:
+        raw = [rf_fuzz.ratio(x, y) for x, y in zip(left, right)]
+    else:
+        raw = [fuzz.ratio(x, y) for x, y in zip(left, right)]
+    return np.round(np.asarray(raw, dtype=np.float64)).astype(np.int64)
+
+def score_pairs(keys, pairs, workers=SCORE_WORKERS):
+    """
+    token_sort_ratio scores for index pairs of sorted-token keys, rounded like thefuzz.
+    Batches are spread across a process pool when there is more than one.
+    """
+    batches = [pairs[start:start + SCORE_BATCH] for start in range(0, len(pairs), SCORE_BATCH)]
+    lefts = [[keys[i] for i in batch[:, 0]] for batch in batches]
+    rights = [[keys[j] for j in batch[:, 1]] for batch in batches]
+
+    if workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+            results = list(pool.map(_score_batch, lefts, rights))
+    else:
+        results = [_score_batch(left, right) for left, right in zip(lefts, rights)]
+
+    if not results:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(results)
+
+def match_keys(node_names, threshold, workers=SCORE_WORKERS):
+    """
+    Group node names by sorted-token key and find similar keys.
+    Returns (members: key ID -> name indices, accepted (a, b) key ID pairs).
+    Names sharing a key score 100 with each other; distinct keys only get
+    scored when blocking makes them candidates.
+    """
+    key_ids = {}
+    members = defaultdict(list)
+    for i, name in enumerate(node_names):
+        if name is None:
+            continue  # thefuzz scores None as 0
+        key = sorted_token_key(name)
+        members[key_ids.setdefault(key, len(key_ids))].append(i)
+    keys = list(key_ids)
+
+    key_pairs = candidate_pairs(keys, threshold)
+    scores = score_pairs(keys, key_pairs, workers)
+    accepted = key_pairs[scores > threshold]
+    print(f"  - {len(keys)} distinct keys, {len(key_pairs)} candidate pairs, {len(accepted)} accepted.")
+    return members, accepted
+
+def find_duplicate_pairs(node_names, threshold, workers=SCORE_WORKERS):
+    """
+    Every index pair (i < j) of node names whose token_sort_ratio exceeds the
+    threshold. Quadratic in the size of same-key groups; clustering uses
+    match_keys directly instead.
+    """
+    members, accepted = match_keys(node_names, threshold, workers)
+    pairs = []
+    if threshold < 100:
+        for group in members.values():
+            pairs.extend((group[x], group[y]) for x in range(len(group)) for y in range(x + 1, len(group)))
+    for a, b in accepted:
+        pairs.extend((min(i, j), max(i, j)) for i in members[a] for j in members[b])
+    return pairs
+
+class UnionFind:
+    """Disjoint sets over 0..n-1 with path halving and union by size"""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+def longest_name(names):
+    """Default master: the longest name, ties broken alphabetically"""
+    return min(names, key=lambda name: (-len(name), name))
+
+def find_duplicate_clusters(node_names, threshold, select_master=longest_name, workers=SCORE_WORKERS):
     """
     Groups similar node names into clusters.
     Returns a dictionary mapping the "master" name to a list of its duplicates.
+    Clusters are the connected components of all accepted pairs, so they are
+    transitive and do not depend on input order. select_master picks the name
+    that survives from each cluster.
     """
     print(f"-> Finding duplicate clusters with threshold > {threshold}%...")
-    clusters = defaultdict(list)
-    processed_nodes = set()
+    sets = UnionFind(len(node_names))
+    members, accepted = match_keys(node_names, threshold, workers)
+    # Same-key names are identical under sorted_token_key: join each group to its
+    # first name (linear in the group), then join groups through accepted key pairs
+    if threshold < 100:
+        for group in members.values():
+            for i in group[1:]:
+                sets.union(group[0], i)
+    for a, b in accepted:
+        sets.union(members[a][0], members[b][0])
 
-    for i, name1 in enumerate(node_names):
-        if name1 in processed_nodes:
-            continue
-        
-        # This node is the potential "master" of a new cluster
-        current_cluster = [name1]
-        for j in range(i + 1, len(node_names)):
-            name2 = node_names[j]
-            if name2 in processed_nodes:
-                continue
-            
-            # Calculate similarity score
-            score = fuzz.token_sort_ratio(name1, name2)
-            
-            if score > threshold:
-                current_cluster.append(name2)
-
-        if len(current_cluster) > 1:
-            # Sort by length to pick the longest name as the "master"
-            current_cluster.sort(key=len, reverse=True)
-            master_name = current_cluster[0]
-            duplicates = current_cluster[1:]
-            clusters[master_name].extend(duplicates)
-            
-            # Add all nodes in this cluster to the processed set
-            for node_name in current_cluster:
-                processed_nodes.add(node_name)
+    components = defaultdict(set)
+    for i, name in enumerate(node_names):
+        if name is not None:
+            components[sets.find(i)].add(name)
+
+    clusters = {}
+    for names in components.values():
+        if len(names) > 1:
+            master_name = select_master(names)
+            clusters[master_name] = sorted(names - {master_name})
+    clusters = dict(sorted(clusters.items()))
     
     print(f"  - Found {len(clusters)} clusters of duplicates.")
     return clusters
 
-def merge_nodes_from_clusters(tx, clusters):
+def merge_query(label):
+    """
+    One UNWIND query per label. Both MATCHes carry the label so they use the
+    entity_name index. The master goes first, so it survives with its own
+    properties and a re-run of an already merged row matches nothing.
+    """
+    label = label.replace('`', '``')
+    return f"""
+        UNWIND $rows AS row
+        MATCH (master:`{label}` {{name: row.master}})
+        MATCH (duplicate:`{label}` {{name: row.duplicate}})
+        WHERE elementId(master) <> elementId(duplicate)
+        CALL apoc.refactor.mergeNodes([master, duplicate], {{
+            properties: 'discard', mergeRels: true
+        }})
+        YIELD node
+        RETURN count(node) AS merged
+    """
+
+def _merge_batch(tx, query, rows):
+    return tx.run(query, rows=rows).single()["merged"]
+
+def load_checkpoint(path, label):
+    """Clusters and already merged duplicates recorded for a label by an earlier run"""
+    clusters = None
+    merged = set()
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partially written last line
+                if entry.get("label") != label:
+                    continue
+                if "clusters" in entry:
+                    clusters = entry["clusters"]
+                    merged = set()
+                merged.update(entry.get("merged", []))
+    return clusters, merged
+
+def append_checkpoint(path, entry):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def merge_nodes_from_clusters(session, label, clusters, batch_size=MERGE_BATCH_SIZE,
+                              checkpoint_path=CHECKPOINT_FILE, already_merged=()):
     """
     Takes the generated clusters and merges the duplicate nodes into the master node.
+    Duplicates are sent as UNWIND batches, each committed in its own transaction
+    and recorded in the checkpoint file.
     """
     if not clusters:
         print("-> No duplicate clusters to merge.")
         return 0
 
-    print("-> Merging nodes based on discovered clusters...")
+    rows = [{"master": master_name, "duplicate": duplicate_name}
+            for master_name, duplicates in clusters.items()
+            for duplicate_name in duplicates
+            if duplicate_name not in already_merged]
+    print(f"-> Merging {len(rows)} duplicates in batches of {batch_size} "
+          f"({len(already_merged)} already merged)...")
+
+    query = merge_query(label)
     merged_count = 0
-    for master_name, duplicates in clusters.items():
-        for duplicate_name in duplicates:
-            query = """
-                MATCH (duplicate {name: $duplicate_name})
-                MATCH (master {name: $master_name})
-                CALL apoc.refactor.mergeNodes([duplicate, master], {
-                    properties: 'combine', mergeRels: true
-                })
-                YIELD node
-                RETURN node
-            """
-            result = tx.run(query, duplicate_name=duplicate_name, master_name=master_name)
-            if result.single():
-                print(f"  - Merged '{duplicate_name}' into '{master_name}'.")
-                merged_count += 1
+    start = time.time()
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        merged_count += session.execute_write(_merge_batch, query, batch)
+        append_checkpoint(checkpoint_path, {"label": label, "merged": [row["duplicate"] for row in batch]})
+
+        elapsed = time.time() - start
+        print(f"  - {i + len(batch)}/{len(rows)} processed, {merged_count} merged "
+              f"({merged_count / max(elapsed, 1e-9):.1f} merges/s)")
+
+    elapsed = time.time() - start
+    print(f"  - Merged {merged_count} nodes in {elapsed:.1f}s "
+          f"({merged_count / max(elapsed, 1e-9):.1f} merges/s).")
     return merged_count
 
 # --- SECTION 4: MAIN PIPELINE EXECUTION ---
@@ -107,16 +360,23 @@ def main():
         with driver.session() as session:
             for label in LABELS_TO_PROCESS:
                 print(f"\n--- Processing Label: {label} ---")
+                clusters, merged = load_checkpoint(CHECKPOINT_FILE, label)
                 
-                # Step 1: Fetch all node names for the current label
-                node_names = session.execute_read(get_nodes_by_label, label)
-                
-                # Step 2: Automatically find duplicate clusters
-                clusters = find_duplicate_clusters(node_names, SIMILARITY_THRESHOLD)
+                if clusters is None:
+                    # Step 1: Fetch all node names for the current label
+                    node_names = session.execute_read(get_nodes_by_label, label)
+                    
+                    # Step 2: Automatically find duplicate clusters
+                    clusters = find_duplicate_clusters(node_names, SIMILARITY_THRESHOLD)
+                    append_checkpoint(CHECKPOINT_FILE, {"label": label, "clusters": clusters})
+                else:
+                    print(f"-> Resuming from checkpoint: {len(clusters)} clusters, {len(merged)} merged.")
                 
                 # Step 3: Merge the nodes found in the clusters
-                session.execute_write(merge_nodes_from_clusters, clusters)
+                merge_nodes_from_clusters(session, label, clusters, already_merged=merged)
 
+        if os.path.exists(CHECKPOINT_FILE):
+            os.remove(CHECKPOINT_FILE)  # Every label finished, nothing to resume
         print("\nAutomated pruning pipeline finished successfully.")
 
     except Exception as e:
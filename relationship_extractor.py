@@ -1,3 +1,18 @@
+"""
+Relationship Extractor - dependency rules over parsed Docs
+RELATION_RULES use spaCy DependencyMatcher pattern syntax, but RuleEngine runs
+them itself and only supports the ">" (immediate child) and "<" (immediate
+head) REL_OPs, and exact, IN and NOT_IN token attribute values. validate_rules
+rejects anything else with a ValueError when the module is imported.
+relation_rules_corpus.json holds the expected triples on hand-built Docs
+(checked by bench_relation_rules.py).
+"""
+import numpy as np
+from spacy.parts_of_speech import IDS as POS_IDS
+from spacy.strings import get_string_id
+from chunk_clean import segment_text
+from entity_extractor import MAX_CHARS, SEGMENT_OVERLAP, clean_entity_text, extract_entity_mentions
+
 RELATIONS = {
     'founded': ('FOUNDED', 9), 'established': ('FOUNDED', 9), 'created': ('FOUNDED', 8),
     'owns': ('OWNS', 8), 'controls': ('OWNS', 7), 'acquired': ('ACQUIRED', 9),
@@ -5,99 +20,308 @@ RELATIONS = {
     'located': ('LOCATED_IN', 6), 'based': ('LOCATED_IN', 6), 'headquartered': ('LOCATED_IN', 7),
     'teaches': ('TEACHES', 6), 'studies': ('STUDIES', 5), 'develops': ('DEVELOPS', 6)
 }
+MIN_SCORE = 5  # Quality threshold for relations
+
+# Dependency rules as data, in spaCy DependencyMatcher pattern syntax ("REL_OP" > or <),
+# compiled by RuleEngine and matched in one pass over the Doc. subject/object name the
+# nodes whose entities form the triple. A rule with relation None takes relation and
+# score from RELATIONS by the anchor verb's lemma, and its anchor only matches verbs
+# listed there. Triples are ordered by rule, then by matched token positions.
+VERB = {"RIGHT_ID": "verb", "RIGHT_ATTRS": {"POS": "VERB", "IS_STOP": False}}
+RELATION_RULES = [
+    {'name': 'svo', 'relation': None, 'subject': 'subject', 'object': 'object', 'patterns': [
+        [VERB,
+         {"LEFT_ID": "verb", "REL_OP": ">", "RIGHT_ID": "subject", "RIGHT_ATTRS": {"DEP": {"IN": ["nsubj", "nsubjpass"]}}},
+         {"LEFT_ID": "verb", "REL_OP": ">", "RIGHT_ID": "object", "RIGHT_ATTRS": {"DEP": {"IN": ["dobj", "pobj"]}}}],
+        [VERB,
+         {"LEFT_ID": "verb", "REL_OP": ">", "RIGHT_ID": "subject", "RIGHT_ATTRS": {"DEP": {"IN": ["nsubj", "nsubjpass"]}}},
+         {"LEFT_ID": "verb", "REL_OP": ">", "RIGHT_ID": "prep", "RIGHT_ATTRS": {"DEP": "prep"}},
+         {"LEFT_ID": "prep", "REL_OP": ">", "RIGHT_ID": "object", "RIGHT_ATTRS": {"DEP": "pobj"}}]
+    ]},
+    {'name': 'copula', 'relation': 'IS_A', 'score': 6, 'subject': 'subject', 'object': 'object', 'patterns': [
+        [{"RIGHT_ID": "be", "RIGHT_ATTRS": {"LEMMA": "be", "POS": {"IN": ["AUX", "VERB"]}}},
+         {"LEFT_ID": "be", "REL_OP": ">", "RIGHT_ID": "subject", "RIGHT_ATTRS": {"DEP": "nsubj"}},
+         {"LEFT_ID": "be", "REL_OP": ">", "RIGHT_ID": "object", "RIGHT_ATTRS": {"DEP": {"IN": ["attr", "acomp"]}}}]
+    ]},
+    {'name': 'possessive', 'relation': 'OWNS', 'score': 5, 'subject': 'possessor', 'object': 'possessed', 'patterns': [
+        [{"RIGHT_ID": "possessor", "RIGHT_ATTRS": {"DEP": "poss"}},
+         {"LEFT_ID": "possessor", "REL_OP": "<", "RIGHT_ID": "possessed", "RIGHT_ATTRS": {}}]
+    ]}
+]
+
+STRING_ATTRS = ('DEP', 'TAG', 'LEMMA', 'LOWER', 'ORTH', 'ENT_TYPE')  # Pattern attributes stored as string hashes
+BOOL_ATTRS = ('IS_STOP', 'IS_PUNCT', 'IS_ALPHA', 'LIKE_NUM')
+
+RULE_KEYS = {'name', 'relation', 'score', 'subject', 'object', 'patterns'}
+NODE_KEYS = {'RIGHT_ID', 'RIGHT_ATTRS', 'LEFT_ID', 'REL_OP'}
+REL_OPS = ('>', '<')  # Immediate child, immediate head; DependencyMatcher's other operators are not implemented
+VALUE_OPS = ('IN', 'NOT_IN')
+
+def validate_rules(rules):
+    """
+    Reject anything RuleEngine would otherwise mis-handle: unknown rule or
+    node keys, REL_OPs other than REL_OPS, attributes it does not compile,
+    value operators other than VALUE_OPS, and dangling node references.
+    Raises ValueError naming the rule and pattern.
+    """
+    for rule in rules:
+        name = rule.get('name', '?')
+        def fail(message, i=None):
+            raise ValueError(f"Relation rule {name!r}" + (f", pattern {i}" if i is not None else "") + f": {message}")
+        if set(rule) - RULE_KEYS:
+            fail(f"unknown keys {sorted(set(rule) - RULE_KEYS)}")
+        if rule.get('relation') is not None and not isinstance(rule.get('score'), int):
+            fail("a rule with a fixed relation needs an integer score")
+        if not rule.get('patterns'):
+            fail("no patterns")
+        for i, pattern in enumerate(rule['patterns']):
+            names = []
+            for position, node in enumerate(pattern):
+                if set(node) - NODE_KEYS:
+                    fail(f"unknown node keys {sorted(set(node) - NODE_KEYS)}", i)
+                if position == 0 and ('LEFT_ID' in node or 'REL_OP' in node):
+                    fail("the anchor node cannot have LEFT_ID or REL_OP", i)
+                if position > 0:
+                    if node.get('REL_OP') not in REL_OPS:
+                        fail(f"unsupported REL_OP {node.get('REL_OP')!r} (supported: {', '.join(REL_OPS)})", i)
+                    if node.get('LEFT_ID') not in names:
+                        fail(f"LEFT_ID {node.get('LEFT_ID')!r} is not an earlier node", i)
+                if 'RIGHT_ID' not in node or node['RIGHT_ID'] in names:
+                    fail(f"missing or repeated RIGHT_ID {node.get('RIGHT_ID')!r}", i)
+                names.append(node['RIGHT_ID'])
+                for attr, value in node.get('RIGHT_ATTRS', {}).items():
+                    if attr not in STRING_ATTRS + BOOL_ATTRS + ('POS', 'TEXT'):
+                        fail(f"unsupported attribute {attr!r}", i)
+                    if isinstance(value, dict) and (len(value) != 1 or set(value) - set(VALUE_OPS)):
+                        fail(f"unsupported value operator in {attr}: {sorted(value)} (supported: {', '.join(VALUE_OPS)})", i)
+                    values = next(iter(value.values())) if isinstance(value, dict) else [value]
+                    if attr == 'POS' and not set(values) <= set(POS_IDS):
+                        fail(f"unknown POS in {sorted(values)}", i)
+            for role in ('subject', 'object'):
+                if rule.get(role) not in names:
+                    fail(f"{role} {rule.get(role)!r} is not a node of the pattern", i)
 
-def find_entity_for_token(token, entities):
-    """Find which entity contains this token"""
+def build_entity_index(doc, entities, mentions=None):
+    """
+    Map every token offset to the entity whose doc.ents span covers it.
+    Built once per Doc so each lookup is a list access instead of a scan.
+    Pass the mentions from extract_entity_mentions to skip re-cleaning span text.
+    """
+    if mentions is None:
+        mentions = [(ent.start, ent.end, clean_entity_text(ent.text).lower()) for ent in doc.ents]
+    
+    by_name = {ent_text.lower(): (ent_text, ent_type) for ent_text, ent_type in entities}
+    index = [None] * len(doc)
+    for start, end, key in mentions:
+        entity = by_name.get(key)
+        if entity:
+            index[start:end] = [entity] * (end - start)
+    return index
+
+def find_entity_for_token(token, index):
+    """Find which entity span contains this token"""
+    return index[token.i]
+
+def scan_entity_for_token(token, entities):
+    """Legacy substring scan over all entities (kept for benchmarking)"""
     for ent_text, ent_type in entities:
-        # Check if token is part of this entity
         if token.text.lower() in ent_text.lower():
             return (ent_text, ent_type)
     return None
 
-def find_relationships(text, entities, nlp):
-    """Find quality relationships using spaCy dependency parsing"""
+def _attr_value(name, value):
+    """A pattern value as the integer Doc.to_array stores for the attribute"""
+    if name in STRING_ATTRS:
+        return get_string_id(value)
+    if name == 'POS':
+        return POS_IDS[value]
+    if name in BOOL_ATTRS:
+        return int(bool(value))
+    raise ValueError(f"Unsupported pattern attribute: {name}")
+
+class RuleEngine:
+    """
+    RELATION_RULES compiled into checks on Doc.to_array columns. Anchor
+    tokens are selected once per distinct anchor; the other nodes are then
+    only looked for among children (>) or the head (<) of a matched node,
+    using integer head/children lists instead of Token objects.
+    """
+
+    def __init__(self, rules=RELATION_RULES, relations=RELATIONS):
+        validate_rules(rules)
+        self.relations = relations
+        self._verbs = {}  # Lemma hash -> (relation, score) or None
+        self.attrs = ['HEAD', 'LEMMA']
+        self.patterns = []
+        steps = {}  # (REL_OP, checks) -> ID, so patterns sharing a node share its neighbour lookups
+        for order, rule in enumerate(rules):
+            for pattern in rule['patterns']:
+                names = [node['RIGHT_ID'] for node in pattern]
+                nodes = []
+                for node in pattern[1:]:
+                    checks = self._compile(node['RIGHT_ATTRS'])
+                    step = steps.setdefault((node['REL_OP'], checks), len(steps))
+                    nodes.append((names.index(node['LEFT_ID']), node['REL_OP'], checks, step))
+                self.patterns.append((order, rule, self._compile(pattern[0]['RIGHT_ATTRS']), nodes,
+                                      names.index(rule['subject']), names.index(rule['object'])))
+        self.width = max(len(nodes) + 1 for _, _, _, nodes, _, _ in self.patterns)
+
+    def _compile(self, attrs):
+        """Pattern token attributes -> ((column, allowed values, negated), ...)"""
+        checks = []
+        for name, value in attrs.items():
+            name = 'ORTH' if name == 'TEXT' else name
+            if name not in self.attrs:
+                self.attrs.append(name)
+            if isinstance(value, dict):
+                (op, values), = value.items()
+                allowed = frozenset(_attr_value(name, v) for v in values)
+                checks.append((self.attrs.index(name), allowed, op == 'NOT_IN'))
+            else:
+                checks.append((self.attrs.index(name), frozenset([_attr_value(name, value)]), False))
+        return tuple(checks)
+
+    def verb_relation(self, lemma, vocab):
+        """(relation, score) for a verb lemma hash in the RELATIONS table at or above MIN_SCORE, else None"""
+        if lemma not in self._verbs:
+            relation = self.relations.get(vocab.strings[lemma].lower())
+            self._verbs[lemma] = relation if relation and relation[1] >= MIN_SCORE else None
+        return self._verbs[lemma]
+
+    @staticmethod
+    def _select(columns, checks, positions):
+        """The token positions passing every check"""
+        for column, allowed, negated in checks:
+            values = columns[column]
+            if negated:
+                positions = [i for i in positions if values[i] not in allowed]
+            else:
+                positions = [i for i in positions if values[i] in allowed]
+        return positions
+
+    def candidates(self, doc, index):
+        """
+        (sort position, subject, relation, object, score) for every rule match
+        whose subject and object nodes fall in two different entities of index
+        """
+        n = len(doc)
+        columns = doc.to_array(self.attrs).reshape(n, len(self.attrs)).T.tolist()
+        everything = range(n)
+        anchors = {}
+        for _, _, anchor, _, _, _ in self.patterns:
+            if anchor not in anchors:
+                anchors[anchor] = self._select(columns, anchor, everything)
+        if not any(anchors.values()):
+            return []
+
+        # Heads from the relative HEAD offsets, and children in token order (roots are their own head)
+        heads = (np.arange(n) + doc.to_array('HEAD').astype(np.int64)).tolist()
+        children = [[] for _ in everything]
+        for i, head in enumerate(heads):
+            if head != i:
+                children[head].append(i)
+        neighbours = {}  # (step, left token) -> passing neighbours, shared across matches
+
+        found = []
+        lemmas = columns[1]
+        for order, rule, anchor, nodes, subject, obj in self.patterns:
+            for i in anchors[anchor]:
+                if rule['relation'] is None:
+                    relation = self.verb_relation(lemmas[i], doc.vocab)
+                    if relation is None:
+                        continue
+                else:
+                    relation = (rule['relation'], rule['score'])
+
+                # Extend partial matches one pattern node at a time
+                partials = [(i,)]
+                for node in nodes:
+                    extended = []
+                    for partial in partials:
+                        left = partial[node[0]]
+                        key = (node[3], left)
+                        if key not in neighbours:
+                            if node[1] == '>':
+                                tokens = children[left]
+                            else:
+                                tokens = [heads[left]] if heads[left] != left else []
+                            neighbours[key] = self._select(columns, node[2], tokens)
+                        extended.extend(partial + (j,) for j in neighbours[key])
+                    partials = extended
+                    if not partials:
+                        break
+
+                for match in partials:
+                    subj, obj_entity = index[match[subject]], index[match[obj]]
+                    if subj and obj_entity and subj != obj_entity and subj[0] != obj_entity[0]:
+                        position = (order, *match, *[-1] * (self.width - len(match)))
+                        found.append((position, subj[0], relation[0], obj_entity[0], relation[1]))
+        return found
+
+validate_rules(RELATION_RULES)  # At import, so a bad edit fails before any text is parsed
+_engine = None
+
+def rule_engine():
+    global _engine
+    if _engine is None:
+        _engine = RuleEngine()
+    return _engine
+
+def find_relationships_in_doc(doc, entities, mentions=None):
+    """Find quality relationships in an already parsed Doc (RELATION_RULES, one pass)"""
     if len(entities) < 2:
         return []
-        
-    doc = nlp(text[:3000])  # Slightly larger for better context
-    triples = []
-    
-    # Rule 1: Subject-Verb-Object patterns (most reliable)
-    for token in doc:
-        if token.pos_ == "VERB" and not token.is_stop:
-            verb = token.lemma_.lower()
-            relation_info = RELATIONS.get(verb, ('RELATED_TO', 3))
-            relation, score = relation_info
-            
-            if score < 5:  # Skip low-quality relations
-                continue
-                
-            subjects = []
-            objects = []
-            
-            # Find subjects and objects using dependencies
-            for child in token.children:
-                if child.dep_ in ["nsubj", "nsubjpass"]:  # Subject
-                    subj_ent = find_entity_for_token(child, entities)
-                    if subj_ent:
-                        subjects.append(subj_ent)
-                        
-                elif child.dep_ in ["dobj", "pobj"]:  # Direct/prepositional object
-                    obj_ent = find_entity_for_token(child, entities)
-                    if obj_ent:
-                        objects.append(obj_ent)
-                        
-                elif child.dep_ == "prep":  # Prepositional phrases
-                    for grandchild in child.children:
-                        if grandchild.dep_ == "pobj":
-                            obj_ent = find_entity_for_token(grandchild, entities)
-                            if obj_ent:
-                                objects.append(obj_ent)
-            
-            # Create triples
-            for subj in subjects:
-                for obj in objects:
-                    if subj != obj and subj[0] != obj[0]:
-                        triples.append((subj[0], relation, obj[0], score))
-    
-    # Rule 2: "is/are" relationships for definitions
-    for token in doc:
-        if token.lemma_ == "be" and token.pos_ in ["AUX", "VERB"]:
-            subjects = []
-            predicates = []
-            
-            for child in token.children:
-                if child.dep_ == "nsubj":
-                    subj_ent = find_entity_for_token(child, entities)
-                    if subj_ent:
-                        subjects.append(subj_ent)
-                elif child.dep_ in ["attr", "acomp"]:
-                    pred_ent = find_entity_for_token(child, entities)
-                    if pred_ent:
-                        predicates.append(pred_ent)
-            
-            for subj in subjects:
-                for pred in predicates:
-                    if subj != pred and subj[0] != pred[0]:
-                        triples.append((subj[0], "IS_A", pred[0], 6))
-    
-    # Rule 3: Possessive relationships
-    for token in doc:
-        if token.dep_ == "poss":  # Possessive
-            possessor = find_entity_for_token(token, entities)
-            possessed = find_entity_for_token(token.head, entities)
-            if possessor and possessed and possessor != possessed:
-                triples.append((possessor[0], "OWNS", possessed[0], 5))
-    
+
+    index = build_entity_index(doc, entities, mentions)
+    candidates = rule_engine().candidates(doc, index)
+    candidates.sort(key=lambda candidate: candidate[0])
+
     # Filter and deduplicate
     seen = set()
     quality_triples = []
-    for triple in triples:
-        if len(triple) >= 4:
-            subj, rel, obj, score = triple
-            key = (subj.lower(), rel, obj.lower())
-            if key not in seen and score >= 5:  # Quality threshold
-                seen.add(key)
-                quality_triples.append((subj, rel, obj))
+    for _, subj, rel, obj, score in candidates:
+        key = (subj.lower(), rel, obj.lower())
+        if key not in seen and score >= MIN_SCORE:
+            seen.add(key)
+            quality_triples.append((subj, rel, obj))
     
     return quality_triples
+
+def find_relationships(text, entities, nlp):
+    """Find quality relationships using spaCy dependency parsing, over sentence-aligned segments of long texts"""
+    if len(entities) < 2:
+        return []
+    segments = segment_text(text, MAX_CHARS, SEGMENT_OVERLAP)
+    return merge_extractions([([], find_relationships_in_doc(doc, entities)) for doc in nlp.pipe(segments)])[1]
+
+def extract_from_doc(doc):
+    """Entities and relationships from one parsed Doc"""
+    entities, mentions = extract_entity_mentions(doc)
+    return entities, find_relationships_in_doc(doc, entities, mentions)
+
+def merge_extractions(parts):
+    """
+    Merge the (entities, triples) of several segments of one text, deduplicated
+    the same way as within one Doc, so a triple found in two overlapping
+    segments is counted once.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    entities, triples = [], []
+    seen_entities, seen_triples = set(), set()
+    for part_entities, part_triples in parts:
+        for entity in part_entities:
+            if entity[0].lower() not in seen_entities:
+                seen_entities.add(entity[0].lower())
+                entities.append(entity)
+        for subj, rel, obj in part_triples:
+            key = (subj.lower(), rel, obj.lower())
+            if key not in seen_triples:
+                seen_triples.add(key)
+                triples.append((subj, rel, obj))
+    return entities, triples
+
+def extract_entities_and_relationships(text, nlp):
+    """Parse the text in sentence-aligned segments and return the merged (entities, triples)"""
+    segments = segment_text(text, MAX_CHARS, SEGMENT_OVERLAP)
+    return merge_extractions([extract_from_doc(doc) for doc in nlp.pipe(segments)])
@@ -0,0 +1,256 @@
+"""
+HippoRAG-style retrieval - link question entities, run Personalized PageRank, rank entities and chunks
+Run: python retrieval.py <store_dir | store.npz> "question" ...
+"""
+import os
+import sys
+import numpy as np
+import scipy.sparse as sp
+from chunk_index import read_passages
+from entity_embeddings import INDEX_META_FILE, SYNONYM_SOURCE, EntityLinker
+from entity_extractor import MAX_CHARS, extract_entity_mentions, load_nlp
+from graph_store import GraphStore
+
+# Config
+DAMPING = 0.5  # Probability of following an edge instead of restarting at a seed (HippoRAG uses 0.5)
+PUSH_EPSILON = 1e-6  # Residual per unit degree left unpushed; 0 runs full power iteration instead
+MAX_ITER = 50
+TOLERANCE = 1e-6  # L1 change per query at which full power iteration stops
+TOP_K = 10
+QUERY_BATCH_SIZE = 64  # Questions per sparse matrix-matrix power iteration
+MAX_NGRAM = 4  # Longest token n-gram tried when no entity links directly
+
+def transition_matrix(store):
+    """
+    Row-stochastic transition matrix over the undirected, weighted entity graph,
+    plus the mask of nodes without edges.
+    Edge direction carries the relation, not reachability, so both directions are walkable.
+    """
+    n = store.num_nodes
+    rows = store.edge_sources()
+    cols = np.asarray(store.indices)
+    weights = np.asarray(store.weights, dtype=np.float32)
+    adjacency = sp.csr_matrix((np.concatenate([weights, weights]),
+                               (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+                              shape=(n, n), dtype=np.float32)  # Duplicates are summed
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    inv_degree = np.divide(1.0, degree, out=np.zeros_like(degree), where=degree > 0)
+    return sp.csr_matrix(adjacency.multiply(inv_degree[:, None]), dtype=np.float32), degree == 0
+
+def chunk_matrix(store):
+    """
+    Sparse entity x chunk incidence, sliced by the entities a query reaches.
+    Uses the store's chunk inverted index when it has one, weighted by how many
+    of the chunk's triples mention the entity; otherwise presence of the (last)
+    source recorded on each edge, leaving out the SYNONYM edges from
+    entity_embeddings.py, which no chunk contributed.
+    """
+    index = store.chunk_index
+    if index is not None:
+        incidence = sp.csr_matrix((np.asarray(index.chunk_counts, dtype=np.float32), np.asarray(index.chunk_ids),
+                                   np.asarray(index.chunk_indptr)), shape=(store.num_nodes, index.num_chunks))
+        return incidence, index.chunk_names
+
+    sources = np.asarray(store.sources)
+    keep = sources != (store.source_names.index(SYNONYM_SOURCE) if SYNONYM_SOURCE in store.source_names else -1)
+    rows = np.concatenate([store.edge_sources()[keep], np.asarray(store.indices)[keep]])
+    cols = np.concatenate([sources[keep], sources[keep]])
+    incidence = sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                              shape=(store.num_nodes, len(store.source_names)))
+    incidence.data[:] = 1.0  # Presence, not edge count
+    return incidence, store.source_names
+
+def personalized_pagerank(matrix, dangling, seeds, damping=DAMPING, max_iter=MAX_ITER, tol=TOLERANCE):
+    """
+    Batched PPR by power iteration: seeds is an (n, b) restart distribution,
+    one column per query. Mass on dangling nodes returns to that query's seeds.
+    """
+    step = matrix.T  # CSC view, no copy
+    scores = seeds.copy()
+    for _ in range(max_iter):
+        lost = scores[dangling].sum(axis=0) if dangling.any() else 0.0
+        updated = damping * (step @ scores) + (1 - damping + damping * lost) * seeds
+        delta = np.abs(updated - scores).sum(axis=0).max()
+        scores = updated
+        if delta < tol:
+            break
+    return scores
+
+def _gather(indptr, rows):
+    """Positions of every stored entry in the given CSR rows, and the row lengths"""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    ends = np.cumsum(lengths)
+    offsets = np.repeat(starts - (ends - lengths), lengths)
+    return offsets + np.arange(ends[-1] if len(ends) else 0), lengths
+
+def push_pagerank(matrix, seed_ids, damping=DAMPING, eps=PUSH_EPSILON):
+    """
+    Approximate PPR for one query by vectorised forward push.
+    Each round is a sparse product restricted to the nodes whose residual
+    exceeds eps times their degree, so the work follows the mass out from the
+    seeds instead of touching the whole graph (Andersen, Chung & Lang 2006).
+    As in personalized_pagerank, mass pushed from a dangling node returns to the seeds.
+    """
+    n = matrix.shape[0]
+    degree = np.diff(matrix.indptr)
+    threshold = eps * np.maximum(degree, 1)  # Dangling nodes too, or a dangling seed would push forever
+    scores = np.zeros(n, dtype=np.float32)
+    residual = np.zeros(n, dtype=np.float32)
+    seeds = np.asarray(seed_ids, dtype=np.int64)
+    residual[seeds] = 1.0 / len(seeds)
+    candidates = seeds
+    while len(candidates):
+        active = candidates[residual[candidates] > threshold[candidates]]
+        if not len(active):
+            break
+        mass = residual[active]
+        residual[active] = 0
+        scores[active] += (1 - damping) * mass
+        entries, lengths = _gather(matrix.indptr, active)
+        targets = matrix.indices[entries]
+        np.add.at(residual, targets, matrix.data[entries] * np.repeat(damping * mass, lengths))
+        lost = damping * mass[lengths == 0].sum()
+        if lost > 0:
+            np.add.at(residual, seeds, lost / len(seeds))
+            targets = np.concatenate([targets, seeds])
+        candidates = np.unique(targets)
+    return scores
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+class Retriever:
+    """
+    Query-time view of a GraphStore: the transition matrix and chunk incidence
+    are built once, then each question is a few sparse products.
+    """
+
+    def __init__(self, store, nlp=None, damping=DAMPING, eps=PUSH_EPSILON, linker=None):
+        self.store = store
+        self.nlp = nlp
+        self.linker = linker  # entity_embeddings.EntityLinker for mentions with no exact match
+        self.damping = damping
+        self.eps = eps
+        self.matrix, self.dangling = transition_matrix(store)
+        self.entity_chunks, self.chunk_names = chunk_matrix(store)
+        self.by_lower = {}
+        for i, name in enumerate(store.nodes.names):
+            self.by_lower.setdefault(name.lower(), i)
+
+    def link_doc(self, doc):
+        """
+        Node IDs for a parsed question: quality entities first (extract_entities logic),
+        then any NER mention, then the nearest entity embedding of each mention,
+        then token n-grams that name a node.
+        """
+        entities, mentions = extract_entity_mentions(doc)
+        for keys in ([text.lower() for text, _ in entities], [key for _, _, key in mentions]):
+            seeds = {self.by_lower[key] for key in keys if key in self.by_lower}
+            if seeds:
+                return sorted(seeds)
+
+        if self.linker is not None and mentions:
+            linked = self.linker.link([doc[start:end].text for start, end, _ in mentions])
+            seeds = {node for node in linked if node is not None}
+            if seeds:
+                return sorted(seeds)
+
+        words = [token.text.lower() for token in doc]
+        seeds = set()
+        for size in range(min(MAX_NGRAM, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                node = self.by_lower.get(" ".join(words[start:start + size]))
+                if node is not None and not doc[start].is_stop:
+                    seeds.add(node)
+            if seeds:
+                break
+        return sorted(seeds)
+
+    def link(self, questions):
+        """Seed node IDs for each question, parsed in one nlp.pipe pass"""
+        docs = self.nlp.pipe((q[:MAX_CHARS] for q in questions), batch_size=QUERY_BATCH_SIZE)
+        return [self.link_doc(doc) for doc in docs]
+
+    def ppr(self, seed_lists):
+        """
+        Yield a PPR score vector per seed ID list (uniform restart over each list).
+        Forward push runs per query; full power iteration runs QUERY_BATCH_SIZE
+        queries at a time as one sparse matrix-matrix product per step.
+        """
+        if self.eps > 0:
+            for ids in seed_lists:
+                yield push_pagerank(self.matrix, ids, self.damping, self.eps) if ids else None
+            return
+        
+        for start in range(0, len(seed_lists), QUERY_BATCH_SIZE):
+            batch = seed_lists[start:start + QUERY_BATCH_SIZE]
+            seeds = np.zeros((self.store.num_nodes, len(batch)), dtype=np.float32)
+            for j, ids in enumerate(batch):
+                if ids:
+                    seeds[ids, j] = 1.0 / len(ids)
+            scores = personalized_pagerank(self.matrix, self.dangling, seeds, self.damping)
+            for j, ids in enumerate(batch):
+                yield scores[:, j] if ids else None
+
+    def rank(self, seed_lists, top_k=TOP_K):
+        """Top entities and chunks for each seed list, by PPR mass"""
+        results = []
+        names = self.store.nodes.names
+        for ids, scores in zip(seed_lists, self.ppr(seed_lists)):
+            if scores is None:
+                results.append({'seeds': [], 'entities': [], 'chunks': [], 'chunk_ids': []})
+                continue
+            reached = np.flatnonzero(scores)
+            entity_top = reached[_top_k(scores[reached], top_k)]
+            chunk_scores = self.entity_chunks[reached].T @ scores[reached]
+            chunk_top = _top_k(chunk_scores, top_k)
+            results.append({
+                'seeds': [names[i] for i in ids],
+                'entities': [(names[i], float(scores[i])) for i in entity_top],
+                'chunks': [(self.chunk_names[i], float(chunk_scores[i])) for i in chunk_top],
+                'chunk_ids': chunk_top.tolist()
+            })
+        return results
+
+    def passages(self, chunk_ids, path):
+        """Texts of ranked chunks, read by offset from the JSONL or chunk table the store was built from"""
+        index = self.store.chunk_index
+        if index is None:
+            return [None] * len(chunk_ids)
+        return read_passages(path, [index.chunk_offsets[i] for i in chunk_ids])
+
+    def retrieve_batch(self, questions, top_k=TOP_K):
+        """Link and rank a list of questions"""
+        return self.rank(self.link(questions), top_k)
+
+    def retrieve(self, question, top_k=TOP_K):
+        return self.retrieve_batch([question], top_k)[0]
+
+def main():
+    if len(sys.argv) < 3:
+        print('Usage: python retrieval.py <store_dir | store.npz> "question" ...')
+        sys.exit(2)
+
+    store = GraphStore.load(sys.argv[1])
+    print(store.stats())
+    linker = None
+    if os.path.exists(os.path.join(sys.argv[1], INDEX_META_FILE)):  # Built by entity_embeddings.py
+        linker = EntityLinker.load(sys.argv[1])
+        print(f"Linking unmatched mentions by {linker.embedder.name} embedding ({linker.index.backend} index)")
+    retriever = Retriever(store, load_nlp('entities'), linker=linker)
+    for question, result in zip(sys.argv[2:], retriever.retrieve_batch(sys.argv[2:])):
+        print(f"\n❓ {question}")
+        print(f"  Seeds: {result['seeds'] or 'none linked'}")
+        for name, score in result['entities']:
+            print(f"  {score:.4f}  {name}")
+        print("  Chunks:")
+        for name, score in result['chunks']:
+            print(f"  {score:.4f}  {name}")
+
+if __name__ == "__main__":
+    main()
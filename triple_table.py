@@ -0,0 +1,167 @@
+"""
+Compact triple storage - interned strings and int32 array columns instead of tuples and per-triple metadata
+"""
+from array import array
+from collections import Counter
+import numpy as np
+
+class Interner:
+    """Bidirectional string <-> dense integer ID map (IDs in first-seen order)"""
+
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def get(self, name):
+        return self.ids.get(name)
+
+    def __len__(self):
+        return len(self.names)
+
+class MetadataView:
+    """table.metadata[i] is the metadata dict of triple i's record (one shared dict per record)"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, i):
+        return self.table.source_metadata(self.table.sources[i])
+
+class TripleTable:
+    """
+    Triples as four growable int32 columns: subject, relation and object IDs
+    into interned strings, and the ID of the source record. A record's domain
+    and title are interned and its chunk_id and provenance (line_start, offset,
+    text_hash, when present) stored once, not per triple.
+    len(), iteration and indexing give (subj, rel, obj) string tuples and
+    .metadata the matching metadata sequence, so a table can stand in for a
+    (triples, metadata_list) pair; the writers also read the columns directly.
+    """
+
+    def __init__(self):
+        self.entities = Interner()
+        self.relations = Interner()
+        self.domains = Interner()
+        self.titles = Interner()
+        self.subjects = array('i')
+        self.predicates = array('i')
+        self.objects = array('i')
+        self.sources = array('i')
+        self.source_domains = array('i')
+        self.source_titles = array('i')
+        self.source_chunks = []
+        self.source_line_starts = array('q')  # -1 when the record has no file position
+        self.source_offsets = array('q')
+        self.source_hashes = []
+        self._metadata = {}  # Source ID -> metadata dict, built on first use
+        self.metadata = MetadataView(self)
+
+    @classmethod
+    def from_triples(cls, triples, metadata_list=()):
+        """Table from parallel lists; consecutive triples sharing one metadata dict form a record"""
+        table = cls()
+        metadata_at = lambda i: metadata_list[i] if i < len(metadata_list) else None
+        start = 0
+        for i in range(1, len(triples) + 1):
+            if i == len(triples) or metadata_at(i) is not metadata_at(start):
+                table.add_record(triples[start:i], metadata_at(start) or {})
+                start = i
+        return table
+
+    def add_source(self, metadata):
+        self.source_domains.append(self.domains.intern(metadata.get('domain', 'unknown')))
+        self.source_titles.append(self.titles.intern(metadata.get('title', 'unknown')))
+        self.source_chunks.append(metadata.get('chunk_id'))
+        self.source_line_starts.append(metadata.get('line_start', -1))
+        self.source_offsets.append(metadata.get('offset', -1))
+        self.source_hashes.append(metadata.get('text_hash'))
+        return len(self.source_chunks) - 1
+
+    def add_record(self, triples, metadata):
+        """Append all triples extracted from one record"""
+        if not triples:
+            return
+        source = self.add_source(metadata)
+        entity, relation = self.entities.intern, self.relations.intern
+        for subj, rel, obj in triples:
+            self.subjects.append(entity(subj))
+            self.predicates.append(relation(rel))
+            self.objects.append(entity(obj))
+            self.sources.append(source)
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        names = self.entities.names
+        return names[self.subjects[i]], self.relations.names[self.predicates[i]], names[self.objects[i]]
+
+    def __iter__(self):
+        names, relations = self.entities.names, self.relations.names
+        for s, r, o in zip(self.subjects, self.predicates, self.objects):
+            yield names[s], relations[r], names[o]
+
+    def source_metadata(self, source):
+        metadata = self._metadata.get(source)
+        if metadata is None:
+            metadata = self._metadata[source] = {
+                'domain': self.domains.names[self.source_domains[source]],
+                'title': self.titles.names[self.source_titles[source]],
+                'chunk_id': self.source_chunks[source]
+            }
+            if self.source_line_starts[source] >= 0:
+                metadata['line_start'] = self.source_line_starts[source]
+            if self.source_offsets[source] >= 0:
+                metadata['offset'] = self.source_offsets[source]
+            if self.source_hashes[source] is not None:
+                metadata['text_hash'] = self.source_hashes[source]
+        return metadata
+
+    def records(self):
+        """Yield (metadata, triples) per source record, in insertion order"""
+        start = 0
+        for i in range(1, len(self) + 1):
+            if i == len(self) or self.sources[i] != self.sources[start]:
+                yield self.source_metadata(self.sources[start]), self[start:i]
+                start = i
+
+    def columns(self):
+        """
+        Per-triple int32 NumPy columns: subject, relation, object, source, and
+        the source's domain and title IDs. The first four are views of the
+        arrays, so drop them before appending more triples.
+        """
+        sources = np.frombuffer(self.sources, dtype=np.int32)
+        return {
+            'subject': np.frombuffer(self.subjects, dtype=np.int32),
+            'relation': np.frombuffer(self.predicates, dtype=np.int32),
+            'object': np.frombuffer(self.objects, dtype=np.int32),
+            'source': sources,
+            'domain': np.frombuffer(self.source_domains, dtype=np.int32)[sources],
+            'title': np.frombuffer(self.source_titles, dtype=np.int32)[sources]
+        }
+
+    def relation_counts(self):
+        """Counter of triples per relation name"""
+        counts = np.bincount(np.frombuffer(self.predicates, dtype=np.int32), minlength=len(self.relations))
+        return Counter(dict(zip(self.relations.names, counts.tolist())))
+
+    def nbytes(self):
+        """Bytes held by the ID columns (interned strings not included)"""
+        columns = (self.subjects, self.predicates, self.objects, self.sources, self.source_domains, self.source_titles,
+                   self.source_line_starts, self.source_offsets)
+        return sum(column.itemsize * len(column) for column in columns)